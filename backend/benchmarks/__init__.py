@@ -0,0 +1 @@
+# EaziWage Backend Benchmarks
@@ -0,0 +1,144 @@
+"""
+Benchmark: admin dashboard stats - Python-side filtering vs $facet aggregation
+
+Seeds a scratch database with N advances (default 1,000,000), then times the
+original implementation (load every document, filter with list comprehensions
+and datetime.fromisoformat) against services.dashboard_stats.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_admin_dashboard --advances 1000000
+
+The scratch database is dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.dashboard_stats import employer_stats, employee_stats, advance_stats
+
+STATUSES = ["pending", "approved", "disbursed", "repaid", "rejected"]
+
+
+async def seed(db, advances: int, employers: int, employees: int, batch: int = 10000):
+    now = datetime.now(timezone.utc)
+    employer_ids = [str(uuid.uuid4()) for _ in range(employers)]
+    await db.employers.insert_many([
+        {"id": eid, "status": random.choice(["approved", "pending"]), "risk_score": round(random.uniform(2, 5), 2),
+         "created_at": now.isoformat()}
+        for eid in employer_ids
+    ])
+    for start in range(0, employees, batch):
+        await db.employees.insert_many([
+            {"id": str(uuid.uuid4()), "employer_id": random.choice(employer_ids),
+             "status": random.choice(["approved", "pending"]),
+             "kyc_status": random.choice(["approved", "pending", "submitted"]), "created_at": now.isoformat()}
+            for _ in range(min(batch, employees - start))
+        ])
+    for start in range(0, advances, batch):
+        docs = []
+        for _ in range(min(batch, advances - start)):
+            amount = random.randint(1000, 50000)
+            docs.append({
+                "id": str(uuid.uuid4()),
+                "employer_id": random.choice(employer_ids),
+                "amount": amount,
+                "fee_amount": amount * 0.05,
+                "status": random.choice(STATUSES),
+                "created_at": (now - timedelta(minutes=random.randint(0, 60 * 24 * 180))).isoformat(),
+            })
+        await db.advances.insert_many(docs, ordered=False)
+        print(f"  seeded {start + len(docs):,} advances", end="\r")
+    print()
+
+
+async def legacy_stats(db):
+    """The original /admin/dashboard computation, uncapped so it returns correct totals"""
+    employers = await db.employers.find({}, {"_id": 0}).to_list(None)
+    employees = await db.employees.find({}, {"_id": 0}).to_list(None)
+    advances = await db.advances.find({}, {"_id": 0}).to_list(None)
+
+    current_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    monthly = [a for a in advances if a.get("created_at") and datetime.fromisoformat(a["created_at"].replace('Z', '+00:00')) >= current_month]
+    scores = [e.get("risk_score", 3.0) for e in employers if e.get("risk_score")]
+    return {
+        "employers": len(employers),
+        "active_employers": len([e for e in employers if e.get("status") == "approved"]),
+        "employees": len(employees),
+        "kyc_pending": len([e for e in employees if e.get("kyc_status") in ["pending", "submitted"]]),
+        "advances": len(advances),
+        "disbursed": sum(a.get("amount", 0) for a in advances if a.get("status") in ["approved", "disbursed", "repaid"]),
+        "pending": len([a for a in advances if a.get("status") == "pending"]),
+        "monthly_count": len(monthly),
+        "monthly_disbursed": sum(a.get("amount", 0) for a in monthly if a.get("status") in ["approved", "disbursed"]),
+        "avg_risk": round(sum(scores) / len(scores), 2) if scores else 0,
+    }
+
+
+async def facet_stats(db):
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    employers, employees, advances = await asyncio.gather(
+        employer_stats(db), employee_stats(db), advance_stats(db, today.replace(day=1).isoformat(), today.isoformat())
+    )
+    return {
+        "employers": employers["total"],
+        "active_employers": employers["approved"],
+        "employees": employees["total"],
+        "kyc_pending": employees["kyc_pending"],
+        "advances": advances["total_count"],
+        "disbursed": advances["total_disbursed"],
+        "pending": advances["pending_count"],
+        "monthly_count": advances["monthly_count"],
+        "monthly_disbursed": advances["monthly_disbursed"],
+        "avg_risk": employers["avg_risk_score"],
+    }
+
+
+async def timed(fn, db, runs: int):
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await fn(db)
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advances", type=int, default=1_000_000)
+    parser.add_argument("--employers", type=int, default=500)
+    parser.add_argument("--employees", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"eaziwage_bench_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    try:
+        print(f"Seeding {db_name}: {args.advances:,} advances, {args.employees:,} employees, {args.employers:,} employers")
+        await seed(db, args.advances, args.employers, args.employees)
+
+        legacy, legacy_ms = await timed(legacy_stats, db, args.runs)
+        facet, facet_ms = await timed(facet_stats, db, args.runs)
+
+        mismatched = [k for k in legacy if abs(legacy[k] - facet[k]) > 0.01]
+        print(f"legacy (python filtering): median {statistics.median(legacy_ms):9.1f} ms  max {max(legacy_ms):9.1f} ms")
+        print(f"$facet aggregation:        median {statistics.median(facet_ms):9.1f} ms  max {max(facet_ms):9.1f} ms")
+        print(f"speedup: {statistics.median(legacy_ms) / statistics.median(facet_ms):.1f}x")
+        print("results match" if not mismatched else f"MISMATCH on {mismatched}: {legacy} vs {facet}")
+    finally:
+        if not args.keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark: payouts/sec - one advance at a time vs the concurrent batch pipeline
+
+Seeds a scratch database with N approved advances spread over a few
+countries and mobile money providers, then disburses them against
+MockDusupayService (with a simulated gateway round trip) twice:
+
+- serial: what clicking "disburse" per advance does - three find_one calls,
+  the payout, then the advance / disbursement / transaction writes
+- batch:  services.disbursements.run_batch - bulk prefetch, bounded
+  concurrency and a per-provider rate limit
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_disbursement_batch --advances 2000 --latency 0.05
+
+The scratch database is dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.disbursements import (
+    ProviderRateLimiter, claim, country_of, new_batch, recipient_name_of, record_payout, run_batch, send_payout
+)
+from services.dusupay import MockDusupayService
+
+PROVIDERS = {"KE": ["mpesa", "airtel"], "UG": ["mtn", "airtel"], "TZ": ["mpesa", "tigo"]}
+
+
+async def seed(db, advances: int):
+    now = datetime.now(timezone.utc).isoformat()
+    employers = [{"id": str(uuid.uuid4()), "country": country} for country in PROVIDERS]
+    await db.employers.insert_many(employers)
+
+    employees, users, docs = [], [], []
+    for i in range(advances):
+        employer = random.choice(employers)
+        user_id, employee_id = str(uuid.uuid4()), str(uuid.uuid4())
+        users.append({"id": user_id, "full_name": f"Employee {i}"})
+        employees.append({"id": employee_id, "user_id": user_id, "employer_id": employer["id"],
+                          "mobile_money_number": f"+2547{i:08d}"})
+        docs.append({
+            "id": str(uuid.uuid4()), "employee_id": employee_id, "employer_id": employer["id"],
+            "country": employer["country"], "amount": 5000, "net_amount": 4800, "status": "approved",
+            "disbursement_method": "mobile_money",
+            "disbursement_details": {"provider": random.choice(PROVIDERS[employer["country"]])},
+            "created_at": now,
+        })
+    await db.users.insert_many(users)
+    await db.employees.insert_many(employees)
+    await db.advances.insert_many(docs)
+    await db.advances.create_index("id", unique=True)
+    await db.advances.create_index("disbursement_lock", sparse=True)
+    return [d["id"] for d in docs]
+
+
+async def serial(db, dusupay, advance_ids):
+    for advance_id in advance_ids:
+        lock = str(uuid.uuid4())
+        advance = await db.advances.find_one({"id": advance_id}, {"_id": 0})
+        employee = await db.employees.find_one({"id": advance["employee_id"]}, {"_id": 0})
+        user = await db.users.find_one({"id": employee["user_id"]}, {"_id": 0})
+        employer = await db.employers.find_one({"id": employee["employer_id"]}, {"_id": 0})
+        await claim(db, [advance_id], lock)
+        advance["disbursement_lock"] = lock
+        name, country_code = recipient_name_of(user), country_of(employer)
+        reference, response = await send_payout(dusupay, advance, employee, name, country_code)
+        await record_payout(db, advance, employee, name, country_code, reference, response)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advances", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated gateway round trip (s)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=100, help="payouts/sec per provider")
+    parser.add_argument("--serial-sample", type=int, default=200, help="advances timed in serial mode")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"eaziwage_bench_disburse_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    try:
+        advance_ids = await seed(db, args.advances)
+        dusupay = MockDusupayService(latency_seconds=args.latency)
+
+        # Serial throughput is flat, so a sample is enough to measure it
+        sample = advance_ids[:args.serial_sample]
+        started = time.perf_counter()
+        await serial(db, dusupay, sample)
+        serial_rate = len(sample) / (time.perf_counter() - started)
+
+        batch = new_batch("bench", None, args.advances)
+        await db.disbursement_batches.insert_one(batch)
+        result = await run_batch(db, dusupay, batch, concurrency=args.concurrency,
+                                 limiter=ProviderRateLimiter(args.rate))
+
+        print(f"advances: {args.advances}  gateway latency: {args.latency * 1000:.0f} ms  "
+              f"concurrency: {args.concurrency}  rate/provider: {args.rate}/s")
+        print(f"serial  ({len(sample)} advances): {serial_rate:8.1f} payouts/sec")
+        print(f"batch   ({result['total']} advances): {result['payouts_per_second']:8.1f} payouts/sec  "
+              f"({result['initiated']} initiated, {result['failed']} failed, {result['duration_seconds']} s)")
+    finally:
+        if not args.keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark: p99 latency of an unrelated endpoint while logins are running
+
+Builds a minimal FastAPI app with two login handlers - one calling
+bcrypt.checkpw inline on the event loop (the original behaviour) and one
+awaiting services.passwords.verify_password - plus a trivial /ping endpoint.
+For each handler it fires --logins concurrent logins and, at the same time,
+polls /ping on a fixed schedule, then reports /ping latency percentiles.
+
+Requests go through httpx's in-process ASGI transport, so the app shares the
+benchmark's event loop exactly as it would share uvicorn's. No database needed.
+
+    cd backend
+    python -m benchmarks.bench_password_hashing --logins 40 --rounds 12
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+import httpx
+from fastapi import FastAPI
+
+from services.passwords import hash_password_sync, verify_password, verify_password_sync
+
+
+def build_app(stored_hash: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login-inline")
+    async def login_inline():
+        return {"ok": verify_password_sync("Employee@123", stored_hash)}
+
+    @app.post("/login")
+    async def login():
+        return {"ok": await verify_password("Employee@123", stored_hash)}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(client: httpx.AsyncClient, login_path: str, logins: int, interval: float):
+    latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        # Latency is measured from when each probe was due, so time spent waiting for a
+        # blocked event loop counts (otherwise a stalled loop just produces fewer samples)
+        due = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/ping")
+            latencies.append((time.perf_counter() - due) * 1000)
+            due += interval
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[client.post(login_path) for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    assert all(r.json()["ok"] for r in responses)
+    return latencies, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="pause between /ping probes")
+    args = parser.parse_args()
+
+    stored_hash = hash_password_sync("Employee@123", rounds=args.rounds)
+    app = build_app(stored_hash)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.get("/ping")
+        print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds} (bcrypt {bcrypt.__version__})")
+        for label, path in [("inline on event loop", "/login-inline"), ("bcrypt thread pool  ", "/login")]:
+            latencies, elapsed = await run(client, path, args.logins, args.interval_ms / 1000)
+            print(
+                f"{label}: /ping n={len(latencies):4d}  p50 {statistics.median(latencies):8.1f} ms  "
+                f"p99 {percentile(latencies, 99):8.1f} ms  max {max(latencies):8.1f} ms  "
+                f"(logins took {elapsed:.1f} s)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark: storing uploads - read-all-then-write vs streamed save_upload
+
+Builds N uploads of S MB each, spooled the way Starlette hands them to an
+endpoint (SpooledTemporaryFile, on disk past 1 MB), and stores them all
+concurrently, twice:
+
+- inline: what the KYC and profile-picture endpoints used to do -
+  `await file.read()` then a blocking open().write() on the event loop
+- streamed: services.uploads.save_upload - fixed-size chunks written from
+  the thread pool to a part file, then renamed
+
+Reported per mode: wall time, peak Python heap (tracemalloc) and the worst
+event-loop stall seen by a 5 ms ticker running alongside - what every other
+request on the worker would have waited.
+
+    cd backend
+    python -m benchmarks.bench_uploads --uploads 100 --size-mb 5
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from starlette.datastructures import UploadFile
+
+from services.uploads import save_upload
+
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def make_uploads(count: int, size: int):
+    block = os.urandom(1024 * 1024)
+    uploads = []
+    for i in range(count):
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        for _ in range(size // len(block)):
+            spool.write(block)
+        spool.write(block[:size % len(block)])
+        spool.seek(0)
+        uploads.append(UploadFile(spool, size=size, filename=f"doc-{i}.pdf"))
+    return uploads
+
+
+async def store_inline(upload, destination: Path):
+    content = await upload.read()
+    with open(destination, "wb") as f:
+        f.write(content)
+
+
+async def store_streamed(upload, destination: Path):
+    await save_upload(upload, destination, max_bytes=upload.size)
+
+
+async def ticker(stop: asyncio.Event, stalls):
+    interval = 0.005
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def run(mode: str, store, uploads, directory: Path):
+    stop = asyncio.Event()
+    stalls = []
+    tick = asyncio.create_task(ticker(stop, stalls))
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[store(upload, directory / f"{mode}-{i}") for i, upload in enumerate(uploads)])
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop.set()
+    await tick
+    print(f"{mode:<9} {elapsed:6.2f} s   peak heap {peak / 2 ** 20:7.1f} MB   "
+          f"worst loop stall {max(stalls, default=0) * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--size-mb", type=float, default=5)
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+
+    print(f"uploads: {args.uploads}  size: {args.size_mb} MB")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, store in (("inline", store_inline), ("streamed", store_streamed)):
+            uploads = make_uploads(args.uploads, size)
+            try:
+                await run(mode, store, uploads, Path(directory))
+            finally:
+                for upload in uploads:
+                    upload.file.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Benchmark: Dusupay callback latency - applying inline vs store-and-ack
+
+Seeds a scratch database with N disbursing advances and fires one COMPLETED
+callback per advance, C at a time, twice:
+
+- inline: what the webhook used to do before responding - disbursement
+  lookup, disbursement / advance / transaction updates and the rollup move
+  (services.webhooks.apply_event)
+- ingest: what it does now - one insert into inbound_webhooks
+  (WebhookProcessor.ingest); the worker pool then applies the events and the
+  time until the backlog is drained is reported separately
+
+Latency is per callback as seen by the caller (p50 / p95 / p99).
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_webhook_ingest --callbacks 2000 --concurrency 50
+
+The scratch database is dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.telemetry import percentile
+from services.webhooks import WebhookProcessor, apply_event, new_event
+
+
+async def seed(db, count: int, tag: str):
+    references = [f"EWA-{tag}-{i}" for i in range(count)]
+    await db.disbursements.insert_many([
+        {"id": str(uuid.uuid4()), "advance_id": f"adv-{ref}", "merchant_reference": ref, "status": "PENDING"}
+        for ref in references
+    ])
+    await db.advances.insert_many([
+        {"id": f"adv-{ref}", "employee_id": "ee-1", "employer_id": "er-1", "amount": 5000, "net_amount": 4800,
+         "fee_amount": 200, "country": "KE", "status": "disbursing", "disbursement_reference": ref,
+         "created_at": "2026-01-01T00:00:00+00:00"}
+        for ref in references
+    ])
+    await db.transactions.insert_many([{"id": str(uuid.uuid4()), "reference": ref, "status": "pending"} for ref in references])
+    return references
+
+
+def callback(reference: str):
+    return {"event": "transaction.completed", "payload": {
+        "merchant_reference": reference, "internal_reference": f"DUSU-{reference}", "transaction_status": "COMPLETED"}}
+
+
+async def fire(references, handle, concurrency: int):
+    """Call handle(reference) for every reference, `concurrency` at a time; per-call latencies in ms"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(reference):
+        async with semaphore:
+            started = time.perf_counter()
+            await handle(reference)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[one(ref) for ref in references])
+    return sorted(latencies)
+
+
+def report(label: str, latencies):
+    print(f"{label:<8} p50 {percentile(latencies, 50):7.2f} ms   p95 {percentile(latencies, 95):7.2f} ms   "
+          f"p99 {percentile(latencies, 99):7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callbacks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"eaziwage_bench_webhooks_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    try:
+        await db.disbursements.create_index("merchant_reference", unique=True)
+        await db.advances.create_index("id", unique=True)
+        await db.transactions.create_index("reference")
+        await db.inbound_webhooks.create_index("id", unique=True)
+        await db.inbound_webhooks.create_index(
+            [("merchant_reference", 1), ("transaction_status", 1), ("provider_event_id", 1)], unique=True)
+        await db.inbound_webhooks.create_index([("status", 1), ("available_at", 1), ("received_at", 1)])
+        await db.inbound_webhooks.create_index([("merchant_reference", 1), ("status", 1), ("received_at", 1)])
+
+        inline_refs = await seed(db, args.callbacks, "inline")
+        ingest_refs = await seed(db, args.callbacks, "ingest")
+
+        inline = await fire(inline_refs, lambda ref: apply_event(db, new_event(callback(ref), True)), args.concurrency)
+
+        processor = WebhookProcessor(db, workers=args.workers, poll_interval=0.05)
+        ingested = await fire(ingest_refs, lambda ref: processor.ingest(new_event(callback(ref), True)), args.concurrency)
+        started = time.perf_counter()
+        processor.start()
+        try:
+            while await db.inbound_webhooks.count_documents({"status": {"$in": ["pending", "processing"]}}):
+                await asyncio.sleep(0.05)
+        finally:
+            await processor.close()
+        drained = time.perf_counter() - started
+
+        print(f"callbacks: {args.callbacks}  concurrency: {args.concurrency}  workers: {args.workers}")
+        report("inline", inline)
+        report("ingest", ingested)
+        print(f"worker pool applied {args.callbacks} events in {drained:.2f} s "
+              f"({args.callbacks / drained:.0f} events/sec)")
+    finally:
+        if not args.keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
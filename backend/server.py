@@ -1,28 +1,93 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, BackgroundTasks, Query, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
 import logging
-import shutil
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
+import hashlib
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
 import base64
+from starlette.concurrency import run_in_threadpool
 
 # Import Dusupay service
 from services.dusupay import (
     get_service as get_dusupay_service,
     DusupayConfig,
-    PayoutStatus,
     MOBILE_MONEY_PROVIDERS,
-    COUNTRY_CURRENCY,
+    integration_of,
+    close_http_client as close_dusupay_client,
+    http_client_stats as dusupay_client_stats,
+)
+from services.circuit_breaker import payout_circuits, group_health
+from services.webhooks import WebhookProcessor, new_event as new_webhook_event
+from services.payout_reconciler import PayoutReconciler, PAYOUT_RECONCILE
+from services.telemetry import (
+    telemetry,
+    TelemetryFlusher,
+    PAYROLL_SYNC as TELEMETRY_PAYROLL_SYNC,
+    history as telemetry_history,
+)
+from services.db_indexes import reconcile_indexes
+from services.uploads import part_path, UploadTooLarge
+from services.storage import storage_from_env, serve as serve_stored_file
+from services.kyc_store import (
+    store_blob as store_kyc_blob,
+    release as release_kyc_blob,
+    supersede as supersede_kyc_documents,
+    current as current_kyc_documents,
+    blob_key as kyc_blob_key,
+    verify as verify_kyc_blob,
+)
+from services.pagination import (
+    paginate,
+    set_next_cursor,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    ADMIN_LIST_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+)
+from services.dashboard_stats import (
+    employer_stats,
+    employee_stats,
+    advance_stats,
+    admin_dashboard as admin_dashboard_stats,
+    SETTLED_STATUSES,
+)
+from services.advance_rollups import record_advance, record_advances, move_advance, monthly_breakdown, totals_by
+from services.enrichment import collect_keys, fetch_by_keys, fetch_related, count_by
+from services.passwords import hash_password, verify_password, needs_rehash, shutdown_executor
+from services.user_cache import user_cache
+from services.fraud_engine import FraudEngine
+from services.fraud_counters import record_event as record_fraud_event
+from services import advance_reservations
+from services.payroll_import import SUPPORTED_EXTENSIONS as PAYROLL_EXTENSIONS, write_jsonl_rows
+from services.payroll_jobs import PayrollJobRunner, new_job as new_payroll_job, payroll_key
+from services.disbursements import (
+    DisbursementError,
+    send_payout,
+    record_payout,
+    should_queue as should_queue_payout,
+    queue_payout,
+    PayoutQueue,
+    apply_status as apply_disbursement_status,
+    recipient_name_of,
+    country_of,
+    claim as claim_disbursement,
+    unlock as unlock_disbursement,
+    clear_review as clear_disbursement_review,
+    callback_url as disbursement_callback_url,
+    new_batch as new_disbursement_batch,
+    run_batch as run_disbursement_batch,
+    MAX_BATCH_SIZE as MAX_DISBURSEMENT_BATCH_SIZE,
 )
 
 ROOT_DIR = Path(__file__).parent
@@ -30,16 +95,23 @@ load_dotenv(ROOT_DIR / '.env')
 
 # Upload directory setup
 UPLOAD_DIR = ROOT_DIR / "uploads"
-KYC_UPLOAD_DIR = UPLOAD_DIR / "kyc"
-PROFILE_UPLOAD_DIR = UPLOAD_DIR / "profiles"
+# JSON payrolls are written here before going to upload_storage
+PAYROLL_UPLOAD_DIR = UPLOAD_DIR / "payroll"
 UPLOAD_DIR.mkdir(exist_ok=True)
-KYC_UPLOAD_DIR.mkdir(exist_ok=True)
-PROFILE_UPLOAD_DIR.mkdir(exist_ok=True)
+PAYROLL_UPLOAD_DIR.mkdir(exist_ok=True)
+# KYC, profile and employer documents: UPLOAD_DIR or an S3 bucket (UPLOAD_STORAGE)
+upload_storage = storage_from_env(UPLOAD_DIR)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+fraud_engine = FraudEngine(db)
+payroll_runner = PayrollJobRunner(db, upload_storage)
+payout_queue = PayoutQueue(db, get_dusupay_service)
+telemetry_flusher = TelemetryFlusher(db)
+webhook_processor = WebhookProcessor(db)
+payout_reconciler = PayoutReconciler(db, get_dusupay_service)
 
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'eaziwage-secret-key-2026')
@@ -451,12 +523,6 @@ class ReconciliationTransaction(BaseModel):
 
 # ======================== UTILITIES ========================
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
 def create_token(user_id: str, role: str) -> str:
     payload = {
         "sub": user_id,
@@ -469,10 +535,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = await user_cache.get_or_load(user_id, lambda: db.users.find_one({"id": user_id}, {"_id": 0}))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
+        # Handlers may modify the user dict, so hand out a copy of the cached document
+        return dict(user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
@@ -553,7 +620,7 @@ async def register(user_data: UserCreate):
         "phone_country_code": user_data.phone_country_code,
         "full_name": user_data.full_name,
         "role": user_data.role,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "is_verified": False,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -576,9 +643,17 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user or not await verify_password(credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade hashes made with a different BCRYPT_ROUNDS while we have the plaintext
+    if needs_rehash(user["password_hash"]):
+        await db.users.update_one(
+            {"id": user["id"], "password_hash": user["password_hash"]},
+            {"$set": {"password_hash": await hash_password(credentials.password)}}
+        )
+        user_cache.invalidate(user["id"])
+    
     token = create_token(user["id"], user["role"])
     return TokenResponse(
         access_token=token,
@@ -654,6 +729,7 @@ async def google_auth_callback(data: GoogleAuthCallback):
                 {"id": user_id},
                 {"$set": {"picture": picture}}
             )
+            user_cache.invalidate(user_id)
     else:
         # New user - create account
         is_new_user = True
@@ -942,21 +1018,15 @@ async def upload_employer_document(
     if document_type not in valid_types:
         raise HTTPException(status_code=400, detail=f"Invalid document type. Must be one of: {', '.join(valid_types)}")
     
-    # Create employer documents directory
-    employer_doc_dir = UPLOAD_DIR / "employer_docs"
-    employer_doc_dir.mkdir(exist_ok=True)
-    
     # Generate unique filename
     file_extension = Path(file.filename).suffix.lower()
     if file_extension not in ['.pdf', '.jpg', '.jpeg', '.png', '.webp']:
         raise HTTPException(status_code=400, detail="Invalid file type. Allowed: PDF, JPG, PNG, WebP")
     
     unique_filename = f"{user['id']}_{document_type}_{uuid.uuid4().hex[:8]}{file_extension}"
-    file_path = employer_doc_dir / unique_filename
     
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await upload_storage.save(file, f"employer_docs/{unique_filename}", content_type=file.content_type)
     
     document_url = f"/uploads/employer_docs/{unique_filename}"
     
@@ -1044,9 +1114,12 @@ async def get_my_employee(user: dict = Depends(require_role(UserRole.EMPLOYEE)))
 
 @api_router.get("/employees", response_model=List[EmployeeResponse])
 async def list_employees(
+    response: Response,
     employer_id: Optional[str] = None,
     status: Optional[str] = None,
     kyc_status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     user: dict = Depends(require_role(UserRole.ADMIN, UserRole.EMPLOYER))
 ):
     query = {}
@@ -1061,7 +1134,8 @@ async def list_employees(
     if kyc_status:
         query["kyc_status"] = kyc_status
     
-    employees = await db.employees.find(query, {"_id": 0}).to_list(1000)
+    employees, next_cursor = await paginate(db.employees, query, cursor=cursor, limit=limit)
+    set_next_cursor(response, next_cursor)
     
     # Get employer names
     employer_ids = list(set(e.get("employer_id") for e in employees))
@@ -1094,23 +1168,34 @@ async def update_employee_kyc_status(employee_id: str, kyc_status: str, user: di
 
 @api_router.post("/advances", response_model=AdvanceResponse)
 async def create_advance(data: AdvanceCreate, user: dict = Depends(require_role(UserRole.EMPLOYEE))):
-    employee = await db.employees.find_one({"user_id": user["id"]}, {"_id": 0})
+    # Validate and hold the amount in one conditional update so concurrent requests cannot overdraw
+    employee = await advance_reservations.reserve(db, user["id"], data.amount)
     if not employee:
-        raise HTTPException(status_code=404, detail="Employee profile not found")
-    
-    if employee["status"] != "approved" or employee["kyc_status"] != "approved":
-        raise HTTPException(status_code=400, detail="Account not verified")
-    
-    if data.amount > employee["advance_limit"]:
-        raise HTTPException(status_code=400, detail=f"Amount exceeds limit of {employee['advance_limit']}")
-    
-    if data.amount > employee["earned_wages"]:
-        raise HTTPException(status_code=400, detail=f"Amount exceeds earned wages of {employee['earned_wages']}")
+        # Work out which check failed (only on the error path)
+        employee = await db.employees.find_one({"user_id": user["id"]}, {"_id": 0})
+        if not employee:
+            raise HTTPException(status_code=404, detail="Employee profile not found")
+        
+        if employee["status"] != "approved" or employee["kyc_status"] != "approved":
+            raise HTTPException(status_code=400, detail="Account not verified")
+        
+        if data.amount > employee["advance_limit"]:
+            raise HTTPException(status_code=400, detail=f"Amount exceeds limit of {employee['advance_limit']}")
+        
+        raise HTTPException(status_code=400, detail=f"Amount exceeds earned wages of {advance_reservations.available_wages(employee)}")
     
-    employer = await db.employers.find_one({"id": employee["employer_id"]}, {"_id": 0})
+    try:
+        employer = await db.employers.find_one({"id": employee["employer_id"]}, {"_id": 0})
+        
+        # Check fraud rules
+        fraud_check = await check_fraud_rules({"amount": data.amount}, employee)
+    except Exception:
+        await advance_reservations.cancel(db, employee["id"], data.amount)
+        raise
     
-    # Check fraud rules
-    fraud_check = await check_fraud_rules({"amount": data.amount}, employee)
+    # Blocked requests are recorded as rejected and hold nothing
+    if fraud_check["should_block"]:
+        await advance_reservations.cancel(db, employee["id"], data.amount)
     
     # Calculate fee based on risk scores
     employee_crs = employee.get("risk_score", 3.0)
@@ -1147,6 +1232,7 @@ async def create_advance(data: AdvanceCreate, user: dict = Depends(require_role(
         "employee_name": user["full_name"],
         "employer_id": employee["employer_id"],
         "employer_name": employer["company_name"] if employer else "Unknown",
+        "country": employer.get("country") if employer else None,
         "amount": data.amount,
         "fee_percentage": fee_percentage,
         "fee_amount": fee_amount,
@@ -1154,6 +1240,7 @@ async def create_advance(data: AdvanceCreate, user: dict = Depends(require_role(
         "disbursement_method": data.disbursement_method,
         "disbursement_details": disbursement_details,
         "status": initial_status,
+        "reserved_amount": 0 if fraud_check["should_block"] else data.amount,
         "reason": data.reason,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "processed_at": None,
@@ -1165,7 +1252,13 @@ async def create_advance(data: AdvanceCreate, user: dict = Depends(require_role(
         "flagged_at": datetime.now(timezone.utc).isoformat() if fraud_check["should_flag"] else None,
         "fraud_violations": fraud_check["violations"]
     }
-    await db.advances.insert_one(advance_doc)
+    try:
+        await db.advances.insert_one(advance_doc)
+    except Exception:
+        await advance_reservations.release(db, advance_doc)
+        raise
+    await record_advance(db, advance_doc, advance_doc["country"])
+    await record_fraud_event(db, employee["id"], advance_doc["created_at"], data.amount)
     
     # Create transaction record
     await db.transactions.insert_one({
@@ -1191,7 +1284,10 @@ async def create_advance(data: AdvanceCreate, user: dict = Depends(require_role(
 
 @api_router.get("/advances", response_model=List[AdvanceResponse])
 async def list_advances(
+    response: Response,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -1208,7 +1304,8 @@ async def list_advances(
     if status:
         query["status"] = status
     
-    advances = await db.advances.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    advances, next_cursor = await paginate(db.advances, query, cursor=cursor, limit=limit)
+    set_next_cursor(response, next_cursor)
     return [AdvanceResponse(**a) for a in advances]
 
 @api_router.get("/advances/{advance_id}", response_model=AdvanceResponse)
@@ -1220,24 +1317,21 @@ async def get_advance(advance_id: str, user: dict = Depends(get_current_user)):
 
 @api_router.patch("/advances/{advance_id}/approve")
 async def approve_advance(advance_id: str, user: dict = Depends(require_role(UserRole.ADMIN))):
-    advance = await db.advances.find_one({"id": advance_id}, {"_id": 0})
+    # Only one caller can move the advance out of pending, so wages are deducted exactly once
+    advance = await db.advances.find_one_and_update(
+        {"id": advance_id, "status": "pending"},
+        {"$set": {"status": "approved", "processed_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
     if not advance:
-        raise HTTPException(status_code=404, detail="Advance not found")
-    
-    if advance["status"] != "pending":
+        if not await db.advances.find_one({"id": advance_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Advance not found")
         raise HTTPException(status_code=400, detail="Advance already processed")
+    await move_advance(db, advance, "approved")
     
-    # Update advance status
-    await db.advances.update_one(
-        {"id": advance_id},
-        {"$set": {"status": "approved", "processed_at": datetime.now(timezone.utc).isoformat()}}
-    )
-    
-    # Update employee earned wages
-    await db.employees.update_one(
-        {"id": advance["employee_id"]},
-        {"$inc": {"earned_wages": -advance["amount"]}}
-    )
+    # Deduct from earned wages and drop the hold taken at request time
+    await advance_reservations.settle(db, advance)
     
     # Update transaction
     await db.transactions.update_one(
@@ -1262,6 +1356,8 @@ async def disburse_advance(
     
     if advance["status"] != "approved":
         raise HTTPException(status_code=400, detail="Advance not approved")
+    if advance.get("disbursement_review"):
+        raise HTTPException(status_code=409, detail="Disbursement is waiting for manual review")
     
     # Get employee details
     employee = await db.employees.find_one({"id": advance["employee_id"]}, {"_id": 0})
@@ -1270,119 +1366,43 @@ async def disburse_advance(
     
     # Get user details for recipient name
     employee_user = await db.users.find_one({"id": employee.get("user_id")}, {"_id": 0})
-    recipient_name = employee_user.get("full_name", "Unknown") if employee_user else "Unknown"
+    recipient_name = recipient_name_of(employee_user)
     
     # Get employer for country code
     employer = await db.employers.find_one({"id": employee.get("employer_id")}, {"_id": 0})
-    country_code = employer.get("country", "KE") if employer else "KE"
+    country_code = country_of(employer)
+    
+    # Lock the advance so a second click or a running batch cannot pay it again
+    lock = str(uuid.uuid4())
+    if not await claim_disbursement(db, [advance_id], lock):
+        raise HTTPException(status_code=409, detail="Disbursement already in progress")
+    advance["disbursement_lock"] = lock
     
     # Initialize Dusupay service
     dusupay = get_dusupay_service()
     
-    # Get callback URL from environment
-    callback_base = os.environ.get("REACT_APP_BACKEND_URL", "")
-    callback_url = f"{callback_base}/api/webhooks/dusupay" if callback_base else None
-    
-    # Generate merchant reference
-    merchant_reference = dusupay.generate_reference(prefix="EWA")
-    
     # Determine disbursement method and execute payout
-    disbursement_method = advance.get("disbursement_method", "mobile_money")
-    disbursement_details = advance.get("disbursement_details", {})
-    
-    payout_response = None
-    
-    if disbursement_method == "mobile_money":
-        # Mobile Money Payout
-        provider = disbursement_details.get("provider", employee.get("mobile_money_provider", "mpesa"))
-        phone_number = disbursement_details.get("number", employee.get("mobile_money_number", ""))
-        
-        if not phone_number:
-            raise HTTPException(status_code=400, detail="Mobile money number not configured for employee")
-        
-        payout_response = await dusupay.create_mobile_money_payout(
-            amount=advance["net_amount"],
-            country_code=country_code,
-            provider_name=provider,
-            phone_number=phone_number,
-            recipient_name=recipient_name,
-            reference=merchant_reference,
-            narration=f"EaziWage Advance - {advance_id[:8]}",
-            callback_url=callback_url
-        )
-    
-    elif disbursement_method == "bank_transfer":
-        # Bank Transfer Payout
-        bank_code = disbursement_details.get("bank_code", "")
-        account_number = disbursement_details.get("account_number", employee.get("bank_account_number", ""))
-        account_name = disbursement_details.get("account_name", recipient_name)
-        
-        if not account_number or not bank_code:
-            raise HTTPException(status_code=400, detail="Bank account details not configured for employee")
-        
-        payout_response = await dusupay.create_bank_payout(
-            amount=advance["net_amount"],
-            country_code=country_code,
-            bank_code=bank_code,
-            account_number=account_number,
-            account_name=account_name,
-            reference=merchant_reference,
-            narration=f"EaziWage Advance - {advance_id[:8]}",
-            callback_url=callback_url
-        )
-    
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported disbursement method: {disbursement_method}")
-    
-    # Handle payout response
-    if payout_response and payout_response.success:
-        # Update advance with pending disbursement status
-        await db.advances.update_one(
-            {"id": advance_id},
-            {"$set": {
-                "status": "disbursing",
-                "disbursement_reference": merchant_reference,
-                "dusupay_reference": payout_response.internal_reference,
-                "disbursement_initiated_at": datetime.now(timezone.utc).isoformat(),
-                "disbursement_status": "PENDING"
-            }}
+    try:
+        merchant_reference, payout_response = await send_payout(
+            dusupay, advance, employee, recipient_name, country_code, disbursement_callback_url()
         )
-        
-        # Create disbursement record for tracking
-        await db.disbursements.insert_one({
-            "id": str(uuid.uuid4()),
-            "advance_id": advance_id,
-            "employee_id": advance["employee_id"],
-            "employer_id": employee.get("employer_id"),
-            "merchant_reference": merchant_reference,
-            "internal_reference": payout_response.internal_reference,
-            "amount": advance["net_amount"],
-            "currency": COUNTRY_CURRENCY.get(country_code, "KES").value if hasattr(COUNTRY_CURRENCY.get(country_code, "KES"), 'value') else "KES",
-            "method": disbursement_method,
-            "provider": disbursement_details.get("provider", ""),
-            "recipient": disbursement_details.get("number") or disbursement_details.get("account_number", ""),
-            "recipient_name": recipient_name,
-            "status": "PENDING",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "raw_response": payout_response.raw_response
-        })
-        
-        # Create transaction record
-        await db.transactions.insert_one({
-            "id": str(uuid.uuid4()),
-            "user_id": advance["employee_id"],
-            "type": "disbursement",
-            "amount": advance["net_amount"],
+    except DisbursementError as e:
+        await unlock_disbursement(db, advance_id, lock)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Route is failing fast, or Dusupay may have accepted the payout without saying so:
+    # keep the advance approved and let the payout queue send it later on the same reference
+    if should_queue_payout(payout_response):
+        await queue_payout(db, advance, merchant_reference, payout_response)
+        return {
+            "message": f"Disbursement queued: {payout_response.message}",
             "reference": merchant_reference,
-            "status": "pending",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "metadata": {
-                "advance_id": advance_id, 
-                "method": disbursement_method,
-                "dusupay_reference": payout_response.internal_reference
-            }
-        })
-        
+            "status": "QUEUED"
+        }
+    
+    # Record the outcome (advance status, disbursement and transaction records)
+    error_message = await record_payout(db, advance, employee, recipient_name, country_code, merchant_reference, payout_response)
+    if error_message is None:
         return {
             "message": "Disbursement initiated successfully",
             "reference": merchant_reference,
@@ -1390,31 +1410,23 @@ async def disburse_advance(
             "status": "PENDING"
         }
     
-    else:
-        # Payout failed - update advance with error
-        error_message = payout_response.message if payout_response else "Unknown error"
-        
-        await db.advances.update_one(
-            {"id": advance_id},
-            {"$set": {
-                "disbursement_error": error_message,
-                "disbursement_failed_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Disbursement failed: {error_message}"
-        )
+    raise HTTPException(
+        status_code=500, 
+        detail=f"Disbursement failed: {error_message}"
+    )
 
 @api_router.patch("/advances/{advance_id}/reject")
 async def reject_advance(advance_id: str, reason: str = "", user: dict = Depends(require_role(UserRole.ADMIN))):
-    result = await db.advances.update_one(
+    advance = await db.advances.find_one_and_update(
         {"id": advance_id, "status": "pending"},
-        {"$set": {"status": "rejected", "rejection_reason": reason, "processed_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": "rejected", "rejection_reason": reason, "processed_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count == 0:
+    if not advance:
         raise HTTPException(status_code=400, detail="Advance not found or already processed")
+    await move_advance(db, advance, "rejected")
+    await advance_reservations.release(db, advance)
     
     await db.transactions.update_one(
         {"reference": advance_id},
@@ -1462,23 +1474,33 @@ async def list_kyc_documents(
     if status:
         query["status"] = status
     
-    docs = await db.kyc_documents.find(query, {"_id": 0}).to_list(1000)
+    docs = await db.kyc_documents.find(current_kyc_documents(query), {"_id": 0}).to_list(1000)
     return [KYCDocumentResponse(**d) for d in docs]
 
 @api_router.patch("/kyc/documents/{doc_id}/review")
 async def review_kyc_document(doc_id: str, status: str, notes: str = "", user: dict = Depends(require_role(UserRole.ADMIN))):
     result = await db.kyc_documents.update_one(
-        {"id": doc_id},
+        current_kyc_documents({"id": doc_id}),
         {"$set": {
             "status": status,
             "reviewer_notes": notes,
             "reviewed_at": datetime.now(timezone.utc).isoformat()
         }}
     )
-    if result.modified_count == 0:
+    if result.matched_count == 0:
+        if await db.kyc_documents.find_one({"id": doc_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Document was replaced by a newer upload")
         raise HTTPException(status_code=404, detail="Document not found")
     return {"message": "Document reviewed"}
 
+KYC_MAX_FILE_SIZE = 5 * 1024 * 1024
+PROFILE_PICTURE_MAX_FILE_SIZE = 2 * 1024 * 1024
+# Reviewers re-open the same documents; never shared caches
+KYC_FILE_CACHE_CONTROL = "private, max-age=300"
+# Picture names carry their content hash, so a URL never changes content
+PROFILE_PICTURE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+LEGACY_PROFILE_PICTURE_CACHE_CONTROL = "public, max-age=3600"
+
 # File Upload endpoint for KYC documents
 @api_router.post("/kyc/upload")
 async def upload_kyc_file(
@@ -1493,21 +1515,16 @@ async def upload_kyc_file(
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, WebP, and PDF are allowed.")
     
-    # Validate file size (max 5MB)
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-    if file_size > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File size must be less than 5MB")
-    
     # Generate unique filename
     file_ext = Path(file.filename).suffix if file.filename else ".jpg"
     unique_filename = f"{user['id']}_{document_type}_{uuid.uuid4().hex[:8]}{file_ext}"
-    file_path = KYC_UPLOAD_DIR / unique_filename
     
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # Stored once per distinct content; a re-uploaded scan only adds a reference
+    try:
+        blob = await store_kyc_blob(db, upload_storage, file, KYC_MAX_FILE_SIZE, file.content_type)
+    except UploadTooLarge:
+        raise HTTPException(status_code=400, detail="File size must be less than 5MB")
+    file_size = blob["size"]
     
     # Create document record
     doc_id = str(uuid.uuid4())
@@ -1521,12 +1538,20 @@ async def upload_kyc_file(
         "file_name": file.filename,
         "file_size": file_size,
         "content_type": file.content_type,
+        "stored_name": unique_filename,
+        "sha256": blob["sha256"],
         "status": "pending",
         "reviewer_notes": None,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "reviewed_at": None
     }
-    await db.kyc_documents.insert_one(doc)
+    try:
+        await db.kyc_documents.insert_one(doc)
+    except BaseException:
+        await release_kyc_blob(db, upload_storage, blob["sha256"])
+        raise
+    # The new upload replaces earlier pending or rejected documents of this type
+    await supersede_kyc_documents(db, upload_storage, doc)
     
     # Update employee's document path
     if user["role"] == UserRole.EMPLOYEE:
@@ -1567,21 +1592,46 @@ async def upload_kyc_file(
 
 # Serve uploaded KYC files
 @api_router.get("/kyc/files/{filename}")
-async def get_kyc_file(filename: str, user: dict = Depends(get_current_user)):
+async def get_kyc_file(filename: str, request: Request, user: dict = Depends(get_current_user)):
     """Serve a KYC document file"""
-    file_path = KYC_UPLOAD_DIR / filename
-    
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
+    doc = await db.kyc_documents.find_one(
+        {"stored_name": filename}, {"_id": 0, "user_id": 1, "sha256": 1, "content_type": 1}
+    )
+    if doc:
+        key = kyc_blob_key(doc["sha256"])
+        owner_id = doc["user_id"]
+    else:
+        # Uploaded before the content-addressed store
+        key = f"kyc/{filename}"
+        owner_id = filename.split("_", 1)[0]
+        if not await upload_storage.exists(key):
+            raise HTTPException(status_code=404, detail="File not found")
     
     # For admin, allow access to any file
     # For users, verify they own the file
     if user["role"] != UserRole.ADMIN:
-        if not filename.startswith(user["id"]):
+        if owner_id != user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
     
-    from fastapi.responses import FileResponse
-    return FileResponse(file_path)
+    # Streamed from disk, or a redirect to a presigned URL on object storage; the
+    # blob's hash is a strong ETag, so a revalidation never touches the storage
+    try:
+        return await serve_stored_file(
+            upload_storage, key, request,
+            media_type=doc.get("content_type") if doc else None,
+            etag=doc.get("sha256") if doc else None,
+            cache_control=KYC_FILE_CACHE_CONTROL
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+@api_router.get("/admin/kyc/blobs/{sha256}/verify")
+async def verify_kyc_file(sha256: str, user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Re-hash a stored KYC file and compare it with its content address"""
+    blob = await db.kyc_blobs.find_one({"sha256": sha256}, {"_id": 0})
+    if not blob:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return {**blob, "intact": await verify_kyc_blob(upload_storage, blob)}
 
 # Update employee KYC step
 @api_router.patch("/employees/me/kyc-step")
@@ -1601,7 +1651,7 @@ async def update_employee_kyc_step(step: int, user: dict = Depends(require_role(
 async def get_employee_kyc_status(user: dict = Depends(require_role(UserRole.EMPLOYEE))):
     """Get comprehensive KYC status for the employee"""
     employee = await db.employees.find_one({"user_id": user["id"]}, {"_id": 0})
-    documents = await db.kyc_documents.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+    documents = await db.kyc_documents.find(current_kyc_documents({"user_id": user["id"]}), {"_id": 0}).to_list(100)
     
     # Check which documents are uploaded and approved
     doc_status = {}
@@ -1730,41 +1780,14 @@ async def upload_payroll(data: PayrollUpload, user: dict = Depends(require_role(
     if not employer:
         raise HTTPException(status_code=404, detail="Employer profile not found")
     
-    # Process each employee's payroll
-    for emp_data in data.employees:
-        employee = await db.employees.find_one({
-            "employer_id": employer["id"],
-            "employee_code": emp_data.get("employee_code")
-        })
-        
-        if employee:
-            days_worked = emp_data.get("days_worked", 0)
-            gross_salary = emp_data.get("gross_salary", employee.get("monthly_salary", 0))
-            
-            # Calculate earned wages (pro-rata based on days worked)
-            daily_rate = gross_salary / 30
-            earned_wages = daily_rate * days_worked
-            advance_limit = earned_wages * 0.5  # 50% of earned wages
-            
-            await db.employees.update_one(
-                {"id": employee["id"]},
-                {"$set": {
-                    "earned_wages": earned_wages,
-                    "advance_limit": advance_limit,
-                    "last_payroll_update": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-    
-    # Store payroll record
-    await db.payroll_records.insert_one({
-        "id": str(uuid.uuid4()),
-        "employer_id": employer["id"],
-        "month": data.month,
-        "employees": data.employees,
-        "uploaded_at": datetime.now(timezone.utc).isoformat()
-    })
+    # Store the rows where every replica's payroll workers can read them
+    key = payroll_key(employer["id"], ".jsonl")
+    part = part_path(PAYROLL_UPLOAD_DIR / Path(key).name)
+    await run_in_threadpool(write_jsonl_rows, part, data.employees)
+    await upload_storage.put_file(part, key, content_type="application/x-ndjson")
+    job = await payroll_runner.enqueue(new_payroll_job(employer["id"], data.month, None, key))
     
-    return {"message": f"Payroll uploaded for {len(data.employees)} employees"}
+    return {"message": f"Payroll queued for {len(data.employees)} employees", "job_id": job["id"]}
 
 @api_router.get("/payroll/history")
 async def get_payroll_history(user: dict = Depends(require_role(UserRole.EMPLOYER))):
@@ -1779,6 +1802,60 @@ async def get_payroll_history(user: dict = Depends(require_role(UserRole.EMPLOYE
     
     return records
 
+PAYROLL_MAX_FILE_SIZE = 50 * 1024 * 1024
+
+@api_router.post("/payroll/upload-file")
+async def upload_payroll_file(
+    file: UploadFile = File(...),
+    month: str = Form(...),
+    user: dict = Depends(require_role(UserRole.EMPLOYER))
+):
+    """Upload a CSV / XLSX payroll file; the payroll workers apply it in the background"""
+    employer = await db.employers.find_one({"user_id": user["id"]}, {"_id": 0})
+    if not employer:
+        raise HTTPException(status_code=404, detail="Employer profile not found")
+    
+    file_ext = Path(file.filename or "").suffix.lower()
+    if file_ext not in PAYROLL_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only CSV and XLSX are allowed.")
+    
+    # Stream the upload to storage chunk by chunk so large payrolls never sit in memory
+    key = payroll_key(employer["id"], file_ext)
+    try:
+        await upload_storage.save(file, key, PAYROLL_MAX_FILE_SIZE, content_type=file.content_type)
+    except UploadTooLarge:
+        raise HTTPException(status_code=400, detail="File size must be less than 50MB")
+    
+    job = await payroll_runner.enqueue(new_payroll_job(employer["id"], month, file.filename, key))
+    job.pop("stored_key")
+    return job
+
+@api_router.get("/payroll/jobs")
+async def list_payroll_jobs(user: dict = Depends(require_role(UserRole.EMPLOYER))):
+    employer = await db.employers.find_one({"user_id": user["id"]}, {"_id": 0})
+    if not employer:
+        raise HTTPException(status_code=404, detail="Employer profile not found")
+    
+    return await db.payroll_jobs.find(
+        {"employer_id": employer["id"]},
+        {"_id": 0, "stored_key": 0, "errors": 0}
+    ).sort("created_at", -1).to_list(50)
+
+@api_router.get("/payroll/jobs/{job_id}")
+async def get_payroll_job(job_id: str, user: dict = Depends(require_role(UserRole.EMPLOYER))):
+    """Progress of a payroll file upload, polled by the dashboard"""
+    employer = await db.employers.find_one({"user_id": user["id"]}, {"_id": 0})
+    if not employer:
+        raise HTTPException(status_code=404, detail="Employer profile not found")
+    
+    job = await db.payroll_jobs.find_one(
+        {"id": job_id, "employer_id": employer["id"]},
+        {"_id": 0, "stored_key": 0}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Payroll job not found")
+    return job
+
 # ======================== TRANSACTION ENDPOINTS ========================
 
 @api_router.get("/transactions", response_model=List[TransactionResponse])
@@ -1846,25 +1923,23 @@ async def get_employer_dashboard(user: dict = Depends(require_role(UserRole.EMPL
 
 @api_router.get("/dashboard/admin", response_model=AdminDashboardStats)
 async def get_admin_dashboard(user: dict = Depends(require_role(UserRole.ADMIN))):
-    employers = await db.employers.find({}, {"_id": 0}).to_list(1000)
-    employees = await db.employees.find({}, {"_id": 0}).to_list(1000)
-    
-    pending_employer_verifications = len([e for e in employers if e.get("status") == "pending"])
-    pending_employee_verifications = len([e for e in employees if e.get("kyc_status") == "submitted"])
-    
-    # Today's advances
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    advances = await db.advances.find({"created_at": {"$gte": today_start.isoformat()}}, {"_id": 0}).to_list(1000)
-    total_advances_today = sum(a.get("amount", 0) for a in advances)
-    pending_disbursements = len([a for a in advances if a.get("status") == "approved"])
+    now = datetime.now(timezone.utc)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today_start.replace(day=1)
+    
+    employers, employees, advances = await asyncio.gather(
+        employer_stats(db),
+        employee_stats(db),
+        advance_stats(db, month_start.isoformat(), today_start.isoformat())
+    )
     
     return AdminDashboardStats(
-        total_employers=len(employers),
-        total_employees=len(employees),
-        pending_employer_verifications=pending_employer_verifications,
-        pending_employee_verifications=pending_employee_verifications,
-        total_advances_today=total_advances_today,
-        pending_disbursements=pending_disbursements
+        total_employers=employers["total"],
+        total_employees=employees["total"],
+        pending_employer_verifications=employers["pending"],
+        pending_employee_verifications=employees["kyc_submitted"],
+        total_advances_today=advances["today_amount"],
+        pending_disbursements=advances["today_approved"]
     )
 
 # ======================== UTILITY ENDPOINTS ========================
@@ -1913,20 +1988,21 @@ async def upload_profile_picture(
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WebP are allowed.")
     
-    # Validate file size (max 2MB)
-    content = await file.read()
-    file_size = len(content)
-    if file_size > 2 * 1024 * 1024:
+    # Spool and hash, enforcing the 2MB limit as the bytes arrive
+    digest = hashlib.sha256()
+    try:
+        part, file_size = await upload_storage.spool(file, PROFILE_PICTURE_MAX_FILE_SIZE, digest)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="File size must be less than 2MB")
     
-    # Generate unique filename
+    # Named by content hash (see profile_picture_etag)
     file_ext = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{user['id']}_profile_{uuid.uuid4().hex[:8]}{file_ext}"
-    file_path = PROFILE_UPLOAD_DIR / unique_filename
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    unique_filename = f"{user['id']}_profile_{digest.hexdigest()[:16]}{file_ext}"
+    try:
+        await upload_storage.put_file(part, f"profiles/{unique_filename}", file.content_type)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
     
     profile_url = f"/api/profiles/{unique_filename}"
     
@@ -1935,6 +2011,7 @@ async def upload_profile_picture(
         {"id": user["id"]},
         {"$set": {"profile_picture_url": profile_url}}
     )
+    user_cache.invalidate(user["id"])
     
     return {
         "profile_picture_url": profile_url,
@@ -1942,16 +2019,24 @@ async def upload_profile_picture(
         "message": "Profile picture uploaded successfully"
     }
 
+def profile_picture_etag(filename: str) -> Optional[str]:
+    """Content hash in a picture's name; None for pictures named before hashing"""
+    digest = Path(filename).stem.rpartition("_profile_")[2]
+    if len(digest) == 16 and all(c in "0123456789abcdef" for c in digest):
+        return digest
+    return None
+
 @api_router.get("/profiles/{filename}")
-async def get_profile_picture(filename: str):
+async def get_profile_picture(filename: str, request: Request):
     """Serve a profile picture file"""
-    file_path = PROFILE_UPLOAD_DIR / filename
-    
-    if not file_path.exists():
+    etag = profile_picture_etag(filename)
+    try:
+        return await serve_stored_file(
+            upload_storage, f"profiles/{filename}", request, etag=etag,
+            cache_control=PROFILE_PICTURE_CACHE_CONTROL if etag else LEGACY_PROFILE_PICTURE_CACHE_CONTROL
+        )
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    
-    from fastapi.responses import FileResponse
-    return FileResponse(file_path)
 
 # ======================== USER SETTINGS ENDPOINTS ========================
 
@@ -1993,6 +2078,7 @@ async def update_user_settings(
             {"id": user["id"]},
             {"$set": update_data}
         )
+        user_cache.invalidate(user["id"])
     
     return {"message": "Settings updated successfully"}
 
@@ -2008,7 +2094,7 @@ async def change_password(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify current password
-    if not verify_password(data.current_password, user_doc.get("password_hash", "")):
+    if not await verify_password(data.current_password, user_doc.get("password_hash", "")):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Validate new password
@@ -2016,11 +2102,12 @@ async def change_password(
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
     
     # Update password
-    new_hash = hash_password(data.new_password)
+    new_hash = await hash_password(data.new_password)
     await db.users.update_one(
         {"id": user["id"]},
         {"$set": {"password_hash": new_hash}}
     )
+    user_cache.invalidate(user["id"])
     
     return {"message": "Password changed successfully"}
 
@@ -2088,7 +2175,9 @@ async def get_full_user_profile(user: dict = Depends(get_current_user)):
                     result["employee"]["employer_name"] = employer.get("company_name")
             
             # Get KYC documents
-            documents = await db.kyc_documents.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+            documents = await db.kyc_documents.find(
+                current_kyc_documents({"user_id": user["id"]}), {"_id": 0}
+            ).to_list(100)
             result["kyc_documents"] = documents
     
     return result
@@ -2254,6 +2343,9 @@ async def seed_demo_employees(user: dict = Depends(require_role(UserRole.EMPLOYE
     statuses = ["approved", "approved", "approved", "approved", "pending", "pending"]
     
     employees_created = []
+    advances_created = []
+    # Every demo account shares one password, so hash it once rather than 60 times
+    demo_password_hash = await hash_password("Employee@123")
     
     for i in range(60):
         first_name = random.choice(first_names)
@@ -2304,7 +2396,7 @@ async def seed_demo_employees(user: dict = Depends(require_role(UserRole.EMPLOYE
             "phone": f"+2547{random.randint(10000000, 99999999)}",
             "full_name": full_name,
             "role": "employee",
-            "password_hash": hash_password("Employee@123"),
+            "password_hash": demo_password_hash,
             "is_verified": kyc_status == "approved",
             "created_at": (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
         })
@@ -2351,7 +2443,7 @@ async def seed_demo_employees(user: dict = Depends(require_role(UserRole.EMPLOYE
                 
                 days_ago_advance = random.randint(1, min(days_ago, 90))
                 
-                await db.advances.insert_one({
+                advance_doc = {
                     "id": advance_id,
                     "employee_id": employee_id,
                     "employee_name": full_name,
@@ -2365,7 +2457,11 @@ async def seed_demo_employees(user: dict = Depends(require_role(UserRole.EMPLOYE
                     "disbursement_details": {"provider": "M-PESA"},
                     "status": advance_status,
                     "created_at": (datetime.now(timezone.utc) - timedelta(days=days_ago_advance)).isoformat()
-                })
+                }
+                await db.advances.insert_one(advance_doc)
+                advances_created.append(advance_doc)
+    
+    await record_advances(db, advances_created, employer.get("country"))
     
     return {"message": f"Created {len(employees_created)} demo employees with advances", "count": len(employees_created)}
 
@@ -2474,9 +2570,10 @@ async def get_review_requests(user: dict = Depends(require_role(UserRole.ADMIN))
     requests = await db.admin_requests.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
     
     # Enrich with employer names
+    employers = await fetch_related(db.employers, requests, "employer_id", projection={"_id": 0, "company_name": 1, "contact_email": 1})
     for req in requests:
         if req.get("employer_id"):
-            employer = await db.employers.find_one({"id": req["employer_id"]}, {"_id": 0, "company_name": 1, "contact_email": 1})
+            employer = employers.get(req["employer_id"])
             if employer:
                 req["employer_name"] = employer.get("company_name")
                 req["contact_email"] = employer.get("contact_email")
@@ -2534,109 +2631,70 @@ async def admin_review_advance(
         update_data["status"] = "rejected"
         update_data["rejection_reason"] = f"Blocked due to fraud review: {notes}"
     
-    result = await db.advances.update_one(
+    advance = await db.advances.find_one_and_update(
         {"id": advance_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if not advance:
         raise HTTPException(status_code=404, detail="Advance not found")
     
+    if "status" in update_data:
+        await move_advance(db, advance, update_data["status"])
+        await advance_reservations.release(db, advance)
+    
     return {"message": f"Advance {decision}"}
 
 # Admin Dashboard - Platform Overview
 @api_router.get("/admin/dashboard")
 async def get_admin_dashboard_extended(user: dict = Depends(require_role(UserRole.ADMIN))):
     """Get comprehensive admin dashboard stats"""
-    # Employers
-    employers = await db.employers.find({}, {"_id": 0}).to_list(1000)
-    total_employers = len(employers)
-    active_employers = len([e for e in employers if e.get("status") == "approved"])
-    pending_employers = len([e for e in employers if e.get("status") == "pending"])
-    
-    # Employees
-    employees = await db.employees.find({}, {"_id": 0}).to_list(10000)
-    total_employees = len(employees)
-    active_employees = len([e for e in employees if e.get("status") == "approved"])
-    pending_employees = len([e for e in employees if e.get("status") == "pending"])
-    
-    # KYC Stats
-    kyc_pending_employers = len([e for e in employers if e.get("status") == "pending"])
-    kyc_pending_employees = len([e for e in employees if e.get("kyc_status") in ["pending", "submitted"]])
-    
-    # Advances
-    advances = await db.advances.find({}, {"_id": 0}).to_list(10000)
-    total_advances = len(advances)
-    total_disbursed = sum(a.get("amount", 0) for a in advances if a.get("status") in ["approved", "disbursed", "repaid"])
-    total_fees = sum(a.get("fee_amount", 0) for a in advances if a.get("status") in ["approved", "disbursed", "repaid"])
-    pending_advances = len([a for a in advances if a.get("status") == "pending"])
+    # One $facet aggregation per collection - only the totals leave MongoDB
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    current_month = today_start.replace(day=1)
+    stats, pending_reviews = await asyncio.gather(
+        admin_dashboard_stats(db, current_month.isoformat(), today_start.isoformat()),
+        db.admin_requests.count_documents({"status": "pending"})
+    )
     
-    # Monthly stats (current month)
-    current_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_advances = [a for a in advances if a.get("created_at") and datetime.fromisoformat(a["created_at"].replace('Z', '+00:00')) >= current_month]
-    monthly_disbursed = sum(a.get("amount", 0) for a in monthly_advances if a.get("status") in ["approved", "disbursed"])
-    monthly_fees = sum(a.get("fee_amount", 0) for a in monthly_advances if a.get("status") in ["approved", "disbursed"])
-    
-    # Risk distribution
-    employer_risk_scores = [e.get("risk_score", 3.0) for e in employers if e.get("risk_score")]
-    avg_employer_risk = round(sum(employer_risk_scores) / len(employer_risk_scores), 2) if employer_risk_scores else 0
-    
-    # Review requests
-    pending_reviews = await db.admin_requests.count_documents({"status": "pending"})
-    
-    # API Health (mock)
-    api_health = {
-        "mpesa": {"status": "healthy", "latency": 120},
-        "airtel_money": {"status": "healthy", "latency": 95},
-        "bank_api": {"status": "healthy", "latency": 200},
-        "payroll_sync": {"status": "healthy", "latency": 150}
-    }
+    # API Health from in-process telemetry and the payout circuit breakers
+    api_health = {}
+    for key in API_HEALTH_ALWAYS_LISTED:
+        live = integration_health(key)
+        api_health[key] = {
+            "status": live["status"],
+            "latency": live["latency_ms"]["p50"],
+            "latency_ms": live["latency_ms"]["p50"],
+            "uptime_percent": live["uptime_percent"]
+        }
     
     return {
-        "employers": {
-            "total": total_employers,
-            "active": active_employers,
-            "pending": pending_employers
-        },
-        "employees": {
-            "total": total_employees,
-            "active": active_employees,
-            "pending": pending_employees
-        },
-        "kyc_pending": {
-            "employers": kyc_pending_employers,
-            "employees": kyc_pending_employees
-        },
-        "advances": {
-            "total_count": total_advances,
-            "total_disbursed": total_disbursed,
-            "total_fees": total_fees,
-            "pending_count": pending_advances
-        },
-        "monthly": {
-            "disbursed": monthly_disbursed,
-            "fees": monthly_fees,
-            "advance_count": len(monthly_advances)
-        },
-        "risk": {
-            "avg_employer_score": avg_employer_risk
-        },
+        **stats,
         "pending_reviews": pending_reviews,
         "api_health": api_health
     }
 
 # Admin - List all employers
 @api_router.get("/admin/employers")
-async def admin_list_employers(user: dict = Depends(require_role(UserRole.ADMIN))):
-    """Get all employers for admin management"""
-    employers = await db.employers.find({}, {"_id": 0}).to_list(1000)
-    # Enrich with user data
+async def admin_list_employers(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Get employers for admin management, newest first (paged via X-Next-Cursor)"""
+    employers, next_cursor = await paginate(db.employers, {}, cursor=cursor, limit=limit)
+    set_next_cursor(response, next_cursor)
+    # Enrich with user data and employee counts
+    users, emp_counts = await asyncio.gather(
+        fetch_related(db.users, employers, "user_id", projection={"_id": 0, "password_hash": 0}),
+        count_by(db.employees, "employer_id", collect_keys(employers, "id"))
+    )
     for employer in employers:
-        user_data = await db.users.find_one({"id": employer.get("user_id")}, {"_id": 0, "password_hash": 0})
-        employer["user"] = user_data
-        # Get employee count
-        emp_count = await db.employees.count_documents({"employer_id": employer["id"]})
-        employer["employee_count_actual"] = emp_count
+        employer["user"] = users.get(employer.get("user_id"))
+        employer["employee_count_actual"] = emp_counts.get(employer["id"], 0)
     return employers
 
 # Admin - Get single employer detail
@@ -2841,17 +2899,24 @@ async def admin_override_employer_risk(
 
 # Admin - List all employees across all employers
 @api_router.get("/admin/employees")
-async def admin_list_employees(user: dict = Depends(require_role(UserRole.ADMIN))):
-    """Get all employees for admin management"""
-    employees = await db.employees.find({}, {"_id": 0}).to_list(10000)
+async def admin_list_employees(
+    response: Response,
+    employer_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(ADMIN_LIST_PAGE_SIZE, ge=1, le=ADMIN_LIST_PAGE_SIZE),
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Get employees for admin management, newest first (paged via X-Next-Cursor)"""
+    query = {"employer_id": employer_id} if employer_id else {}
+    employees, next_cursor = await paginate(
+        db.employees, query, cursor=cursor, limit=limit, max_limit=ADMIN_LIST_PAGE_SIZE
+    )
+    set_next_cursor(response, next_cursor)
     # Enrich with employer name
-    employer_cache = {}
+    employers = await fetch_related(db.employers, employees, "employer_id", projection={"_id": 0, "company_name": 1})
     for emp in employees:
-        employer_id = emp.get("employer_id")
-        if employer_id and employer_id not in employer_cache:
-            employer = await db.employers.find_one({"id": employer_id}, {"_id": 0, "company_name": 1})
-            employer_cache[employer_id] = employer.get("company_name") if employer else "Unknown"
-        emp["employer_name"] = employer_cache.get(employer_id, "Unknown")
+        employer = employers.get(emp.get("employer_id"))
+        emp["employer_name"] = employer.get("company_name") if employer else "Unknown"
     return employees
 
 # Admin - Get single employee with full details and advance history
@@ -2885,7 +2950,7 @@ async def admin_get_employee_detail(
     
     # Get KYC documents
     kyc_docs = await db.kyc_documents.find(
-        {"user_id": employee.get("user_id")},
+        current_kyc_documents({"user_id": employee.get("user_id")}),
         {"_id": 0}
     ).to_list(100)
     
@@ -3028,9 +3093,17 @@ async def admin_override_employee_risk(
 
 # Admin - Get all advances
 @api_router.get("/admin/advances")
-async def admin_list_advances(user: dict = Depends(require_role(UserRole.ADMIN))):
-    """Get all advances for reconciliation"""
-    advances = await db.advances.find({}, {"_id": 0}).sort("created_at", -1).to_list(10000)
+async def admin_list_advances(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(ADMIN_LIST_PAGE_SIZE, ge=1, le=ADMIN_LIST_PAGE_SIZE),
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Get advances for reconciliation, newest first (paged via X-Next-Cursor)"""
+    advances, next_cursor = await paginate(
+        db.advances, {}, cursor=cursor, limit=limit, max_limit=ADMIN_LIST_PAGE_SIZE
+    )
+    set_next_cursor(response, next_cursor)
     return advances
 
 # Admin - Reconciliation summary
@@ -3164,97 +3237,127 @@ async def admin_get_notifications(user: dict = Depends(require_role(UserRole.ADM
     notifications.sort(key=lambda x: x.get("created_at", ""), reverse=True)
     return notifications[:50]
 
+# Integrations on the API Health page: telemetry key -> (name, provider)
+API_HEALTH_INTEGRATIONS = {
+    "mpesa": ("M-PESA API", "Safaricom"),
+    "airtel_money": ("Airtel Money API", "Airtel"),
+    "bank_api": ("Bank Transfer API", "Banking Partner"),
+    TELEMETRY_PAYROLL_SYNC: ("Payroll Sync API", "Integrated Payroll"),
+    "mtn_momo": ("MTN MoMo API", "MTN"),
+    "tigo_pesa": ("Tigo Pesa API", "Tigo"),
+    "halopesa": ("HaloPesa API", "Halotel"),
+    "dusupay": ("Dusupay Gateway", "Dusupay"),
+    PAYOUT_RECONCILE: ("Payout Status Reconciler", "Dusupay"),
+}
+# Listed even before any traffic; the rest once they have recorded calls
+API_HEALTH_ALWAYS_LISTED = ("mpesa", "airtel_money", "bank_api", TELEMETRY_PAYROLL_SYNC)
+HEALTH_RANK = {"healthy": 0, "degraded": 1, "down": 2}
+
+def integration_health(integration: str) -> Dict[str, Any]:
+    """Live telemetry for an integration; open payout circuits on its routes make it worse"""
+    live = telemetry.snapshot(integration)
+    routes = [r for r in payout_circuits.snapshot() if integration_of(r["key"]) == integration]
+    live["status"] = max(live["status"], group_health(routes), key=HEALTH_RANK.get)
+    live["routes"] = routes
+    return live
+
 # Admin - API Health Status
 @api_router.get("/admin/api-health")
 async def admin_get_api_health(user: dict = Depends(require_role(UserRole.ADMIN))):
-    """Get API health status for all integrations"""
-    # Mock API health data
+    """Get API health status for all integrations (in-process numbers; one database count, for the payout queue)"""
+    now = datetime.now(timezone.utc).isoformat()
+    integrations = []
+    for key, (name, provider) in API_HEALTH_INTEGRATIONS.items():
+        live = integration_health(key)
+        if key not in API_HEALTH_ALWAYS_LISTED and not live["total_calls"]:
+            continue
+        integrations.append({
+            "key": key,
+            "name": name,
+            "provider": provider,
+            "status": live["status"],
+            "latency_ms": live["latency_ms"]["p50"],
+            "latency_percentiles": live["latency_ms"],
+            "error_rate": live["error_rate"],
+            "uptime_percent": live["uptime_percent"],
+            "last_check": live["last_call_at"] or now,
+            "calls_24h": live["calls_24h"],
+            "syncs_today" if key == TELEMETRY_PAYROLL_SYNC else "transactions_today": live["calls_today"]
+        })
+    
+    statuses = [i["status"] for i in integrations]
+    if all(s == "down" for s in statuses):
+        overall_status = "down"
+    elif any(s != "healthy" for s in statuses):
+        overall_status = "degraded"
+    else:
+        overall_status = "healthy"
+    
     return {
-        "integrations": [
-            {
-                "name": "M-PESA API",
-                "provider": "Safaricom",
-                "status": "healthy",
-                "latency_ms": 120,
-                "uptime_percent": 99.8,
-                "last_check": datetime.now(timezone.utc).isoformat(),
-                "transactions_today": 156
-            },
-            {
-                "name": "Airtel Money API",
-                "provider": "Airtel",
-                "status": "healthy",
-                "latency_ms": 95,
-                "uptime_percent": 99.5,
-                "last_check": datetime.now(timezone.utc).isoformat(),
-                "transactions_today": 89
-            },
-            {
-                "name": "Bank Transfer API",
-                "provider": "Banking Partner",
-                "status": "healthy",
-                "latency_ms": 200,
-                "uptime_percent": 99.9,
-                "last_check": datetime.now(timezone.utc).isoformat(),
-                "transactions_today": 45
-            },
-            {
-                "name": "Payroll Sync API",
-                "provider": "Integrated Payroll",
-                "status": "healthy",
-                "latency_ms": 150,
-                "uptime_percent": 99.7,
-                "last_check": datetime.now(timezone.utc).isoformat(),
-                "syncs_today": 12
-            }
-        ],
-        "overall_status": "healthy",
-        "last_updated": datetime.now(timezone.utc).isoformat()
+        "integrations": integrations,
+        "payout_routes": payout_circuits.snapshot(),
+        "queued_payouts": await db.advances.count_documents({"status": "approved", "payout_queue": {"$ne": None}}),
+        # As of the reconciler's last sweep; None until the first one has run
+        "unsettled_payouts": (payout_reconciler.last_sweep or {}).get("backlog"),
+        "payout_reconciler": payout_reconciler.stats(),
+        "overall_status": overall_status,
+        "last_updated": now
     }
 
+@api_router.get("/admin/api-health/history")
+async def admin_get_api_health_history(
+    integration: str,
+    hours: int = Query(default=24, ge=1, le=24 * 30),
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Hourly latency, error rate and uptime from the flushed integration_metrics series"""
+    if integration not in API_HEALTH_INTEGRATIONS:
+        raise HTTPException(status_code=404, detail="Unknown integration")
+    return {"integration": integration, "hours": await telemetry_history(db, integration, hours)}
+
+# Admin - Authenticated user cache counters
+@api_router.get("/admin/cache-stats")
+async def admin_get_cache_stats(user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Hit / miss counters for the in-process user cache used by get_current_user"""
+    return {"user_cache": user_cache.stats()}
+
 # Admin - Reports
 @api_router.get("/admin/reports/summary")
 async def admin_get_reports_summary(user: dict = Depends(require_role(UserRole.ADMIN))):
-    """Get platform-wide reports summary"""
-    advances = await db.advances.find({}, {"_id": 0}).to_list(10000)
-    employers = await db.employers.find({}, {"_id": 0}).to_list(1000)
-    employees = await db.employees.find({}, {"_id": 0}).to_list(10000)
-    
-    # Monthly breakdown (last 6 months)
-    monthly_data = {}
-    for adv in advances:
-        created = adv.get("created_at", "")
-        if created:
-            month = created[:7]  # YYYY-MM
-            if month not in monthly_data:
-                monthly_data[month] = {"disbursed": 0, "fees": 0, "count": 0}
-            if adv.get("status") in ["approved", "disbursed", "repaid"]:
-                monthly_data[month]["disbursed"] += adv.get("amount", 0)
-                monthly_data[month]["fees"] += adv.get("fee_amount", 0)
-                monthly_data[month]["count"] += 1
+    """Get platform-wide reports summary (advance figures come from the advance_rollups buckets)"""
+    monthly_data, all_statuses, settled, settled_by_country, employer_countries, employee_countries = await asyncio.gather(
+        monthly_breakdown(db, SETTLED_STATUSES),
+        totals_by(db, None),
+        totals_by(db, None, SETTLED_STATUSES),
+        totals_by(db, "country", SETTLED_STATUSES),
+        db.employers.aggregate([{"$group": {"_id": {"$ifNull": ["$country", "KE"]}, "count": {"$sum": 1}}}]).to_list(None),
+        db.employees.aggregate([{"$group": {"_id": {"$ifNull": ["$country", "KE"]}, "count": {"$sum": 1}}}]).to_list(None)
+    )
     
     # Country breakdown
-    country_data = {}
-    for emp in employers:
-        country = emp.get("country", "KE")
-        if country not in country_data:
-            country_data[country] = {"employers": 0, "employees": 0, "disbursed": 0}
-        country_data[country]["employers"] += 1
-    
-    for e in employees:
-        country = e.get("country", "KE")
-        if country in country_data:
-            country_data[country]["employees"] += 1
+    country_data = {
+        row["_id"]: {
+            "employers": row["count"],
+            "employees": 0,
+            "disbursed": settled_by_country.get(row["_id"], {}).get("amount", 0)
+        }
+        for row in employer_countries
+    }
+    for row in employee_countries:
+        if row["_id"] in country_data:
+            country_data[row["_id"]]["employees"] += row["count"]
     
+    grand_total = all_statuses.get(None, {})
+    settled_total = settled.get(None, {})
     return {
         "monthly": monthly_data,
         "by_country": country_data,
         "totals": {
-            "total_employers": len(employers),
-            "total_employees": len(employees),
-            "total_advances": len(advances),
-            "total_disbursed": sum(a.get("amount", 0) for a in advances if a.get("status") in ["approved", "disbursed", "repaid"]),
-            "total_fees": sum(a.get("fee_amount", 0) for a in advances if a.get("status") in ["approved", "disbursed", "repaid"])
+            "total_employers": sum(row["count"] for row in employer_countries),
+            "total_employees": sum(row["count"] for row in employee_countries),
+            "total_advances": grand_total.get("count", 0),
+            "total_disbursed": settled_total.get("amount", 0),
+            "total_fees": settled_total.get("fee_amount", 0)
         }
     }
 
@@ -3360,6 +3463,7 @@ async def admin_list_fraud_rules(user: dict = Depends(require_role(UserRole.ADMI
             }
         ]
         await db.fraud_rules.insert_many(default_rules)
+        fraud_engine.invalidate()
         rules = default_rules
     
     return rules
@@ -3384,6 +3488,7 @@ async def admin_create_fraud_rule(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.fraud_rules.insert_one(rule)
+    fraud_engine.invalidate()
     rule.pop("_id", None)
     return rule
 
@@ -3410,6 +3515,7 @@ async def admin_update_fraud_rule(
     result = await db.fraud_rules.update_one({"id": rule_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Rule not found")
+    fraud_engine.invalidate()
     
     updated_rule = await db.fraud_rules.find_one({"id": rule_id}, {"_id": 0})
     return updated_rule
@@ -3423,6 +3529,7 @@ async def admin_delete_fraud_rule(
     result = await db.fraud_rules.delete_one({"id": rule_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Rule not found")
+    fraud_engine.invalidate()
     return {"message": "Rule deleted successfully"}
 
 @api_router.patch("/admin/fraud-rules/{rule_id}/toggle")
@@ -3440,65 +3547,12 @@ async def admin_toggle_fraud_rule(
         {"id": rule_id},
         {"$set": {"enabled": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    fraud_engine.invalidate()
     return {"id": rule_id, "enabled": new_status}
 
 async def check_fraud_rules(advance_request: dict, employee: dict) -> dict:
-    """Check an advance request against all enabled fraud rules"""
-    rules = await db.fraud_rules.find({"enabled": True}, {"_id": 0}).to_list(100)
-    violations = []
-    
-    amount = advance_request.get("amount", 0)
-    employee_id = employee.get("id")
-    
-    for rule in rules:
-        triggered = False
-        
-        if rule["type"] == "amount_threshold":
-            if amount > rule["threshold"]:
-                triggered = True
-        
-        elif rule["type"] == "frequency":
-            # Check how many advances in the last 24 hours
-            yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-            recent_count = await db.advances.count_documents({
-                "employee_id": employee_id,
-                "created_at": {"$gte": yesterday.isoformat()}
-            })
-            if recent_count >= rule["threshold"]:
-                triggered = True
-        
-        elif rule["type"] == "velocity":
-            # Check total amount in the last hour for new employees (< 30 days)
-            tenure = employee.get("tenure_months", 0)
-            if tenure < 1:  # New employee
-                one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-                recent_advances = await db.advances.find({
-                    "employee_id": employee_id,
-                    "created_at": {"$gte": one_hour_ago.isoformat()}
-                }, {"_id": 0, "amount": 1}).to_list(100)
-                total_recent = sum(a.get("amount", 0) for a in recent_advances) + amount
-                if total_recent > rule["threshold"]:
-                    triggered = True
-        
-        if triggered:
-            violations.append({
-                "rule_id": rule["id"],
-                "rule_name": rule["name"],
-                "severity": rule["severity"],
-                "action": rule["action"]
-            })
-            # Increment trigger count
-            await db.fraud_rules.update_one(
-                {"id": rule["id"]},
-                {"$inc": {"trigger_count": 1}}
-            )
-    
-    return {
-        "passed": len(violations) == 0,
-        "violations": violations,
-        "should_block": any(v["action"] == "block" for v in violations),
-        "should_flag": any(v["action"] in ["flag", "block"] for v in violations)
-    }
+    """Check an advance request against all enabled fraud rules (compiled and cached by the fraud engine)"""
+    return await fraud_engine.check(advance_request, employee)
 
 # ======================== RECONCILIATION SYSTEM ========================
 
@@ -3510,12 +3564,15 @@ def generate_transaction_reference() -> str:
 
 @api_router.get("/admin/reconciliation/transactions")
 async def admin_get_reconciliation_transactions(
+    response: Response,
     status: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     user: dict = Depends(require_role(UserRole.ADMIN))
 ):
-    """Get transactions for reconciliation with detailed info"""
+    """Get transactions for reconciliation with detailed info (paged via X-Next-Cursor)"""
     query = {}
     
     if status == "pending":
@@ -3533,16 +3590,24 @@ async def admin_get_reconciliation_transactions(
         else:
             query["created_at"] = {"$lte": date_to}
     
-    advances = await db.advances.find(
+    advances, next_cursor = await paginate(
+        db.advances,
         {"status": {"$in": ["approved", "disbursed", "repaid"]}, **query},
-        {"_id": 0}
-    ).to_list(1000)
+        cursor=cursor,
+        limit=limit
+    )
+    set_next_cursor(response, next_cursor)
+    
+    # Get employee and employer names
+    employees, employers = await asyncio.gather(
+        fetch_related(db.employees, advances, "employee_id", projection={"_id": 0, "full_name": 1}),
+        fetch_related(db.employers, advances, "employer_id", projection={"_id": 0, "company_name": 1})
+    )
     
     transactions = []
     for adv in advances:
-        # Get employee and employer names
-        employee = await db.employees.find_one({"id": adv.get("employee_id")}, {"_id": 0, "full_name": 1})
-        employer = await db.employers.find_one({"id": adv.get("employer_id")}, {"_id": 0, "company_name": 1})
+        employee = employees.get(adv.get("employee_id"))
+        employer = employers.get(adv.get("employer_id"))
         
         transactions.append({
             "id": adv.get("id"),
@@ -3630,28 +3695,34 @@ async def admin_bulk_reconcile(
 @api_router.get("/admin/reconciliation/summary")
 async def admin_reconciliation_summary(user: dict = Depends(require_role(UserRole.ADMIN))):
     """Get reconciliation summary statistics"""
-    all_advances = await db.advances.find(
-        {"status": {"$in": ["approved", "disbursed", "repaid"]}},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    pending = len([a for a in all_advances if a.get("reconciliation_status") in [None, "pending"]])
-    reconciled = len([a for a in all_advances if a.get("reconciliation_status") == "reconciled"])
-    disputed = len([a for a in all_advances if a.get("reconciliation_status") == "disputed"])
-    
-    total_amount = sum(a.get("amount", 0) for a in all_advances)
-    reconciled_amount = sum(a.get("amount", 0) for a in all_advances if a.get("reconciliation_status") == "reconciled")
-    pending_amount = sum(a.get("amount", 0) for a in all_advances if a.get("reconciliation_status") in [None, "pending"])
+    # reconciliation_status is not a rollup dimension, so this is a single $group over settled advances
+    recon_status = {"$ifNull": ["$reconciliation_status", "pending"]}
+    rows = await db.advances.aggregate([
+        {"$match": {"status": {"$in": SETTLED_STATUSES}}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "pending": {"$sum": {"$cond": [{"$eq": [recon_status, "pending"]}, 1, 0]}},
+            "reconciled": {"$sum": {"$cond": [{"$eq": [recon_status, "reconciled"]}, 1, 0]}},
+            "disputed": {"$sum": {"$cond": [{"$eq": [recon_status, "disputed"]}, 1, 0]}},
+            "total_amount": {"$sum": {"$ifNull": ["$amount", 0]}},
+            "reconciled_amount": {"$sum": {"$cond": [{"$eq": [recon_status, "reconciled"]}, {"$ifNull": ["$amount", 0]}, 0]}},
+            "pending_amount": {"$sum": {"$cond": [{"$eq": [recon_status, "pending"]}, {"$ifNull": ["$amount", 0]}, 0]}},
+        }}
+    ]).to_list(1)
+    summary = rows[0] if rows else {}
+    total = summary.get("total", 0)
+    reconciled = summary.get("reconciled", 0)
     
     return {
-        "total_transactions": len(all_advances),
-        "pending_count": pending,
+        "total_transactions": total,
+        "pending_count": summary.get("pending", 0),
         "reconciled_count": reconciled,
-        "disputed_count": disputed,
-        "total_amount": total_amount,
-        "reconciled_amount": reconciled_amount,
-        "pending_amount": pending_amount,
-        "reconciliation_rate": round((reconciled / len(all_advances) * 100), 1) if all_advances else 0
+        "disputed_count": summary.get("disputed", 0),
+        "total_amount": summary.get("total_amount", 0),
+        "reconciled_amount": summary.get("reconciled_amount", 0),
+        "pending_amount": summary.get("pending_amount", 0),
+        "reconciliation_rate": round((reconciled / total * 100), 1) if total else 0
     }
 
 # ======================== BULK ACTIONS ========================
@@ -4088,18 +4159,19 @@ async def get_employees_for_settings(
     
     employees = await db.employees.find(query, {"_id": 0}).to_list(1000)
     
-    # Get employer names and risk levels
-    employer_ids = list(set(e.get("employer_id") for e in employees if e.get("employer_id")))
-    employers = await db.employers.find({"id": {"$in": employer_ids}}, {"_id": 0}).to_list(1000)
-    employer_map = {e["id"]: e for e in employers}
+    # Get employer names, user info and employee-specific settings
+    employer_map, user_map, settings_map = await asyncio.gather(
+        fetch_related(db.employers, employees, "employer_id", projection={"_id": 0, "company_name": 1}),
+        fetch_related(db.users, employees, "user_id", projection={"_id": 0, "full_name": 1, "email": 1}),
+        fetch_related(db.employee_settings, employees, "id", key_field="employee_id", projection={"_id": 0})
+    )
     
     for employee in employees:
         emp_id = employee.get("employer_id")
         if emp_id and emp_id in employer_map:
             employee["employer_name"] = employer_map[emp_id].get("company_name", "Unknown")
         
-        # Get user info
-        user_info = await db.users.find_one({"id": employee.get("user_id")}, {"_id": 0})
+        user_info = user_map.get(employee.get("user_id"))
         if user_info:
             employee["full_name"] = user_info.get("full_name", "Unknown")
             employee["email"] = user_info.get("email", "")
@@ -4113,9 +4185,7 @@ async def get_employees_for_settings(
         else:
             employee["risk_level"] = "high"
         
-        # Get employee-specific settings
-        settings = await db.employee_settings.find_one({"employee_id": employee["id"]}, {"_id": 0})
-        employee["custom_settings"] = settings
+        employee["custom_settings"] = settings_map.get(employee["id"])
     
     return employees
 
@@ -4460,25 +4530,36 @@ async def get_comprehensive_audit_trail(
         {"_id": 0}
     ).sort("changed_at", -1).skip(skip).limit(limit).to_list(limit)
     
-    # Enrich with user and entity names
+    # Enrich with user and entity names: employers and employees in parallel,
+    # then one users query covering both the admins and the employees' accounts
+    employers, employees = await asyncio.gather(
+        fetch_related(db.employers, logs, "employer_id", projection={"_id": 0, "company_name": 1}),
+        fetch_related(db.employees, logs, "employee_id", projection={"_id": 0, "user_id": 1})
+    )
+    users = await fetch_by_keys(
+        db.users,
+        collect_keys(logs, "changed_by") + collect_keys(employees.values(), "user_id"),
+        projection={"_id": 0, "full_name": 1, "email": 1}
+    )
+    
     for log in logs:
         # Get admin name
         if log.get("changed_by"):
-            admin = await db.users.find_one({"id": log["changed_by"]}, {"_id": 0, "full_name": 1, "email": 1})
+            admin = users.get(log["changed_by"])
             if admin:
                 log["changed_by_name"] = admin.get("full_name", admin.get("email", "Unknown"))
         
         # Get employer name if applicable
         if log.get("employer_id"):
-            employer = await db.employers.find_one({"id": log["employer_id"]}, {"_id": 0, "company_name": 1})
+            employer = employers.get(log["employer_id"])
             if employer:
                 log["employer_name"] = employer.get("company_name", "Unknown")
         
         # Get employee name if applicable
         if log.get("employee_id"):
-            employee = await db.employees.find_one({"id": log["employee_id"]}, {"_id": 0, "user_id": 1})
+            employee = employees.get(log["employee_id"])
             if employee:
-                user_info = await db.users.find_one({"id": employee.get("user_id")}, {"_id": 0, "full_name": 1})
+                user_info = users.get(employee.get("user_id"))
                 if user_info:
                     log["employee_name"] = user_info.get("full_name", "Unknown")
     
@@ -4527,9 +4608,10 @@ async def get_audit_trail_stats(
     admin_counts = await admin_counts_cursor.to_list(10)
     
     # Enrich admin names
+    admin_users = await fetch_related(db.users, admin_counts, "_id", projection={"_id": 0, "full_name": 1, "email": 1})
     for ac in admin_counts:
         if ac.get("_id"):
-            admin = await db.users.find_one({"id": ac["_id"]}, {"_id": 0, "full_name": 1, "email": 1})
+            admin = admin_users.get(ac["_id"])
             if admin:
                 ac["name"] = admin.get("full_name", admin.get("email", "Unknown"))
             else:
@@ -4567,10 +4649,11 @@ async def get_audit_trail_admins(user: dict = Depends(require_role(UserRole.ADMI
     admin_ids_cursor = db.audit_trail.aggregate(pipeline)
     admin_ids = await admin_ids_cursor.to_list(100)
     
+    admin_users = await fetch_related(db.users, admin_ids, "_id", projection={"_id": 0, "id": 1, "full_name": 1, "email": 1})
     admins = []
     for aid in admin_ids:
         if aid.get("_id"):
-            admin = await db.users.find_one({"id": aid["_id"]}, {"_id": 0, "id": 1, "full_name": 1, "email": 1})
+            admin = admin_users.get(aid["_id"])
             if admin:
                 admins.append({
                     "id": admin["id"],
@@ -4640,9 +4723,10 @@ async def get_settings_audit_log(
     ).sort("changed_at", -1).to_list(limit)
     
     # Enrich with user names
+    users = await fetch_related(db.users, logs, "changed_by", projection={"_id": 0, "full_name": 1})
     for log in logs:
         if log.get("changed_by"):
-            user_info = await db.users.find_one({"id": log["changed_by"]}, {"_id": 0})
+            user_info = users.get(log["changed_by"])
             if user_info:
                 log["changed_by_name"] = user_info.get("full_name", "Unknown")
     
@@ -4654,6 +4738,9 @@ async def get_settings_audit_log(
 async def dusupay_webhook(request: Request):
     """
     Handle Dusupay webhook callbacks for transaction status updates
+    
+    The callback is stored in inbound_webhooks and acknowledged straight away;
+    webhook_processor workers apply it in order per merchant_reference.
     """
     try:
         # Get raw body for signature verification
@@ -4663,100 +4750,20 @@ async def dusupay_webhook(request: Request):
         # Verify webhook signature (optional - depends on configuration)
         dusupay = get_dusupay_service()
         signature = request.headers.get("X-Dusupay-Signature", "")
-        
-        if not dusupay.verify_webhook_signature(body.decode(), signature):
+        signature_valid = dusupay.verify_webhook_signature(body.decode(), signature)
+        if not signature_valid:
             logging.warning("Invalid Dusupay webhook signature")
             # Continue processing even if signature verification fails in dev mode
         
-        # Parse webhook event
-        event = payload.get("event", "")
-        event_payload = payload.get("payload", {})
+        event = new_webhook_event(payload, signature_valid)
+        logging.info(f"Dusupay webhook: {event['event']} - {event['merchant_reference']} - {event['transaction_status']}")
         
-        merchant_reference = event_payload.get("merchant_reference")
-        internal_reference = event_payload.get("internal_reference")
-        transaction_status = event_payload.get("transaction_status", "").upper()
-        
-        logging.info(f"Dusupay webhook: {event} - {merchant_reference} - {transaction_status}")
-        
-        if not merchant_reference:
+        if not event["merchant_reference"]:
             return {"status": "ignored", "reason": "No merchant reference"}
         
-        # Find the disbursement record
-        disbursement = await db.disbursements.find_one(
-            {"merchant_reference": merchant_reference}, 
-            {"_id": 0}
-        )
-        
-        if not disbursement:
-            logging.warning(f"Disbursement not found for reference: {merchant_reference}")
-            return {"status": "not_found"}
-        
-        advance_id = disbursement.get("advance_id")
-        
-        # Update disbursement record
-        await db.disbursements.update_one(
-            {"merchant_reference": merchant_reference},
-            {"$set": {
-                "status": transaction_status,
-                "updated_at": datetime.now(timezone.utc).isoformat(),
-                "webhook_payload": event_payload
-            }}
-        )
-        
-        # Handle different transaction statuses
-        if transaction_status == "COMPLETED":
-            # Successful disbursement
-            await db.advances.update_one(
-                {"id": advance_id},
-                {"$set": {
-                    "status": "disbursed",
-                    "disbursement_status": "COMPLETED",
-                    "disbursed_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            
-            # Update transaction status
-            await db.transactions.update_one(
-                {"reference": merchant_reference},
-                {"$set": {"status": "completed"}}
-            )
-            
-            logging.info(f"Advance {advance_id} disbursed successfully")
-        
-        elif transaction_status == "FAILED":
-            # Failed disbursement - revert to approved status
-            await db.advances.update_one(
-                {"id": advance_id},
-                {"$set": {
-                    "status": "approved",  # Revert to approved for retry
-                    "disbursement_status": "FAILED",
-                    "disbursement_error": event_payload.get("failure_reason", "Unknown error"),
-                    "disbursement_failed_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            
-            await db.transactions.update_one(
-                {"reference": merchant_reference},
-                {"$set": {"status": "failed"}}
-            )
-            
-            logging.warning(f"Advance {advance_id} disbursement failed")
-        
-        elif transaction_status == "CANCELLED":
-            await db.advances.update_one(
-                {"id": advance_id},
-                {"$set": {
-                    "status": "approved",
-                    "disbursement_status": "CANCELLED"
-                }}
-            )
-            
-            await db.transactions.update_one(
-                {"reference": merchant_reference},
-                {"$set": {"status": "cancelled"}}
-            )
-        
-        return {"status": "processed", "transaction_status": transaction_status}
+        if not await webhook_processor.ingest(event):
+            return {"status": "duplicate", "transaction_status": event["transaction_status"]}
+        return {"status": "accepted", "event_id": event["id"], "transaction_status": event["transaction_status"]}
     
     except Exception as e:
         logging.error(f"Dusupay webhook error: {str(e)}")
@@ -4769,6 +4776,25 @@ async def dusupay_webhook_verify(reference: Optional[str] = None):
     """
     return {"status": "ok", "reference": reference}
 
+@api_router.get("/admin/webhooks")
+async def admin_list_webhooks(
+    status: Optional[str] = None,
+    merchant_reference: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Inbound webhook events (e.g. status=failed for callbacks that were given up) and the backlog by status"""
+    query = {}
+    if status:
+        query["status"] = status
+    if merchant_reference:
+        query["merchant_reference"] = merchant_reference
+    events, counts = await asyncio.gather(
+        db.inbound_webhooks.find(query, {"_id": 0}).sort("received_at", -1).to_list(limit),
+        db.inbound_webhooks.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    )
+    return {"events": events, "counts": {row["_id"]: row["count"] for row in counts}}
+
 @api_router.get("/disbursements")
 async def get_disbursements(
     status: Optional[str] = None,
@@ -4813,18 +4839,14 @@ async def check_disbursement_status(
         raise HTTPException(status_code=404, detail="Disbursement not found")
     
     # Check status from Dusupay
-    status_response = await dusupay.check_payout_status(reference)
-    
-    if status_response.success:
-        # Update local record if status changed
-        if status_response.status != disbursement.get("status"):
-            await db.disbursements.update_one(
-                {"merchant_reference": reference},
-                {"$set": {
-                    "status": status_response.status,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
+    status_response = await dusupay.check_payout_status(reference, disbursement.get("circuit"))
+    
+    if status_response.success and status_response.status:
+        # Same state machine as the webhooks: only a later status moves the record
+        await apply_disbursement_status(
+            db, reference, status_response.status.upper(),
+            (status_response.raw_response or {}).get("data"), source="status_check"
+        )
     
     return {
         "local_status": disbursement.get("status"),
@@ -4861,10 +4883,71 @@ async def retry_disbursement(
             "disbursement_error": None
         }}
     )
+    await move_advance(db, advance, "approved")
     
     # Trigger new disbursement (could be done via background task)
     return {"message": "Advance reset for retry. Please initiate disbursement again."}
 
+class DisbursementBatchRequest(BaseModel):
+    advance_ids: Optional[List[str]] = None  # default: every approved advance, oldest first
+    limit: int = Field(default=500, ge=1, le=MAX_DISBURSEMENT_BATCH_SIZE)
+
+@api_router.post("/admin/disbursements/batch")
+async def create_disbursement_batch(
+    data: DisbursementBatchRequest,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(require_role(UserRole.ADMIN))
+):
+    """Disburse many approved advances concurrently; poll the returned batch for outcomes"""
+    batch = new_disbursement_batch(user["id"], data.advance_ids, data.limit)
+    await db.disbursement_batches.insert_one(batch)
+    batch.pop("_id", None)
+    
+    background_tasks.add_task(run_disbursement_batch, db, get_dusupay_service(), batch)
+    return batch
+
+@api_router.get("/admin/disbursements/batches")
+async def list_disbursement_batches(limit: int = 20, user: dict = Depends(require_role(UserRole.ADMIN))):
+    return await db.disbursement_batches.find(
+        {}, {"_id": 0, "advance_ids": 0}
+    ).sort("created_at", -1).to_list(limit)
+
+@api_router.get("/admin/disbursements/batches/{batch_id}")
+async def get_disbursement_batch(batch_id: str, user: dict = Depends(require_role(UserRole.ADMIN))):
+    batch = await db.disbursement_batches.find_one({"id": batch_id}, {"_id": 0})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Disbursement batch not found")
+    
+    batch["items"] = await db.disbursement_batch_items.find(
+        {"batch_id": batch_id}, {"_id": 0}
+    ).sort("created_at", 1).to_list(MAX_DISBURSEMENT_BATCH_SIZE)
+    return batch
+
+@api_router.get("/admin/disbursements/review")
+async def list_disbursement_reviews(user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Advances whose batch payout failed part-way; check each with Dusupay before clearing it"""
+    return await db.advances.find(
+        {"disbursement_review": {"$ne": None}}, {"_id": 0}
+    ).sort("disbursement_review.flagged_at", 1).to_list(MAX_DISBURSEMENT_BATCH_SIZE)
+
+@api_router.post("/admin/disbursements/review/{advance_id}/clear")
+async def clear_disbursement_review_flag(advance_id: str, user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Let a reviewed advance be disbursed again (only once Dusupay has no payout for it)"""
+    if not await clear_disbursement_review(db, advance_id):
+        raise HTTPException(status_code=404, detail="No disbursement review for this advance")
+    return {"message": "Review cleared; the advance can be disbursed again"}
+
+@api_router.get("/admin/disbursements/reconciler")
+async def get_payout_reconciler(user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Last reconcile sweep and the disbursements still waiting to settle"""
+    return {**payout_reconciler.stats(), "backlog": await payout_reconciler.backlog()}
+
+@api_router.post("/admin/disbursements/reconcile")
+async def run_payout_reconcile(background_tasks: BackgroundTasks, user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Check unsettled disbursements with Dusupay now instead of waiting for the next sweep"""
+    background_tasks.add_task(payout_reconciler.sweep)
+    return {"message": "Reconcile sweep started", "backlog": await payout_reconciler.backlog()}
+
 @api_router.get("/dusupay/banks/{country_code}")
 async def get_supported_banks(
     country_code: str,
@@ -4902,6 +4985,11 @@ async def get_dusupay_config(user: dict = Depends(require_role(UserRole.ADMIN)))
         "supported_countries": list(MOBILE_MONEY_PROVIDERS.keys())
     }
 
+@api_router.get("/admin/dusupay/client-stats")
+async def get_dusupay_client_stats(user: dict = Depends(require_role(UserRole.ADMIN))):
+    """Pool settings and connection reuse of the shared Dusupay HTTP client"""
+    return dusupay_client_stats()
+
 @api_router.get("/")
 async def root():
     return {"message": "EaziWage API v1.0", "status": "running"}
@@ -4915,8 +5003,47 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+@app.on_event("startup")
+async def ensure_db_indexes():
+    # Create any missing indexes and log drift against the declared set
+    await reconcile_indexes(db)
+
+@app.on_event("startup")
+async def start_payroll_runner():
+    # Also resumes jobs left unfinished by a previous process
+    payroll_runner.start()
+
+@app.on_event("startup")
+async def start_payout_queue():
+    # Re-sends payouts queued while their provider's circuit breaker was open
+    payout_queue.start()
+
+@app.on_event("startup")
+async def start_telemetry_flusher():
+    # Writes closed minutes of integration telemetry to integration_metrics
+    telemetry_flusher.start()
+
+@app.on_event("startup")
+async def start_webhook_processor():
+    # Also picks up callbacks stored but not applied before the last shutdown
+    webhook_processor.start()
+
+@app.on_event("startup")
+async def start_payout_reconciler():
+    # Settles disbursements whose callback never arrived
+    payout_reconciler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await fraud_engine.close()
+    await payroll_runner.close()
+    await payout_queue.close()
+    await telemetry_flusher.close()
+    await webhook_processor.close()
+    await payout_reconciler.close()
+    await close_dusupay_client()
     client.close()
+    shutdown_executor()
@@ -0,0 +1,90 @@
+"""
+Advance Reservations
+Race-free holds on an employee's earned wages while an advance is pending.
+
+Creating an advance reserves its amount on the employee document with one
+conditional find_one_and_update: the update only matches if the employee is
+verified, the amount is within advance_limit and earned_wages minus what is
+already reserved covers it. Concurrent requests from the same employee are
+serialised by MongoDB's single-document atomicity, so they can never reserve
+more than the employee has earned. No multi-document transaction is needed.
+
+The hold is recorded on the advance as `reserved_amount` and is:
+- settled on approval (earned_wages and reserved_amount both drop by the amount)
+- released when a pending advance is rejected or blocked
+
+Both happen only on the pending -> approved / rejected transition, which the
+endpoints make atomically, so a hold is settled or released exactly once.
+"""
+
+from typing import Optional, Dict, Any
+
+from pymongo import ReturnDocument
+
+
+def reservation_filter(user_id: str, amount: float) -> Dict[str, Any]:
+    """Employee filter that only matches when `amount` can be reserved right now"""
+    return {
+        "user_id": user_id,
+        "status": "approved",
+        "kyc_status": "approved",
+        "advance_limit": {"$gte": amount},
+        "$expr": {"$gte": [
+            {"$subtract": ["$earned_wages", {"$ifNull": ["$reserved_amount", 0]}]},
+            amount
+        ]},
+    }
+
+
+def available_wages(employee: Dict[str, Any]) -> float:
+    """Earned wages not already held by pending advances"""
+    return employee.get("earned_wages", 0) - employee.get("reserved_amount", 0)
+
+
+async def reserve(db, user_id: str, amount: float) -> Optional[Dict[str, Any]]:
+    """
+    Atomically hold `amount` of the employee's earned wages
+
+    Args:
+        db: Motor database handle
+        user_id: User id of the employee requesting the advance
+        amount: Amount to hold
+
+    Returns:
+        The employee document after the hold, or None if any condition failed
+    """
+    return await db.employees.find_one_and_update(
+        reservation_filter(user_id, amount),
+        {"$inc": {"reserved_amount": amount}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def cancel(db, employee_id: str, amount: float) -> None:
+    """Undo a reserve() whose advance was never created (or was blocked on creation)"""
+    await db.employees.update_one({"id": employee_id}, {"$inc": {"reserved_amount": -amount}})
+
+
+async def release(db, advance: Dict[str, Any]) -> None:
+    """
+    Give back the hold of an advance that left `pending` without being approved
+
+    Args:
+        db: Motor database handle
+        advance: The advance as it was *before* the status change
+    """
+    held = advance.get("reserved_amount") or 0
+    if held and advance.get("status") == "pending":
+        await cancel(db, advance["employee_id"], held)
+
+
+async def settle(db, advance: Dict[str, Any]) -> None:
+    """Turn the hold of a just-approved advance into a deduction from earned wages"""
+    await db.employees.update_one(
+        {"id": advance["employee_id"]},
+        {"$inc": {
+            "earned_wages": -advance["amount"],
+            "reserved_amount": -(advance.get("reserved_amount") or 0),
+        }}
+    )
@@ -0,0 +1,199 @@
+"""
+Advance Rollups
+Incrementally maintained daily buckets of advance counts, volumes and fees.
+
+Buckets live in the `advance_rollups` collection, one document per
+(day, employer_id, country, status), where `day` is the UTC date the advance
+was created. Every status change moves the advance from its old bucket to its
+new one with a pair of $inc updates, so reports read a few hundred buckets
+instead of walking every advance.
+
+Backfill / repair from the advances collection:
+
+    python -m services.advance_rollups --rebuild
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "advance_rollups"
+DEFAULT_COUNTRY = "KE"
+
+
+def _bucket_key(advance: Dict[str, Any], country: str, status: str) -> Dict[str, Any]:
+    return {
+        "day": (advance.get("created_at") or "")[:10],
+        "employer_id": advance.get("employer_id"),
+        "country": country or DEFAULT_COUNTRY,
+        "status": status,
+    }
+
+
+def _bucket_update(advance: Dict[str, Any], country: str, status: str, sign: int) -> UpdateOne:
+    return UpdateOne(
+        _bucket_key(advance, country, status),
+        {"$inc": {
+            "count": sign,
+            "amount": sign * (advance.get("amount") or 0),
+            "fee_amount": sign * (advance.get("fee_amount") or 0),
+        }},
+        upsert=True
+    )
+
+
+async def _country_of(db, advance: Dict[str, Any]) -> str:
+    """Advances record their employer's country at creation; older ones are resolved via the employer"""
+    if advance.get("country"):
+        return advance["country"]
+    employer = await db.employers.find_one({"id": advance.get("employer_id")}, {"_id": 0, "country": 1})
+    return (employer or {}).get("country") or DEFAULT_COUNTRY
+
+
+async def record_advances(db, advances: List[Dict[str, Any]], country: Optional[str] = None) -> None:
+    """Add newly created advances to their buckets (one bulk write)"""
+    if not advances:
+        return
+    ops = []
+    for advance in advances:
+        ops.append(_bucket_update(advance, country or await _country_of(db, advance), advance["status"], 1))
+    await db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+
+
+async def record_advance(db, advance: Dict[str, Any], country: Optional[str] = None) -> None:
+    """Add a newly created advance to its bucket"""
+    await record_advances(db, [advance], country)
+
+
+async def move_advance(db, advance: Dict[str, Any], new_status: str) -> None:
+    """
+    Move an advance between status buckets
+
+    Args:
+        db: Motor database handle
+        advance: The advance as it was *before* the status change
+        new_status: Status it now has
+    """
+    old_status = advance.get("status")
+    if not old_status or old_status == new_status:
+        return
+    country = await _country_of(db, advance)
+    await db[ROLLUP_COLLECTION].bulk_write([
+        _bucket_update(advance, country, old_status, -1),
+        _bucket_update(advance, country, new_status, 1),
+    ], ordered=False)
+
+
+# ======================== QUERIES ========================
+
+async def monthly_breakdown(db, statuses: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Volume, fees and count per YYYY-MM
+
+    Every month that has advances is listed; only buckets in `statuses` contribute to the figures.
+    """
+    def settled(field: str) -> Dict[str, Any]:
+        return {"$sum": {"$cond": [{"$in": ["$status", statuses]}, f"${field}", 0]}}
+
+    rows = await db[ROLLUP_COLLECTION].aggregate([
+        {"$match": {"day": {"$ne": ""}, "count": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"$substr": ["$day", 0, 7]},
+            "disbursed": settled("amount"),
+            "fees": settled("fee_amount"),
+            "count": settled("count"),
+        }},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    return {r["_id"]: {"disbursed": r["disbursed"], "fees": r["fees"], "count": r["count"]} for r in rows}
+
+
+async def totals_by(db, field: Optional[str], statuses: Optional[List[str]] = None) -> Dict[Any, Dict[str, float]]:
+    """Count / amount / fee totals grouped by a bucket field (None for a grand total)"""
+    match = {"status": {"$in": statuses}} if statuses else {}
+    rows = await db[ROLLUP_COLLECTION].aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": f"${field}" if field else None,
+            "count": {"$sum": "$count"},
+            "amount": {"$sum": "$amount"},
+            "fee_amount": {"$sum": "$fee_amount"},
+        }},
+    ]).to_list(None)
+    return {r["_id"]: {"count": r["count"], "amount": r["amount"], "fee_amount": r["fee_amount"]} for r in rows}
+
+
+# ======================== REBUILD ========================
+
+async def rebuild_rollups(db) -> int:
+    """
+    Recompute every bucket from the advances collection and replace advance_rollups
+
+    Returns:
+        Number of buckets written
+    """
+    await db.advances.aggregate([
+        {"$lookup": {
+            "from": "employers",
+            "localField": "employer_id",
+            "foreignField": "id",
+            "as": "employer",
+        }},
+        {"$group": {
+            "_id": {
+                "day": {"$substrCP": [{"$ifNull": ["$created_at", ""]}, 0, 10]},
+                "employer_id": "$employer_id",
+                "country": {"$ifNull": [
+                    "$country",
+                    {"$ifNull": [{"$arrayElemAt": ["$employer.country", 0]}, DEFAULT_COUNTRY]}
+                ]},
+                "status": "$status",
+            },
+            "count": {"$sum": 1},
+            "amount": {"$sum": {"$ifNull": ["$amount", 0]}},
+            "fee_amount": {"$sum": {"$ifNull": ["$fee_amount", 0]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "employer_id": "$_id.employer_id",
+            "country": "$_id.country",
+            "status": "$_id.status",
+            "count": 1,
+            "amount": 1,
+            "fee_amount": 1,
+        }},
+        {"$out": ROLLUP_COLLECTION},
+    ]).to_list(None)
+    buckets = await db[ROLLUP_COLLECTION].count_documents({})
+    logger.info(f"Rebuilt {ROLLUP_COLLECTION}: {buckets} buckets")
+    return buckets
+
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        buckets = await rebuild_rollups(client[os.environ["DB_NAME"]])
+    finally:
+        client.close()
+    print(f"Rebuilt {buckets} rollup buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv[1:]:
+        print("usage: python -m services.advance_rollups --rebuild")
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,157 @@
+"""
+Payout Circuit Breakers
+One breaker per Dusupay route (country + mobile money provider, or country + bank)
+so a degraded provider fails fast instead of holding every request for the full
+gateway timeout.
+
+- closed:    calls go through; CIRCUIT_FAILURE_THRESHOLD consecutive gateway
+             failures (timeouts, network errors, 5xx) open the breaker
+- open:      calls are refused without touching the network for
+             CIRCUIT_RESET_SECONDS; payouts refused here are queued for later
+- half_open: after the cool-down, CIRCUIT_HALF_OPEN_CALLS trial calls are let
+             through; a success closes the breaker, a failure re-opens it
+
+State is per process, like the user cache. Business errors from the gateway
+(validation, insufficient balance) mean the route is up and count as successes.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.environ.get("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def circuit_key(country_code: str, provider_id: Optional[str] = None) -> str:
+    """Breaker key for a payout route, e.g. KE:safaricom_ke or UG:bank"""
+    return f"{country_code.upper()}:{provider_id or 'bank'}"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a timed half-open probe"""
+
+    def __init__(
+        self,
+        key: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_started_at = 0.0
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_failure: Optional[str] = None
+        self.last_failure_at: Optional[str] = None
+        self.last_latency_ms: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state, self._trials = HALF_OPEN, 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a trial call through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (counts a half-open trial when it does)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # A trial that never reported back (cancelled request) must not hold the breaker half-open
+            if self._trials >= self.half_open_calls and self._clock() - self._trial_started_at >= self.reset_seconds:
+                self._trials = 0
+            if self._trials < self.half_open_calls:
+                self._trials += 1
+                self._trial_started_at = self._clock()
+                return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency_ms: Optional[float] = None) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.last_latency_ms = latency_ms
+        self._state = CLOSED
+
+    def record_failure(self, reason: str, latency_ms: Optional[float] = None) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_failure = reason
+        self.last_failure_at = datetime.now(timezone.utc).isoformat()
+        self.last_latency_ms = latency_ms
+        if self._state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.times_opened += 1
+            self._state, self._opened_at = OPEN, self._clock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "state": self.state,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "last_failure": self.last_failure,
+            "last_failure_at": self.last_failure_at,
+            "last_latency_ms": self.last_latency_ms,
+        }
+
+
+class CircuitBreakers:
+    """Breakers by key, created on first use"""
+
+    def __init__(self, **settings):
+        self._settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key, **self._settings)
+        return breaker
+
+    def state(self, key: str) -> str:
+        """State of a key without creating a breaker for it (unseen routes are closed)"""
+        breaker = self._breakers.get(key)
+        return breaker.state if breaker else CLOSED
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [self._breakers[key].snapshot() for key in sorted(self._breakers)]
+
+
+payout_circuits = CircuitBreakers()
+
+
+def group_health(snapshots: List[Dict[str, Any]]) -> str:
+    """healthy / degraded / down for a group of routes, in the API Health page's terms"""
+    states = [s["state"] for s in snapshots]
+    if states and all(state == OPEN for state in states):
+        return "down"
+    if any(state != CLOSED for state in states) or any(s["consecutive_failures"] for s in snapshots):
+        return "degraded"
+    return "healthy"
@@ -0,0 +1,167 @@
+"""
+Dashboard Statistics
+Aggregation pipelines behind the admin dashboards.
+
+Each collection is summarised with a single $facet aggregation so counts,
+sums and month-to-date totals are computed inside MongoDB and only a handful
+of numbers cross the wire.
+"""
+
+import asyncio
+from typing import Dict, Any, List
+
+# Advance statuses that count towards disbursed volume / fee income
+SETTLED_STATUSES = ["approved", "disbursed", "repaid"]
+MONTHLY_SETTLED_STATUSES = ["approved", "disbursed"]
+
+
+def _count_where(field: str, values: List[str]) -> Dict[str, Any]:
+    """$sum accumulator counting documents whose field is in values"""
+    return {"$sum": {"$cond": [{"$in": [f"${field}", values]}, 1, 0]}}
+
+
+def _sum_where(amount_field: str, statuses: List[str]) -> Dict[str, Any]:
+    """$sum accumulator totalling amount_field for documents in the given statuses"""
+    return {"$sum": {"$cond": [
+        {"$in": ["$status", statuses]},
+        {"$ifNull": [f"${amount_field}", 0]},
+        0
+    ]}}
+
+
+async def _facet(collection, facets: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Run a $facet pipeline and unwrap each single-row facet into a dict"""
+    result = await collection.aggregate([{"$facet": facets}]).to_list(1)
+    row = result[0] if result else {}
+    return {name: (row.get(name) or [{}])[0] for name in facets}
+
+
+async def employer_stats(db) -> Dict[str, Any]:
+    """Employer counts by status plus average risk score"""
+    facets = await _facet(db.employers, {
+        "counts": [{"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "approved": _count_where("status", ["approved"]),
+            "pending": _count_where("status", ["pending"]),
+        }}],
+        "risk": [
+            # Mirrors the original truthiness filter: unset, null and 0 scores are ignored
+            {"$match": {"risk_score": {"$nin": [None, 0]}}},
+            {"$group": {"_id": None, "avg": {"$avg": "$risk_score"}}},
+        ],
+    })
+    counts = facets["counts"]
+    return {
+        "total": counts.get("total", 0),
+        "approved": counts.get("approved", 0),
+        "pending": counts.get("pending", 0),
+        "avg_risk_score": round(facets["risk"].get("avg") or 0, 2),
+    }
+
+
+async def employee_stats(db) -> Dict[str, Any]:
+    """Employee counts by account and KYC status"""
+    facets = await _facet(db.employees, {
+        "counts": [{"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "approved": _count_where("status", ["approved"]),
+            "pending": _count_where("status", ["pending"]),
+            "kyc_pending": _count_where("kyc_status", ["pending", "submitted"]),
+            "kyc_submitted": _count_where("kyc_status", ["submitted"]),
+        }}],
+    })
+    counts = facets["counts"]
+    return {
+        key: counts.get(key, 0)
+        for key in ["total", "approved", "pending", "kyc_pending", "kyc_submitted"]
+    }
+
+
+async def advance_stats(db, month_start: str, day_start: str) -> Dict[str, Any]:
+    """
+    Advance totals, month-to-date and today figures
+
+    Args:
+        db: Motor database handle
+        month_start: ISO timestamp of the start of the current month
+        day_start: ISO timestamp of the start of the current day
+    """
+    facets = await _facet(db.advances, {
+        "totals": [{"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "disbursed": _sum_where("amount", SETTLED_STATUSES),
+            "fees": _sum_where("fee_amount", SETTLED_STATUSES),
+            "pending": _count_where("status", ["pending"]),
+        }}],
+        "monthly": [
+            {"$match": {"created_at": {"$gte": month_start}}},
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "disbursed": _sum_where("amount", MONTHLY_SETTLED_STATUSES),
+                "fees": _sum_where("fee_amount", MONTHLY_SETTLED_STATUSES),
+            }},
+        ],
+        "today": [
+            {"$match": {"created_at": {"$gte": day_start}}},
+            {"$group": {
+                "_id": None,
+                "amount": {"$sum": {"$ifNull": ["$amount", 0]}},
+                "approved": _count_where("status", ["approved"]),
+            }},
+        ],
+    })
+    totals, monthly, today = facets["totals"], facets["monthly"], facets["today"]
+    return {
+        "total_count": totals.get("count", 0),
+        "total_disbursed": totals.get("disbursed", 0),
+        "total_fees": totals.get("fees", 0),
+        "pending_count": totals.get("pending", 0),
+        "monthly_count": monthly.get("count", 0),
+        "monthly_disbursed": monthly.get("disbursed", 0),
+        "monthly_fees": monthly.get("fees", 0),
+        "today_amount": today.get("amount", 0),
+        "today_approved": today.get("approved", 0),
+    }
+
+
+async def admin_dashboard(db, month_start: str, day_start: str) -> Dict[str, Any]:
+    """Totals of GET /admin/dashboard (all but pending reviews and API health)"""
+    employers, employees, advances = await asyncio.gather(
+        employer_stats(db),
+        employee_stats(db),
+        advance_stats(db, month_start, day_start),
+    )
+    return {
+        "employers": {
+            "total": employers["total"],
+            "active": employers["approved"],
+            "pending": employers["pending"]
+        },
+        "employees": {
+            "total": employees["total"],
+            "active": employees["approved"],
+            "pending": employees["pending"]
+        },
+        "kyc_pending": {
+            "employers": employers["pending"],
+            "employees": employees["kyc_pending"]
+        },
+        "advances": {
+            "total_count": advances["total_count"],
+            "total_disbursed": advances["total_disbursed"],
+            "total_fees": advances["total_fees"],
+            "pending_count": advances["pending_count"]
+        },
+        "monthly": {
+            "disbursed": advances["monthly_disbursed"],
+            "fees": advances["monthly_fees"],
+            "advance_count": advances["monthly_count"]
+        },
+        "risk": {
+            "avg_employer_score": employers["avg_risk_score"]
+        },
+    }
@@ -0,0 +1,271 @@
+"""
+MongoDB Index Declarations
+Declares every index the API's hot queries rely on and reconciles them
+against the live database.
+
+Runs automatically on API startup, and can be run by hand:
+
+    python -m services.db_indexes            # create missing indexes, report drift
+    python -m services.db_indexes --check    # report drift only (exit code 1 on drift)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Any
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== INDEX DECLARATIONS ========================
+
+# Keyed by collection name. Index names are explicit so drift is reported
+# against a stable identifier rather than Mongo's generated names.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "employers": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "employees": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("employer_id", ASCENDING), ("employee_code", ASCENDING)], name="employer_id_employee_code"),
+        IndexModel([("employer_id", ASCENDING), ("status", ASCENDING)], name="employer_id_status"),
+        IndexModel([("kyc_status", ASCENDING)], name="kyc_status"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("employer_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="employer_id_created_at_id"
+        ),
+    ],
+    "advances": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Trailing id keeps the keyset pagination sort (created_at, id) index-backed
+        IndexModel(
+            [("employee_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="employee_id_created_at_id"
+        ),
+        IndexModel(
+            [("employer_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="employer_id_created_at_id"
+        ),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("disbursement_lock", ASCENDING)], name="disbursement_lock", sparse=True),
+        IndexModel(
+            [("payout_queue.key", ASCENDING), ("payout_queue.queued_at", ASCENDING)],
+            name="payout_queue", sparse=True
+        ),
+        IndexModel([("flagged", ASCENDING)], name="flagged"),
+    ],
+    "transactions": [
+        IndexModel([("reference", ASCENDING)], name="reference"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+    ],
+    "disbursements": [
+        IndexModel([("merchant_reference", ASCENDING)], name="merchant_reference_unique", unique=True),
+        IndexModel([("advance_id", ASCENDING)], name="advance_id"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+        # Payout reconciler: unsettled disbursements, oldest first
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ],
+    "inbound_webhooks": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # A resent callback fails this index on insert
+        IndexModel(
+            [("merchant_reference", ASCENDING), ("transaction_status", ASCENDING), ("provider_event_id", ASCENDING)],
+            name="dedup_unique", unique=True,
+            partialFilterExpression={"provider_event_id": {"$exists": True}}
+        ),
+        # Claim: due events oldest first
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+        # Claim: references held up behind an event that is backing off
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING), ("received_at", ASCENDING)],
+                   name="status_available_at"),
+        # Per-reference ordering check
+        IndexModel([("merchant_reference", ASCENDING), ("status", ASCENDING), ("received_at", ASCENDING)],
+                   name="merchant_reference_status_received_at"),
+        IndexModel([("received_at", DESCENDING)], name="received_at"),
+    ],
+    "disbursement_batches": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "disbursement_batch_items": [
+        IndexModel([("batch_id", ASCENDING), ("created_at", ASCENDING)], name="batch_id_created_at"),
+    ],
+    "kyc_documents": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # KYC file endpoint: stored file name -> blob
+        IndexModel([("stored_name", ASCENDING)], name="stored_name", sparse=True),
+    ],
+    "kyc_blobs": [
+        IndexModel([("sha256", ASCENDING)], name="sha256_unique", unique=True),
+    ],
+    "fraud_rules": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("enabled", ASCENDING)], name="enabled"),
+    ],
+    "audit_trail": [
+        IndexModel([("changed_at", DESCENDING)], name="changed_at"),
+        IndexModel([("type", ASCENDING), ("changed_at", DESCENDING)], name="type_changed_at"),
+        IndexModel([("changed_by", ASCENDING), ("changed_at", DESCENDING)], name="changed_by_changed_at"),
+        IndexModel([("id", ASCENDING)], name="id"),
+    ],
+    "settings_audit_log": [
+        IndexModel([("changed_at", DESCENDING)], name="changed_at"),
+    ],
+    "admin_requests": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+    ],
+    "employer_settings": [
+        IndexModel([("employer_id", ASCENDING)], name="employer_id"),
+    ],
+    "employee_settings": [
+        IndexModel([("employee_id", ASCENDING)], name="employee_id"),
+    ],
+    "employer_settings_log": [
+        IndexModel([("employer_id", ASCENDING), ("created_at", DESCENDING)], name="employer_id_created_at"),
+    ],
+    "payroll_records": [
+        IndexModel([("employer_id", ASCENDING), ("uploaded_at", DESCENDING)], name="employer_id_uploaded_at"),
+        IndexModel([("job_id", ASCENDING)], name="job_id"),
+    ],
+    "payroll_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("employer_id", ASCENDING), ("created_at", DESCENDING)], name="employer_id_created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ],
+    "advance_rollups": [
+        IndexModel(
+            [("day", ASCENDING), ("employer_id", ASCENDING), ("country", ASCENDING), ("status", ASCENDING)],
+            name="bucket_unique",
+            unique=True
+        ),
+        IndexModel([("status", ASCENDING), ("day", ASCENDING)], name="status_day"),
+    ],
+    "fraud_counters": [
+        IndexModel([("employee_id", ASCENDING)], name="employee_id_unique", unique=True),
+    ],
+    "risk_scores": [
+        IndexModel(
+            [("entity_type", ASCENDING), ("entity_id", ASCENDING), ("calculated_at", DESCENDING)],
+            name="entity_calculated_at"
+        ),
+    ],
+}
+
+
+# ======================== RECONCILIATION ========================
+
+def _key_of(spec: Dict[str, Any]) -> tuple:
+    """Normalise an index key pattern to a comparable tuple"""
+    key = spec["key"]
+    items = key.items() if hasattr(key, "items") else key
+    return tuple((field, int(direction)) for field, direction in items)
+
+
+def diff_indexes(declared: List[IndexModel], live: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compare declared indexes for one collection against index_information() output
+
+    Returns:
+        Dict with 'missing', 'changed' and 'extra' index names
+    """
+    live_by_key = {_key_of(info): (name, info) for name, info in live.items() if name != "_id_"}
+    declared_keys = set()
+    drift = {"missing": [], "changed": [], "extra": []}
+
+    for model in declared:
+        doc = model.document
+        key = _key_of(doc)
+        declared_keys.add(key)
+        if key not in live_by_key:
+            drift["missing"].append(doc["name"])
+            continue
+        live_name, info = live_by_key[key]
+        if bool(info.get("unique", False)) != bool(doc.get("unique", False)):
+            drift["changed"].append(f"{doc['name']} (live: {live_name}, unique={bool(info.get('unique', False))})")
+
+    for key, (live_name, _) in live_by_key.items():
+        if key not in declared_keys:
+            drift["extra"].append(live_name)
+
+    return drift
+
+
+async def reconcile_indexes(db, apply: bool = True) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Reconcile declared indexes with the live database
+
+    Args:
+        db: Motor database handle
+        apply: Create missing indexes when True; only report when False
+
+    Returns:
+        Drift report keyed by collection (collections without drift are omitted)
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        try:
+            live = await db[collection].index_information()
+        except OperationFailure:
+            live = {}
+
+        drift = diff_indexes(models, live)
+        if any(drift.values()):
+            report[collection] = drift
+            logger.warning(
+                f"Index drift on {collection}: missing={drift['missing']} "
+                f"changed={drift['changed']} extra={drift['extra']}"
+            )
+
+        if apply and drift["missing"]:
+            to_create = [m for m in models if m.document["name"] in drift["missing"]]
+            try:
+                await db[collection].create_indexes(to_create)
+                logger.info(f"Created indexes on {collection}: {drift['missing']}")
+            except OperationFailure as e:
+                # e.g. a unique index over legacy duplicate data - keep serving, surface the error
+                logger.error(f"Failed to create indexes on {collection}: {e}")
+
+    return report
+
+
+# ======================== CLI ========================
+
+async def _main(check_only: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        report = await reconcile_indexes(client[os.environ["DB_NAME"]], apply=not check_only)
+    finally:
+        client.close()
+
+    if not report:
+        print("Indexes in sync")
+        return 0
+    for collection, drift in report.items():
+        print(f"{collection}: {drift}")
+    return 1 if check_only else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main(check_only="--check" in sys.argv[1:])))
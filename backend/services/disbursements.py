@@ -0,0 +1,736 @@
+"""
+Advance Disbursements
+Sends approved advances to Dusupay, one at a time or as a concurrent batch.
+
+A disbursement claims the advance first: a conditional update stamps it with
+`disbursement_lock` only if it is still approved and not already locked by
+another request or batch, so double clicks and overlapping batches cannot pay
+an advance twice. The lock is cleared when the payout outcome is recorded.
+A lock older than lock_timeout_seconds() - the worst case for paying one
+chunk of a batch - belongs to a request that died and may be taken over, so a
+batch claims its advances a chunk at a time, just before paying them, and
+renews each lock with a conditional update right before its payout is sent. A
+payout whose lock was taken over in the meantime is skipped.
+If a batch payout raises part-way, whether Dusupay was paid is unknown: the
+advance is stamped with `disbursement_review` and is never claimed again until
+an admin clears the flag.
+
+A batch selects approved advances and loads their employees, users and
+employers with one $in query each. The payouts are then fanned out in chunks of
+at most DISBURSE_CONCURRENCY, all in flight at once, and at most DISBURSE_PROVIDER_RATE per second
+per provider (country + mobile money provider, or country + bank). Each item's
+outcome goes into `disbursement_batch_items` and the batch document carries
+running counts and the achieved payouts/sec.
+
+A payout refused because its route's circuit breaker is open is not a failure:
+the advance stays approved and is stamped with `payout_queue` (route key and,
+if an earlier attempt may have reached Dusupay, the merchant reference to reuse).
+The same goes for a payout whose retries ran out on a timeout, network or
+gateway error - Dusupay may have accepted it, so its reference is kept and the
+next attempt asks Dusupay about it before posting anything. PayoutQueue re-sends
+queued advances once their breaker lets calls through again.
+
+Status updates from Dusupay (webhooks, status checks) go through apply_status,
+which only moves a disbursement forward: PENDING -> PROCESSING -> one of the
+terminal COMPLETED / FAILED / CANCELLED. The transition is a conditional update
+on the current status, so duplicates and late arrivals (a PENDING after
+COMPLETED, a FAILED after COMPLETED) change nothing, and the advance and
+transaction are only touched by the update that actually moved the disbursement.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from itertools import chain, zip_longest
+from typing import Optional, Dict, Any, List, Tuple
+
+from pymongo import ReturnDocument
+
+from services.advance_rollups import move_advance
+from services.circuit_breaker import OPEN, HALF_OPEN, payout_circuits
+from services.dusupay import DusupayConfig, DusupayService, PayoutResponse, PayoutStatus, COUNTRY_CURRENCY, CIRCUIT_OPEN, GATEWAY_FAILURES
+from services.enrichment import collect_keys, fetch_by_keys
+
+logger = logging.getLogger(__name__)
+
+DISBURSE_CONCURRENCY = int(os.environ.get("DISBURSE_CONCURRENCY", "20"))
+DISBURSE_PROVIDER_RATE = float(os.environ.get("DISBURSE_PROVIDER_RATE", "10"))
+# Slack on top of the worst-case chunk time before a lock counts as stale
+DISBURSEMENT_LOCK_MARGIN_SECONDS = 60
+MAX_BATCH_SIZE = 5000
+DISBURSE_QUEUE_POLL_SECONDS = float(os.environ.get("DISBURSE_QUEUE_POLL_SECONDS", "15"))
+DEFAULT_COUNTRY = "KE"
+
+
+class DisbursementError(Exception):
+    """The advance cannot be paid out as configured (missing or unsupported details)"""
+
+
+class DisbursementNotFound(Exception):
+    """No disbursement has this merchant_reference (yet)"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def callback_url() -> Optional[str]:
+    callback_base = os.environ.get("REACT_APP_BACKEND_URL", "")
+    return f"{callback_base}/api/webhooks/dusupay" if callback_base else None
+
+
+def recipient_name_of(user: Optional[Dict[str, Any]]) -> str:
+    return user.get("full_name", "Unknown") if user else "Unknown"
+
+
+def country_of(employer: Optional[Dict[str, Any]]) -> str:
+    return employer.get("country", DEFAULT_COUNTRY) if employer else DEFAULT_COUNTRY
+
+
+def provider_key(advance: Dict[str, Any], employee: Dict[str, Any], country_code: str) -> str:
+    """Rate-limit bucket for an advance's payout"""
+    if advance.get("disbursement_method", "mobile_money") == "mobile_money":
+        details = advance.get("disbursement_details", {})
+        provider = details.get("provider", employee.get("mobile_money_provider", "mpesa"))
+        return f"{country_code}:{str(provider).lower()}"
+    return f"{country_code}:bank"
+
+
+# ======================== CLAIMING ========================
+
+def lock_timeout_seconds(config: Optional[DusupayConfig] = None) -> float:
+    """
+    Age at which a disbursement lock belongs to a request that died
+
+    The worst case from claiming a batch chunk to recording its last payout:
+    every payout in the chunk waits its turn at DISBURSE_PROVIDER_RATE, then
+    runs out its retries on timeouts.
+    """
+    config = config or DusupayConfig()
+    return (DISBURSE_CONCURRENCY / DISBURSE_PROVIDER_RATE + config.payout_worst_case_seconds
+            + DISBURSEMENT_LOCK_MARGIN_SECONDS)
+
+
+def _stale_before(now: datetime) -> str:
+    return (now - timedelta(seconds=lock_timeout_seconds())).isoformat()
+
+
+def _claimable(now: datetime) -> Dict[str, Any]:
+    stale = _stale_before(now)
+    return {
+        "status": "approved",
+        "disbursement_review": None,
+        "$or": [{"disbursement_lock": None}, {"disbursement_locked_at": {"$lt": stale}}],
+    }
+
+
+async def claim(db, advance_ids: List[str], token: str) -> int:
+    """Lock the still-approved, unlocked advances among advance_ids for `token`"""
+    now = _now()
+    result = await db.advances.update_many(
+        {"id": {"$in": advance_ids}, **_claimable(now)},
+        {"$set": {"disbursement_lock": token, "disbursement_locked_at": now.isoformat()}}
+    )
+    return result.modified_count
+
+
+async def renew(db, advance_id: str, token: str) -> bool:
+    """Restart a lock still held by `token` that has not gone stale; False if it was lost"""
+    now = _now()
+    result = await db.advances.update_one(
+        {"id": advance_id, "status": "approved", "disbursement_lock": token,
+         "disbursement_locked_at": {"$gte": _stale_before(now)}},
+        {"$set": {"disbursement_locked_at": now.isoformat()}}
+    )
+    return bool(result.matched_count)
+
+
+async def unlock(db, advance_id: str, token: str) -> None:
+    await db.advances.update_one(
+        {"id": advance_id, "disbursement_lock": token},
+        {"$unset": {"disbursement_lock": "", "disbursement_locked_at": ""}}
+    )
+
+
+async def flag_for_review(db, advance_id: str, token: str, reason: str) -> None:
+    """Keep a claimed advance out of every later claim until an admin has checked it with Dusupay"""
+    await db.advances.update_one(
+        {"id": advance_id, "disbursement_lock": token},
+        {"$set": {"disbursement_review": {"reason": reason, "lock": token, "flagged_at": _now().isoformat()}}}
+    )
+
+
+async def clear_review(db, advance_id: str) -> bool:
+    """Make a reviewed advance claimable again; False if it was not flagged"""
+    result = await db.advances.update_one(
+        {"id": advance_id, "disbursement_review": {"$ne": None}},
+        {"$unset": {"disbursement_review": "", "disbursement_lock": "", "disbursement_locked_at": ""}}
+    )
+    return bool(result.modified_count)
+
+
+# ======================== PAYOUTS ========================
+
+async def send_payout(
+    dusupay: DusupayService,
+    advance: Dict[str, Any],
+    employee: Dict[str, Any],
+    recipient_name: str,
+    country_code: str,
+    callback: Optional[str] = None
+) -> Tuple[str, PayoutResponse]:
+    """
+    Ask Dusupay to pay out an advance by its disbursement method
+
+    Returns:
+        (merchant_reference, payout response)
+
+    Raises:
+        DisbursementError: recipient details are missing or the method is unsupported
+    """
+    queued = advance.get("payout_queue") or {}
+    merchant_reference = queued.get("reference") or dusupay.generate_reference(prefix="EWA")
+    if queued.get("sent"):
+        # An attempt before the breaker opened may have reached Dusupay; never pay twice
+        existing = await dusupay.check_payout_status(merchant_reference, queued.get("key"))
+        if existing.success and existing.status:
+            return merchant_reference, DusupayService.from_existing(existing)
+
+    disbursement_method = advance.get("disbursement_method", "mobile_money")
+    disbursement_details = advance.get("disbursement_details", {})
+    narration = f"EaziWage Advance - {advance['id'][:8]}"
+
+    if disbursement_method == "mobile_money":
+        provider = disbursement_details.get("provider", employee.get("mobile_money_provider", "mpesa"))
+        phone_number = disbursement_details.get("number", employee.get("mobile_money_number", ""))
+        if not phone_number:
+            raise DisbursementError("Mobile money number not configured for employee")
+
+        payout_response = await dusupay.create_mobile_money_payout(
+            amount=advance["net_amount"],
+            country_code=country_code,
+            provider_name=provider,
+            phone_number=phone_number,
+            recipient_name=recipient_name,
+            reference=merchant_reference,
+            narration=narration,
+            callback_url=callback
+        )
+
+    elif disbursement_method == "bank_transfer":
+        bank_code = disbursement_details.get("bank_code", "")
+        account_number = disbursement_details.get("account_number", employee.get("bank_account_number", ""))
+        account_name = disbursement_details.get("account_name", recipient_name)
+        if not account_number or not bank_code:
+            raise DisbursementError("Bank account details not configured for employee")
+
+        payout_response = await dusupay.create_bank_payout(
+            amount=advance["net_amount"],
+            country_code=country_code,
+            bank_code=bank_code,
+            account_number=account_number,
+            account_name=account_name,
+            reference=merchant_reference,
+            narration=narration,
+            callback_url=callback
+        )
+
+    else:
+        raise DisbursementError(f"Unsupported disbursement method: {disbursement_method}")
+
+    return merchant_reference, payout_response
+
+
+async def record_payout(
+    db,
+    advance: Dict[str, Any],
+    employee: Dict[str, Any],
+    recipient_name: str,
+    country_code: str,
+    merchant_reference: str,
+    payout_response: Optional[PayoutResponse]
+) -> Optional[str]:
+    """
+    Persist a payout attempt and release the advance's lock
+
+    Only for payouts Dusupay accepted or clearly refused; a circuit-open or
+    unclear outcome goes to queue_payout so its reference is not lost.
+
+    Returns:
+        None if the payout was accepted, otherwise the error message
+    """
+    now = _now().isoformat()
+    release = {"disbursement_lock": "", "disbursement_locked_at": "", "payout_queue": ""}
+
+    attempts = payout_response.attempts if payout_response else []
+
+    if not (payout_response and payout_response.success):
+        error_message = payout_response.message if payout_response else "Unknown error"
+        await db.advances.update_one(
+            {"id": advance["id"]},
+            {"$set": {
+                "disbursement_error": error_message,
+                "disbursement_failed_at": now,
+                "disbursement_attempts": attempts,
+            }, "$unset": release}
+        )
+        return error_message
+
+    disbursement_details = advance.get("disbursement_details", {})
+    disbursement_method = advance.get("disbursement_method", "mobile_money")
+    currency = COUNTRY_CURRENCY.get(country_code, "KES")
+
+    await db.advances.update_one(
+        {"id": advance["id"]},
+        {"$set": {
+            "status": "disbursing",
+            "disbursement_reference": merchant_reference,
+            "dusupay_reference": payout_response.internal_reference,
+            "disbursement_initiated_at": now,
+            "disbursement_status": "PENDING",
+            "disbursement_attempts": attempts,
+        }, "$unset": release}
+    )
+    await move_advance(db, advance, "disbursing")
+
+    # Create disbursement record for tracking
+    await db.disbursements.insert_one({
+        "id": str(uuid.uuid4()),
+        "advance_id": advance["id"],
+        "employee_id": advance["employee_id"],
+        "employer_id": employee.get("employer_id"),
+        "merchant_reference": merchant_reference,
+        "internal_reference": payout_response.internal_reference,
+        "amount": advance["net_amount"],
+        "currency": currency.value if hasattr(currency, "value") else "KES",
+        "method": disbursement_method,
+        "provider": disbursement_details.get("provider", ""),
+        "recipient": disbursement_details.get("number") or disbursement_details.get("account_number", ""),
+        "recipient_name": recipient_name,
+        "status": "PENDING",
+        "created_at": now,
+        "attempts": attempts,
+        "circuit": payout_response.circuit,
+        "raw_response": payout_response.raw_response
+    })
+
+    # Create transaction record
+    await db.transactions.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": advance["employee_id"],
+        "type": "disbursement",
+        "amount": advance["net_amount"],
+        "reference": merchant_reference,
+        "status": "pending",
+        "created_at": now,
+        "metadata": {
+            "advance_id": advance["id"],
+            "method": disbursement_method,
+            "dusupay_reference": payout_response.internal_reference
+        }
+    })
+    return None
+
+
+def circuit_open(payout_response: Optional[PayoutResponse]) -> bool:
+    """The payout was refused by an open circuit breaker and should be queued"""
+    return bool(payout_response) and payout_response.error_code == CIRCUIT_OPEN
+
+
+def payout_unclear(payout_response: Optional[PayoutResponse]) -> bool:
+    """The retries ran out on a timeout, network or gateway error: Dusupay may have accepted the payout"""
+    return bool(payout_response) and payout_response.error_code in GATEWAY_FAILURES
+
+
+def should_queue(payout_response: Optional[PayoutResponse]) -> bool:
+    """Queue the payout for PayoutQueue instead of recording it as initiated or failed"""
+    return circuit_open(payout_response) or payout_unclear(payout_response)
+
+
+async def queue_payout(db, advance: Dict[str, Any], merchant_reference: str, payout_response: PayoutResponse) -> None:
+    """Leave the advance approved, marked for PayoutQueue, and release its lock"""
+    queued = advance.get("payout_queue") or {}
+    # Any attempt other than the breaker's refusal went out on the wire
+    sent = (queued.get("sent", False) or payout_unclear(payout_response)
+            or any(a.get("outcome") != CIRCUIT_OPEN for a in payout_response.attempts))
+    await db.advances.update_one(
+        {"id": advance["id"]},
+        {"$set": {
+            "payout_queue": {
+                "key": payout_response.circuit,
+                "reference": merchant_reference if sent else None,
+                "sent": sent,
+                "reason": payout_response.message,
+                "queued_at": queued.get("queued_at") or _now().isoformat(),
+            },
+            "disbursement_attempts": payout_response.attempts,
+        }, "$unset": {"disbursement_lock": "", "disbursement_locked_at": ""}}
+    )
+
+
+# ======================== STATUS TRANSITIONS ========================
+
+# Disbursement statuses by progress; a status may only be replaced by a later one
+STATUS_RANK = {
+    PayoutStatus.PENDING.value: 0,
+    PayoutStatus.PROCESSING.value: 1,
+    PayoutStatus.COMPLETED.value: 2,
+    PayoutStatus.FAILED.value: 2,
+    PayoutStatus.CANCELLED.value: 2,
+}
+
+# What the advance and transaction become when the disbursement reaches a terminal status
+ADVANCE_OUTCOMES = {
+    PayoutStatus.COMPLETED.value: ("disbursed", "completed"),
+    PayoutStatus.FAILED.value: ("approved", "failed"),
+    PayoutStatus.CANCELLED.value: ("approved", "cancelled"),
+}
+
+
+def can_transition(current: Optional[str], new: str) -> bool:
+    """Whether a disbursement in `current` may move to `new` (None: no status recorded)"""
+    if new not in STATUS_RANK:
+        return False
+    return current is None or STATUS_RANK.get(current, -1) < STATUS_RANK[new]
+
+
+def previous_statuses(new: str) -> List[Optional[str]]:
+    """Statuses a disbursement may be in for `new` to apply - the conditional update's filter"""
+    if new not in STATUS_RANK:
+        return []
+    return [None] + [s for s in STATUS_RANK if can_transition(s, new)]
+
+
+async def apply_status(
+    db,
+    merchant_reference: str,
+    new_status: str,
+    details: Optional[Dict[str, Any]] = None,
+    source: str = "webhook"
+) -> bool:
+    """
+    Move a disbursement (and its advance and transaction) to a status reported by Dusupay
+
+    Args:
+        db: Motor database handle
+        merchant_reference: The payout's merchant reference
+        new_status: Dusupay transaction status (upper case)
+        details: Dusupay's transaction data, stored on the disbursement as <source>_payload
+        source: What reported the status - "webhook" or "status_check"
+
+    Returns:
+        True if the disbursement moved; False for a duplicate, stale or unknown status
+
+    Raises:
+        DisbursementNotFound: no disbursement has this merchant_reference
+    """
+    if new_status not in STATUS_RANK:
+        return False
+    now = _now().isoformat()
+    update = {"status": new_status, "status_source": source, "updated_at": now}
+    if details is not None:
+        update[f"{source}_payload"] = details
+    disbursement = await db.disbursements.find_one_and_update(
+        {"merchant_reference": merchant_reference, "status": {"$in": previous_statuses(new_status)}},
+        {"$set": update},
+        projection={"_id": 0, "advance_id": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not disbursement:
+        if not await db.disbursements.find_one({"merchant_reference": merchant_reference}, {"_id": 1}):
+            raise DisbursementNotFound(merchant_reference)
+        return False
+
+    if new_status not in ADVANCE_OUTCOMES:
+        return True
+    advance_status, transaction_status = ADVANCE_OUTCOMES[new_status]
+    advance_id = disbursement.get("advance_id")
+    if new_status == PayoutStatus.COMPLETED.value:
+        advance_update = {"status": advance_status, "disbursement_status": new_status, "disbursed_at": now}
+    elif new_status == PayoutStatus.FAILED.value:
+        # Back to approved so the advance can be disbursed again
+        advance_update = {
+            "status": advance_status,
+            "disbursement_status": new_status,
+            "disbursement_error": (details or {}).get("failure_reason", "Unknown error"),
+            "disbursement_failed_at": now,
+        }
+    else:
+        advance_update = {"status": advance_status, "disbursement_status": new_status}
+
+    # Only an advance still waiting on this payout moves
+    advance = await db.advances.find_one_and_update(
+        {"id": advance_id, "status": "disbursing", "disbursement_reference": merchant_reference},
+        {"$set": advance_update},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if advance:
+        await move_advance(db, advance, advance_status)
+    await db.transactions.update_one(
+        {"reference": merchant_reference, "status": "pending"},
+        {"$set": {"status": transaction_status}}
+    )
+    if new_status == PayoutStatus.COMPLETED.value:
+        logger.info(f"Advance {advance_id} disbursed successfully")
+    else:
+        logger.warning(f"Advance {advance_id} disbursement {new_status.lower()}")
+    return True
+
+
+# ======================== BATCHES ========================
+
+class ProviderRateLimiter:
+    """Spaces calls for the same key at least 1 / rate seconds apart"""
+
+    def __init__(self, rate_per_second: float = DISBURSE_PROVIDER_RATE, clock=time.monotonic):
+        self.interval = 1.0 / rate_per_second
+        self.clock = clock
+        self._next_slot: Dict[str, float] = {}
+
+    async def acquire(self, key: str) -> None:
+        now = self.clock()
+        slot = max(now, self._next_slot.get(key, now))
+        self._next_slot[key] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def interleave_by(items: List[Dict[str, Any]], key) -> List[Dict[str, Any]]:
+    """Round-robin items across keys so one throttled provider does not fill every slot"""
+    groups = defaultdict(list)
+    for item in items:
+        groups[key(item)].append(item)
+    return [item for item in chain.from_iterable(zip_longest(*groups.values())) if item is not None]
+
+
+def new_batch(requested_by: str, advance_ids: Optional[List[str]], limit: int) -> Dict[str, Any]:
+    now = _now().isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "requested_by": requested_by,
+        "advance_ids": advance_ids,
+        "limit": limit,
+        "status": "running",
+        "total": 0,
+        "initiated": 0,
+        "failed": 0,
+        "queued": 0,
+        "skipped": 0,
+        "payouts_per_second": None,
+        "duration_seconds": None,
+        "created_at": now,
+        "completed_at": None,
+    }
+
+
+async def select_advances(db, advance_ids: Optional[List[str]], limit: int) -> List[str]:
+    """Approved advances to pay out, oldest first"""
+    query = {"status": "approved"}
+    if advance_ids:
+        query["id"] = {"$in": advance_ids}
+    advances = await db.advances.find(query, {"_id": 0, "id": 1}).sort("created_at", 1).to_list(limit)
+    return [a["id"] for a in advances]
+
+
+async def disburse_one(
+    db,
+    dusupay: DusupayService,
+    advance: Dict[str, Any],
+    employee: Optional[Dict[str, Any]],
+    user: Optional[Dict[str, Any]],
+    employer: Optional[Dict[str, Any]],
+    limiter: Optional[ProviderRateLimiter] = None,
+    callback: Optional[str] = None
+) -> Dict[str, Any]:
+    """Pay out one claimed advance and return its outcome"""
+    outcome = {"advance_id": advance["id"], "amount": advance.get("net_amount")}
+    if not employee:
+        await unlock(db, advance["id"], advance["disbursement_lock"])
+        return {**outcome, "status": "failed", "error": "Employee not found"}
+
+    name, country_code = recipient_name_of(user), country_of(employer)
+    try:
+        if limiter:
+            await limiter.acquire(provider_key(advance, employee, country_code))
+        if not await renew(db, advance["id"], advance["disbursement_lock"]):
+            # Held too long and taken over by another claim: that one pays it
+            return {**outcome, "status": "skipped", "error": "Disbursement lock taken over"}
+        merchant_reference, payout_response = await send_payout(dusupay, advance, employee, name, country_code, callback)
+    except DisbursementError as e:
+        await unlock(db, advance["id"], advance["disbursement_lock"])
+        return {**outcome, "status": "failed", "error": str(e)}
+
+    outcome.update({"reference": merchant_reference, "attempts": len(payout_response.attempts) if payout_response else 0})
+    if should_queue(payout_response):
+        await queue_payout(db, advance, merchant_reference, payout_response)
+        return {**outcome, "status": "queued", "error": payout_response.message}
+
+    error = await record_payout(db, advance, employee, name, country_code, merchant_reference, payout_response)
+    if error:
+        return {**outcome, "status": "failed", "error": error}
+    return {**outcome, "status": "initiated", "dusupay_reference": payout_response.internal_reference}
+
+
+async def run_batch(
+    db,
+    dusupay: DusupayService,
+    batch: Dict[str, Any],
+    concurrency: int = DISBURSE_CONCURRENCY,
+    limiter: Optional[ProviderRateLimiter] = None
+) -> Dict[str, Any]:
+    """
+    Claim and pay out the batch's advances concurrently, a chunk at a time
+
+    Each chunk is claimed right before it is paid, so no lock is held longer
+    than lock_timeout_seconds() allows for.
+
+    Args:
+        db: Motor database handle
+        dusupay: Payout service
+        batch: Batch document from new_batch (already inserted)
+        concurrency: Payouts in flight at once (chunks are at most DISBURSE_CONCURRENCY)
+        limiter: Per-provider rate limiter (defaults to DISBURSE_PROVIDER_RATE)
+
+    Returns:
+        The finished batch document
+    """
+    limiter = limiter or ProviderRateLimiter()
+    started = time.perf_counter()
+    batch_id = batch["id"]
+
+    selected = await select_advances(db, batch.get("advance_ids"), min(batch["limit"], MAX_BATCH_SIZE))
+    # What routing needs; the chunks re-read their advances once claimed
+    found = await db.advances.find(
+        {"id": {"$in": selected}}, {"_id": 0, "id": 1, "employee_id": 1, "disbursement_method": 1,
+                                     "disbursement_details": 1}
+    ).to_list(None)
+    rank = {advance_id: i for i, advance_id in enumerate(selected)}
+    candidates = sorted(found, key=lambda a: rank[a["id"]])
+
+    # Everything the payouts need, one query per collection
+    employees = await fetch_by_keys(db.employees, collect_keys(candidates, "employee_id"), projection={"_id": 0})
+    users = await fetch_by_keys(db.users, collect_keys(employees.values(), "user_id"),
+                                projection={"_id": 0, "id": 1, "full_name": 1})
+    employers = await fetch_by_keys(db.employers, collect_keys(employees.values(), "employer_id"),
+                                    projection={"_id": 0, "id": 1, "country": 1})
+
+    def context(advance):
+        employee = employees.get(advance["employee_id"])
+        employer = employers.get(employee.get("employer_id")) if employee else None
+        user = users.get(employee.get("user_id")) if employee else None
+        return employee, user, employer
+
+    def key(advance):
+        employee, _, employer = context(advance)
+        return provider_key(advance, employee, country_of(employer)) if employee else ""
+
+    semaphore = asyncio.Semaphore(concurrency)
+    callback = callback_url()
+    total = 0
+
+    async def disburse(advance):
+        async with semaphore:
+            try:
+                outcome = await disburse_one(db, dusupay, advance, *context(advance), limiter=limiter, callback=callback)
+            except Exception as e:
+                # The payout may have been sent; keep it out of later claims until reviewed
+                logger.exception(f"Disbursing advance {advance['id']} in batch {batch_id} failed")
+                await flag_for_review(db, advance["id"], batch_id, str(e))
+                outcome = {"advance_id": advance["id"], "amount": advance.get("net_amount"),
+                           "status": "failed", "error": str(e), "needs_review": True}
+        await db.disbursement_batch_items.insert_one({
+            "id": str(uuid.uuid4()), "batch_id": batch_id, **outcome, "created_at": _now().isoformat()
+        })
+        await db.disbursement_batches.update_one({"id": batch_id}, {"$inc": {outcome["status"]: 1}})
+
+    ordered = [a["id"] for a in interleave_by(candidates, key)]
+    chunk_size = min(concurrency, DISBURSE_CONCURRENCY)
+    for i in range(0, len(ordered), chunk_size):
+        chunk = ordered[i:i + chunk_size]
+        await claim(db, chunk, batch_id)
+        claimed = {a["id"]: a for a in await db.advances.find(
+            {"id": {"$in": chunk}, "disbursement_lock": batch_id}, {"_id": 0}).to_list(None)}
+        total += len(claimed)
+        await db.disbursement_batches.update_one(
+            {"id": batch_id}, {"$inc": {"total": len(claimed), "skipped": len(chunk) - len(claimed)}}
+        )
+        await asyncio.gather(*[disburse(claimed[advance_id]) for advance_id in chunk if advance_id in claimed])
+
+    duration = time.perf_counter() - started
+    return await db.disbursement_batches.find_one_and_update(
+        {"id": batch_id},
+        {"$set": {
+            "status": "completed",
+            "completed_at": _now().isoformat(),
+            "duration_seconds": round(duration, 3),
+            "payouts_per_second": round(total / duration, 2) if duration else None,
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+# ======================== PAYOUT QUEUE ========================
+
+async def queued_advances(db, limit: int = MAX_BATCH_SIZE) -> List[str]:
+    """
+    Queued advances whose route accepts calls again, oldest first
+
+    A half-open route gets a single advance as its trial; the rest follow once
+    that payout has closed the breaker.
+    """
+    base = {"status": "approved", "payout_queue": {"$ne": None}}
+    selected = []
+    for key in await db.advances.distinct("payout_queue.key", base):
+        state = payout_circuits.state(key) if key else None
+        if state == OPEN:
+            continue
+        advances = await db.advances.find(
+            {**base, "payout_queue.key": key}, {"_id": 0, "id": 1}
+        ).sort("payout_queue.queued_at", 1).to_list(1 if state == HALF_OPEN else limit)
+        selected.extend(a["id"] for a in advances)
+    return selected[:limit]
+
+
+class PayoutQueue:
+    """Background loop re-sending payouts that were queued while their breaker was open"""
+
+    def __init__(self, db, dusupay_factory, poll_interval: float = DISBURSE_QUEUE_POLL_SECONDS):
+        self.db = db
+        self.dusupay_factory = dusupay_factory
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def drain(self) -> Optional[Dict[str, Any]]:
+        """Run one batch over the ready queued advances; None when there are none"""
+        advance_ids = await queued_advances(self.db)
+        if not advance_ids:
+            return None
+        batch = new_batch("payout-queue", advance_ids, len(advance_ids))
+        await self.db.disbursement_batches.insert_one(batch)
+        return await run_batch(self.db, self.dusupay_factory(), batch)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                batch = await self.drain()
+                if batch:
+                    logger.info(f"Payout queue batch {batch['id']}: {batch['initiated']} initiated, "
+                                f"{batch['queued']} still queued, {batch['failed']} failed")
+            except Exception:
+                logger.exception("Draining the payout queue failed")
+            await asyncio.sleep(self.poll_interval)
@@ -6,16 +6,26 @@ across Kenya, Tanzania, Uganda, and Rwanda.
 Documentation: https://developer.dusupay.com
 """
 
+import asyncio
+import logging
 import os
+import random
+import time
 import uuid
 import hmac
 import hashlib
 import httpx
+from collections import Counter
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone
 from enum import Enum
 from pydantic import BaseModel
 
+from services.circuit_breaker import circuit_key, payout_circuits
+from services.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
 
 # ======================== CONFIGURATION ========================
 
@@ -31,6 +41,29 @@ class DusupayConfig:
         # Base URLs
         self.sandbox_url = "https://sandboxapi.dusupay.com/v1"
         self.production_url = "https://payments.dusupay.com/v1"
+        
+        # Connection pool - size max_connections for the payout burst (DISBURSE_CONCURRENCY)
+        self.max_connections = int(os.environ.get("DUSUPAY_MAX_CONNECTIONS", "50"))
+        self.max_keepalive_connections = int(os.environ.get("DUSUPAY_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.environ.get("DUSUPAY_KEEPALIVE_EXPIRY", "30"))
+        self.http2 = os.environ.get("DUSUPAY_HTTP2", "false").lower() in ("1", "true", "yes")
+        
+        # Timeouts (seconds): failing to connect is reported quickly, a slow gateway gets longer
+        self.connect_timeout = float(os.environ.get("DUSUPAY_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.environ.get("DUSUPAY_READ_TIMEOUT", "30"))
+        self.write_timeout = float(os.environ.get("DUSUPAY_WRITE_TIMEOUT", "10"))
+        self.pool_timeout = float(os.environ.get("DUSUPAY_POOL_TIMEOUT", "10"))
+        
+        # Payout retries: jittered exponential backoff, same merchant_reference every attempt
+        self.payout_max_attempts = int(os.environ.get("DUSUPAY_PAYOUT_MAX_ATTEMPTS", "4"))
+        self.retry_base_delay = float(os.environ.get("DUSUPAY_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.environ.get("DUSUPAY_RETRY_MAX_DELAY", "8"))
+    
+    @property
+    def payout_worst_case_seconds(self) -> float:
+        """Longest one payout can take: a status check and a POST per attempt, each running out every timeout"""
+        request = self.pool_timeout + self.connect_timeout + self.write_timeout + self.read_timeout
+        return 2 * self.payout_max_attempts * request + (self.payout_max_attempts - 1) * self.retry_max_delay
     
     @property
     def base_url(self) -> str:
@@ -103,6 +136,27 @@ MOBILE_MONEY_PROVIDERS = {
     },
 }
 
+# Integration reported on the API Health page, by Dusupay provider id prefix
+PROVIDER_INTEGRATIONS = (
+    ("safaricom", "mpesa"),
+    ("vodacom", "mpesa"),
+    ("airtel", "airtel_money"),
+    ("mtn", "mtn_momo"),
+    ("tigo", "tigo_pesa"),
+    ("halotel", "halopesa"),
+    ("bank", "bank_api"),
+)
+
+
+def integration_of(circuit: Optional[str]) -> str:
+    """Telemetry integration of a payout route (circuit key); "dusupay" when the route is unknown"""
+    provider = circuit.split(":", 1)[-1] if circuit else ""
+    for prefix, integration in PROVIDER_INTEGRATIONS:
+        if provider.startswith(prefix):
+            return integration
+    return "dusupay"
+
+
 # Country to Currency mapping
 COUNTRY_CURRENCY = {
     "KE": Currency.KES,
@@ -149,6 +203,22 @@ class PayoutResponse(BaseModel):
     status: Optional[str] = None
     error_code: Optional[str] = None
     raw_response: Optional[Dict[str, Any]] = None
+    # One entry per POST /payouts attempt: attempt, outcome, latency_ms, started_at, status_check
+    attempts: List[Dict[str, Any]] = []
+    circuit: Optional[str] = None  # circuit breaker key of the payout route
+
+
+# Failures where the payout may or may not have reached Dusupay; worth another attempt
+RETRYABLE_ERRORS = {"TIMEOUT", "NETWORK_ERROR", "RATE_LIMITED", "GATEWAY_ERROR"}
+# Outcomes that mean the route itself is unhealthy (feed the circuit breaker)
+GATEWAY_FAILURES = {"TIMEOUT", "NETWORK_ERROR", "GATEWAY_ERROR"}
+# The route's circuit breaker is open; nothing was sent
+CIRCUIT_OPEN = "CIRCUIT_OPEN"
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before the `retry`-th retry (1-based)"""
+    return random.uniform(0, min(cap, base * 2 ** (retry - 1)))
 
 
 class WebhookPayload(BaseModel):
@@ -157,6 +227,135 @@ class WebhookPayload(BaseModel):
     payload: Dict[str, Any]
 
 
+# ======================== HTTP CLIENT ========================
+
+class ClientStats:
+    """Request / connection counters for the shared Dusupay client"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.http_versions: Counter = Counter()
+    
+    async def trace(self, event: str, info: Dict[str, Any]) -> None:
+        # httpcore reports a TCP connect only when the pool had no idle connection to reuse
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class StatsTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper that feeds ClientStats"""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: ClientStats):
+        self.transport = transport
+        self.stats = stats
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        request.extensions["trace"] = stats.trace
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+        stats.http_versions[response.extensions.get("http_version", b"HTTP/1.1").decode()] += 1
+        return response
+    
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+client_stats = ClientStats()
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_config: Dict[str, Any] = {}
+
+
+def http_client(config: DusupayConfig) -> httpx.AsyncClient:
+    """
+    The process-wide Dusupay client, created on first use
+    
+    Every DusupayService shares it, so payouts, status checks and bank lookups
+    reuse one keep-alive pool. Close it with close_http_client() on shutdown.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        http2 = config.http2
+        if http2 and not _http2_available():
+            logger.warning("DUSUPAY_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        )
+        _http_client = httpx.AsyncClient(
+            base_url=config.base_url,
+            headers={
+                "Content-Type": "application/json",
+                "secret-key": config.secret_key,
+            },
+            timeout=httpx.Timeout(
+                connect=config.connect_timeout,
+                read=config.read_timeout,
+                write=config.write_timeout,
+                pool=config.pool_timeout,
+            ),
+            transport=StatsTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2), client_stats),
+        )
+        _http_client_config.clear()
+        _http_client_config.update({
+            "max_connections": config.max_connections,
+            "max_keepalive_connections": config.max_keepalive_connections,
+            "keepalive_expiry": config.keepalive_expiry,
+            "http2": http2,
+            "timeouts": {"connect": config.connect_timeout, "read": config.read_timeout,
+                         "write": config.write_timeout, "pool": config.pool_timeout},
+        })
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def http_client_stats() -> Dict[str, Any]:
+    return {"open": _http_client is not None and not _http_client.is_closed,
+            "config": dict(_http_client_config), **client_stats.snapshot()}
+
+
 # ======================== DUSUPAY SERVICE ========================
 
 class DusupayService:
@@ -172,26 +371,14 @@ class DusupayService:
     
     def __init__(self, config: Optional[DusupayConfig] = None):
         self.config = config or DusupayConfig()
-        self._client: Optional[httpx.AsyncClient] = None
     
     @property
     def client(self) -> httpx.AsyncClient:
-        if self._client is None:
-            self._client = httpx.AsyncClient(
-                base_url=self.config.base_url,
-                headers={
-                    "Content-Type": "application/json",
-                    "secret-key": self.config.secret_key,
-                },
-                timeout=30.0
-            )
-        return self._client
+        return http_client(self.config)
     
     async def close(self):
-        """Close the HTTP client"""
-        if self._client:
-            await self._client.aclose()
-            self._client = None
+        """Close the HTTP client (shared by every service instance)"""
+        await close_http_client()
     
     def generate_reference(self, prefix: str = "EWA") -> str:
         """Generate a unique merchant reference"""
@@ -275,7 +462,7 @@ class DusupayService:
         if callback_url:
             payload["callback_url"] = callback_url
         
-        return await self._execute_payout(payload)
+        return await self._execute_payout(payload, circuit_key(country_code, provider_id))
     
     async def create_bank_payout(
         self,
@@ -337,13 +524,112 @@ class DusupayService:
         if branch_code:
             payload["branch_code"] = branch_code
         
-        return await self._execute_payout(payload)
+        return await self._execute_payout(payload, circuit_key(country_code))
+    
+    async def _execute_payout(self, payload: Dict[str, Any], circuit: Optional[str] = None) -> PayoutResponse:
+        """
+        Execute the payout request, retrying transient failures
+        
+        Every attempt posts the same merchant_reference. Before re-posting, the
+        status endpoint is asked whether the previous attempt reached Dusupay after
+        all (a timed-out request may still have been processed); if it did, that
+        payout is returned instead of creating a second one.
+        
+        Each POST goes through the route's circuit breaker: while it is open the
+        payout fails fast with CIRCUIT_OPEN instead of waiting out the timeout.
+        """
+        merchant_reference = payload["merchant_reference"]
+        breaker = payout_circuits.get(circuit) if circuit else None
+        attempts = []
+        response = None
+        for attempt in range(1, max(1, self.config.payout_max_attempts) + 1):
+            if attempt > 1:
+                await asyncio.sleep(backoff_delay(attempt - 1, self.config.retry_base_delay, self.config.retry_max_delay))
+            record = {"attempt": attempt, "started_at": datetime.now(timezone.utc).isoformat()}
+            if breaker and not breaker.allow():
+                record.update({"outcome": CIRCUIT_OPEN, "latency_ms": 0.0})
+                attempts.append(record)
+                response = PayoutResponse(
+                    success=False,
+                    message=f"Payouts via {circuit} are paused after repeated gateway failures; "
+                            f"next trial in {breaker.retry_after():.0f}s",
+                    merchant_reference=merchant_reference,
+                    error_code=CIRCUIT_OPEN
+                )
+                break
+            if attempt > 1:
+                existing = await self.check_payout_status(merchant_reference)
+                record["status_check"] = existing.status if existing.success else existing.error_code
+                if existing.success and existing.status:
+                    if breaker:
+                        breaker.record_success()
+                    record.update({"outcome": "found", "latency_ms": 0.0})
+                    attempts.append(record)
+                    response = self.from_existing(existing)
+                    break
+            
+            started = time.perf_counter()
+            response = await self._post_payout(payload)
+            record.update({
+                "outcome": "accepted" if response.success else response.error_code,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+            attempts.append(record)
+            failure = response.error_code if response.error_code in GATEWAY_FAILURES else None
+            self._record_health(circuit, breaker, failure, record["latency_ms"])
+            if response.success or response.error_code not in RETRYABLE_ERRORS:
+                break
+            logger.warning(f"Payout {merchant_reference} attempt {attempt} failed: {response.error_code}")
+        
+        response.attempts = attempts
+        response.circuit = circuit
+        return response
+    
+    @staticmethod
+    def _record_health(circuit: Optional[str], breaker, failure: Optional[str], latency_ms: float) -> None:
+        """Feed a gateway call to telemetry and the route's breaker (failure: GATEWAY_FAILURES code or None)"""
+        telemetry.record(integration_of(circuit), latency_ms, failure is None)
+        if not breaker:
+            return
+        if failure:
+            breaker.record_failure(failure, latency_ms)
+        else:
+            breaker.record_success(latency_ms)
+    
+    @staticmethod
+    def from_existing(existing: PayoutResponse) -> PayoutResponse:
+        """Turn a status lookup of an earlier attempt into that attempt's payout response"""
+        if existing.status in (PayoutStatus.FAILED.value, PayoutStatus.CANCELLED.value):
+            return PayoutResponse(
+                success=False,
+                message=f"Payout {existing.status.lower()} at Dusupay",
+                merchant_reference=existing.merchant_reference,
+                internal_reference=existing.internal_reference,
+                status=existing.status,
+                error_code="PAYOUT_" + existing.status,
+                raw_response=existing.raw_response
+            )
+        return PayoutResponse(
+            success=True,
+            message="Payout initiated",
+            internal_reference=existing.internal_reference,
+            merchant_reference=existing.merchant_reference,
+            status=existing.status,
+            raw_response=existing.raw_response
+        )
     
-    async def _execute_payout(self, payload: Dict[str, Any]) -> PayoutResponse:
-        """Execute the payout request"""
+    async def _post_payout(self, payload: Dict[str, Any]) -> PayoutResponse:
+        """One POST /payouts"""
         try:
             response = await self.client.post("/payouts", json=payload)
-            data = response.json()
+            retryable_status = response.status_code == 429 or response.status_code >= 500
+            try:
+                data = response.json()
+            except ValueError:
+                # Proxies in front of the gateway answer overload / outages with HTML
+                if not retryable_status:
+                    raise
+                data = {}
             
             if response.status_code in [200, 201, 202]:
                 return PayoutResponse(
@@ -354,6 +640,13 @@ class DusupayService:
                     status=data.get("data", {}).get("transaction_status", "PENDING"),
                     raw_response=data
                 )
+            elif retryable_status:
+                return PayoutResponse(
+                    success=False,
+                    message=data.get("message", "Payout failed"),
+                    error_code="RATE_LIMITED" if response.status_code == 429 else "GATEWAY_ERROR",
+                    raw_response=data
+                )
             else:
                 return PayoutResponse(
                     success=False,
@@ -383,12 +676,13 @@ class DusupayService:
     
     # ======================== STATUS & VERIFICATION ========================
     
-    async def check_payout_status(self, merchant_reference: str) -> PayoutResponse:
+    async def check_payout_status(self, merchant_reference: str, circuit: Optional[str] = None) -> PayoutResponse:
         """
         Check the status of a payout transaction
         
         Args:
             merchant_reference: The merchant reference of the transaction
+            circuit: Circuit breaker key of the payout's route, when known
         
         Returns:
             PayoutResponse with current status
@@ -400,11 +694,25 @@ class DusupayService:
                 error_code="NOT_CONFIGURED"
             )
         
+        breaker = payout_circuits.get(circuit) if circuit else None
+        if breaker and not breaker.allow():
+            return PayoutResponse(
+                success=False,
+                message=f"Status checks via {circuit} are paused after repeated gateway failures",
+                merchant_reference=merchant_reference,
+                error_code=CIRCUIT_OPEN
+            )
+        
+        started = time.perf_counter()
         try:
             response = await self.client.get(
                 "/payouts/status",
                 params={"merchant_reference": merchant_reference}
             )
+            self._record_health(
+                circuit, breaker, "GATEWAY_ERROR" if response.status_code >= 500 else None,
+                round((time.perf_counter() - started) * 1000, 1)
+            )
             data = response.json()
             
             if response.status_code == 200:
@@ -425,6 +733,11 @@ class DusupayService:
                 )
         
         except Exception as e:
+            if isinstance(e, httpx.RequestError):
+                self._record_health(
+                    circuit, breaker, "TIMEOUT" if isinstance(e, httpx.TimeoutException) else "NETWORK_ERROR",
+                    round((time.perf_counter() - started) * 1000, 1)
+                )
             return PayoutResponse(
                 success=False,
                 message=f"Error checking status: {str(e)}",
@@ -500,9 +813,11 @@ class MockDusupayService(DusupayService):
     Simulates successful payouts with realistic delays
     """
     
-    def __init__(self):
+    def __init__(self, latency_seconds: float = 0.0):
         super().__init__()
         self._transactions: Dict[str, Dict] = {}
+        # Simulated round trip to the gateway per payout
+        self.latency_seconds = latency_seconds
     
     async def create_mobile_money_payout(
         self,
@@ -516,6 +831,7 @@ class MockDusupayService(DusupayService):
         callback_url: Optional[str] = None,
     ) -> PayoutResponse:
         """Mock mobile money payout - always succeeds"""
+        await asyncio.sleep(self.latency_seconds)
         merchant_reference = reference or self.generate_reference()
         internal_reference = f"MOCK-{uuid.uuid4().hex[:12].upper()}"
         
@@ -562,6 +878,7 @@ class MockDusupayService(DusupayService):
         branch_code: Optional[str] = None,
     ) -> PayoutResponse:
         """Mock bank payout - always succeeds"""
+        await asyncio.sleep(self.latency_seconds)
         merchant_reference = reference or self.generate_reference()
         internal_reference = f"MOCK-{uuid.uuid4().hex[:12].upper()}"
         
@@ -584,7 +901,7 @@ class MockDusupayService(DusupayService):
             raw_response={"_mock": True}
         )
     
-    async def check_payout_status(self, merchant_reference: str) -> PayoutResponse:
+    async def check_payout_status(self, merchant_reference: str, circuit: Optional[str] = None) -> PayoutResponse:
         """Mock status check"""
         tx = self._transactions.get(merchant_reference)
         if tx:
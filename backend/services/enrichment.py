@@ -0,0 +1,100 @@
+"""
+Batch Enrichment
+Join related documents onto a page of results with a fixed number of queries.
+
+Instead of a find_one / count_documents per row, collect the foreign keys of
+the whole page, fetch each related collection once with $in (or a $group for
+counts) and join in memory:
+
+    users = await fetch_related(db.users, employers, "user_id", projection={"_id": 0, "password_hash": 0})
+    for employer in employers:
+        employer["user"] = users.get(employer.get("user_id"))
+"""
+
+from typing import Optional, Dict, Any, List, Iterable
+
+
+def collect_keys(docs: Iterable[Dict[str, Any]], field: str) -> List[Any]:
+    """Distinct, non-empty values of `field` across docs, in first-seen order"""
+    seen = {}
+    for doc in docs:
+        value = doc.get(field)
+        if value is not None and value != "":
+            seen.setdefault(value, None)
+    return list(seen)
+
+
+def _with_key(projection: Optional[Dict[str, Any]], key_field: str) -> Optional[Dict[str, Any]]:
+    """Make sure an inclusion projection still returns the field the map is keyed on"""
+    if not projection:
+        return projection
+    is_inclusion = any(value and name != "_id" for name, value in projection.items())
+    if is_inclusion and not projection.get(key_field):
+        return {**projection, key_field: 1}
+    return projection
+
+
+async def fetch_by_keys(
+    collection,
+    keys: Iterable[Any],
+    key_field: str = "id",
+    projection: Optional[Dict[str, Any]] = None,
+    query: Optional[Dict[str, Any]] = None
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    Fetch every document whose key_field is in keys with a single $in query
+
+    Args:
+        collection: Motor collection to read from
+        keys: Key values to look up (duplicates and empties are ignored)
+        key_field: Field the keys are matched against
+        projection: Optional projection; key_field is added to inclusion projections
+        query: Extra filter combined with the $in
+
+    Returns:
+        Dict of key -> document. When several documents share a key the first one wins,
+        matching what find_one would have returned.
+    """
+    keys = [k for k in dict.fromkeys(keys) if k is not None and k != ""]
+    if not keys:
+        return {}
+    docs = await collection.find(
+        {**(query or {}), key_field: {"$in": keys}},
+        _with_key(projection, key_field)
+    ).to_list(None)
+    result = {}
+    for doc in docs:
+        result.setdefault(doc.get(key_field), doc)
+    return result
+
+
+async def fetch_related(
+    collection,
+    docs: Iterable[Dict[str, Any]],
+    local_field: str,
+    key_field: str = "id",
+    projection: Optional[Dict[str, Any]] = None
+) -> Dict[Any, Dict[str, Any]]:
+    """fetch_by_keys over the values of local_field in docs"""
+    return await fetch_by_keys(collection, collect_keys(docs, local_field), key_field, projection)
+
+
+async def count_by(
+    collection,
+    field: str,
+    keys: Iterable[Any],
+    query: Optional[Dict[str, Any]] = None
+) -> Dict[Any, int]:
+    """
+    Count documents per value of `field` for the given keys with one $group
+
+    Keys with no documents are absent from the result; use .get(key, 0).
+    """
+    keys = [k for k in dict.fromkeys(keys) if k is not None and k != ""]
+    if not keys:
+        return {}
+    rows = await collection.aggregate([
+        {"$match": {**(query or {}), field: {"$in": keys}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
@@ -0,0 +1,118 @@
+"""
+Fraud Velocity Counters
+Per-employee sliding windows of recent advance requests.
+
+The frequency and velocity fraud rules ask "how many advances / how much was
+requested in the last N minutes". Instead of recounting the advances
+collection, each employee has one compact document in `fraud_counters`
+holding the (timestamp, amount) of their advances inside RETENTION:
+
+    {"employee_id": "...", "events": [{"at": "<ISO>", "amount": 5000}, ...]}
+
+Creating an advance appends its event and drops expired ones in a single
+pipeline update. Checking a request is one keyed read; counts and sums for
+any window up to RETENTION come from a bisect over the sorted timestamps and
+a prefix sum. Timestamps are compared as ISO strings, exactly as the
+advances queries did, so rule results do not change.
+
+Windows are only ever created by seeding from the advances collection on
+the first check for an employee; record_event just appends to an existing
+window. That way an employee whose advances predate this collection (or were
+made while no velocity rule was enabled) never gets a window missing history.
+"""
+
+import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+COUNTER_COLLECTION = "fraud_counters"
+# Longest window any rule may ask about (the frequency rule looks back 24h)
+RETENTION = timedelta(days=1)
+# Hard cap per employee so a runaway client cannot grow a document without bound
+MAX_EVENTS = 1000
+
+
+class SlidingWindow:
+    """Sorted (timestamp, amount) events answering count / sum since a cutoff"""
+
+    def __init__(self, events: List[Tuple[str, float]]):
+        ordered = sorted(events, key=lambda e: e[0])
+        self._times = [t for t, _ in ordered]
+        self._prefix = list(accumulate((a or 0 for _, a in ordered), initial=0))
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def _index(self, cutoff: str) -> int:
+        return bisect.bisect_left(self._times, cutoff)
+
+    def count_since(self, cutoff: str) -> int:
+        return len(self._times) - self._index(cutoff)
+
+    def sum_since(self, cutoff: str) -> float:
+        return self._prefix[-1] - self._prefix[self._index(cutoff)]
+
+    def events(self) -> List[Tuple[str, float]]:
+        return [(t, self._prefix[i + 1] - self._prefix[i]) for i, t in enumerate(self._times)]
+
+
+async def record_event(db, employee_id: str, created_at: str, amount: float) -> None:
+    """
+    Append an advance request to the employee's window and drop events older than RETENTION
+
+    No-op if the employee has no window yet; the next check seeds it from advances, which
+    already include this one.
+
+    Args:
+        db: Motor database handle
+        employee_id: Employee the advance belongs to
+        created_at: ISO timestamp of the advance
+        amount: Requested amount
+    """
+    cutoff = (datetime.fromisoformat(created_at) - RETENTION).isoformat()
+    await db[COUNTER_COLLECTION].update_one(
+        {"employee_id": employee_id},
+        [{"$set": {
+            "employee_id": employee_id,
+            "events": {"$slice": [
+                {"$concatArrays": [
+                    {"$filter": {"input": {"$ifNull": ["$events", []]}, "cond": {"$gte": ["$$this.at", cutoff]}}},
+                    [{"at": created_at, "amount": amount}],
+                ]},
+                -MAX_EVENTS,
+            ]},
+            "updated_at": created_at,
+        }}]
+    )
+
+
+async def _seed_from_advances(db, employee_id: str, now: datetime) -> List[Tuple[str, float]]:
+    """Build (and store) the window for an employee that has no counter document yet"""
+    advances = await db.advances.find(
+        {"employee_id": employee_id, "created_at": {"$gte": (now - RETENTION).isoformat()}},
+        {"_id": 0, "created_at": 1, "amount": 1}
+    ).sort("created_at", -1).to_list(MAX_EVENTS)
+    # Newest MAX_EVENTS fetched, stored oldest first so record_event's $slice trims the oldest
+    events = [(a.get("created_at") or "", a.get("amount", 0)) for a in reversed(advances)]
+    await db[COUNTER_COLLECTION].update_one(
+        {"employee_id": employee_id},
+        {"$setOnInsert": {
+            "employee_id": employee_id,
+            "events": [{"at": t, "amount": a} for t, a in events],
+            "updated_at": now.isoformat(),
+        }},
+        upsert=True
+    )
+    return events
+
+
+async def load_window(db, employee_id: Optional[str], now: datetime) -> SlidingWindow:
+    """The employee's events inside RETENTION of `now` (one keyed read once seeded)"""
+    if not employee_id:
+        return SlidingWindow([])
+    doc = await db[COUNTER_COLLECTION].find_one({"employee_id": employee_id}, {"_id": 0, "events": 1})
+    if doc is None:
+        return SlidingWindow(await _seed_from_advances(db, employee_id, now))
+    cutoff = (now - RETENTION).isoformat()
+    return SlidingWindow([(e["at"], e.get("amount", 0)) for e in doc.get("events", []) if e.get("at", "") >= cutoff])
@@ -0,0 +1,200 @@
+"""
+Fraud Rule Engine
+Evaluates advance requests against the enabled fraud rules.
+
+Enabled rules are loaded once and compiled into plain evaluator functions.
+The compiled set is rebuilt after any rule create / update / delete / toggle
+(invalidate()) and at most every RULE_CACHE_TTL_SECONDS so changes made
+through another worker are picked up too.
+
+Checking an advance costs at most one query: the employee's sliding window
+from services.fraud_counters (or, for windows longer than its retention, the
+employee's recent advances). Rule evaluation is then pure in-memory work. Trigger counts are accumulated and written in a single
+bulk_write shortly afterwards instead of one $inc per triggered rule.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Callable
+
+from pymongo import UpdateOne
+
+from services.fraud_counters import SlidingWindow, RETENTION, load_window
+
+logger = logging.getLogger(__name__)
+
+RULE_CACHE_TTL_SECONDS = 60
+TRIGGER_FLUSH_DELAY_SECONDS = 1.0
+
+
+@dataclass
+class FraudContext:
+    """Everything a rule may look at for one advance request"""
+    amount: float
+    employee: Dict[str, Any]
+    # The employee's advances inside the widest rule window
+    history: SlidingWindow
+    now: datetime
+
+    def count_since(self, window: timedelta) -> int:
+        return self.history.count_since((self.now - window).isoformat())
+
+    def sum_since(self, window: timedelta) -> float:
+        return self.history.sum_since((self.now - window).isoformat())
+
+
+@dataclass
+class CompiledRule:
+    rule: Dict[str, Any]
+    evaluate: Callable[[FraudContext], bool]
+    # How far back this rule looks at advance history (None if it does not need history)
+    window: Optional[timedelta] = None
+
+
+# ======================== RULE COMPILERS ========================
+
+def _amount_threshold(rule: Dict[str, Any]) -> CompiledRule:
+    threshold = rule["threshold"]
+    return CompiledRule(rule, lambda ctx: ctx.amount > threshold)
+
+
+def _frequency(rule: Dict[str, Any]) -> CompiledRule:
+    # Advances in the last 24 hours at or above the threshold
+    threshold = rule["threshold"]
+    window = timedelta(days=1)
+    return CompiledRule(rule, lambda ctx: ctx.count_since(window) >= threshold, window)
+
+
+def _velocity(rule: Dict[str, Any]) -> CompiledRule:
+    # New employees (< 1 month tenure): amount requested in the last hour, including this one
+    threshold = rule["threshold"]
+    window = timedelta(hours=1)
+
+    def evaluate(ctx: FraudContext) -> bool:
+        if ctx.employee.get("tenure_months", 0) >= 1:
+            return False
+        return ctx.sum_since(window) + ctx.amount > threshold
+
+    return CompiledRule(rule, evaluate, window)
+
+
+RULE_COMPILERS: Dict[str, Callable[[Dict[str, Any]], CompiledRule]] = {
+    "amount_threshold": _amount_threshold,
+    "frequency": _frequency,
+    "velocity": _velocity,
+}
+
+
+def compile_rules(rules: List[Dict[str, Any]]) -> List[CompiledRule]:
+    """Compile the rules that apply to advance requests; employer_* rules are checked elsewhere"""
+    compiled = []
+    for rule in rules:
+        compiler = RULE_COMPILERS.get(rule.get("type"))
+        if compiler:
+            compiled.append(compiler(rule))
+    return compiled
+
+
+# ======================== ENGINE ========================
+
+class FraudEngine:
+    """Cached, compiled fraud rules for one database"""
+
+    def __init__(self, db, ttl_seconds: float = RULE_CACHE_TTL_SECONDS, flush_delay: float = TRIGGER_FLUSH_DELAY_SECONDS):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.flush_delay = flush_delay
+        self._compiled: Optional[List[CompiledRule]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._pending_triggers: Counter = Counter()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def invalidate(self) -> None:
+        """Drop the compiled rule set; call after any change to fraud_rules"""
+        self._compiled = None
+        self._version += 1
+
+    async def rules(self) -> List[CompiledRule]:
+        if self._compiled is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return self._compiled
+        version = self._version
+        rules = await self.db.fraud_rules.find({"enabled": True}, {"_id": 0}).to_list(100)
+        compiled = compile_rules(rules)
+        # Only cache if no rule changed while we were loading
+        if version == self._version:
+            self._compiled = compiled
+            self._loaded_at = time.monotonic()
+        return compiled
+
+    async def _history(self, employee_id: str, window: timedelta, now: datetime) -> SlidingWindow:
+        if window <= RETENTION:
+            return await load_window(self.db, employee_id, now)
+        advances = await self.db.advances.find(
+            {"employee_id": employee_id, "created_at": {"$gte": (now - window).isoformat()}},
+            {"_id": 0, "created_at": 1, "amount": 1}
+        ).to_list(None)
+        return SlidingWindow([(a.get("created_at") or "", a.get("amount", 0)) for a in advances])
+
+    async def check(self, advance_request: dict, employee: dict) -> dict:
+        """Check an advance request against all enabled fraud rules"""
+        compiled = await self.rules()
+        now = datetime.now(timezone.utc)
+        windows = [c.window for c in compiled if c.window]
+        history = await self._history(employee.get("id"), max(windows), now) if windows else SlidingWindow([])
+        ctx = FraudContext(amount=advance_request.get("amount", 0), employee=employee, history=history, now=now)
+
+        violations = []
+        for c in compiled:
+            if c.evaluate(ctx):
+                violations.append({
+                    "rule_id": c.rule["id"],
+                    "rule_name": c.rule["name"],
+                    "severity": c.rule["severity"],
+                    "action": c.rule["action"]
+                })
+        self._record_triggers(v["rule_id"] for v in violations)
+
+        return {
+            "passed": len(violations) == 0,
+            "violations": violations,
+            "should_block": any(v["action"] == "block" for v in violations),
+            "should_flag": any(v["action"] in ["flag", "block"] for v in violations)
+        }
+
+    # ======================== TRIGGER COUNTS ========================
+
+    def _record_triggers(self, rule_ids) -> None:
+        self._pending_triggers.update(rule_ids)
+        if self._pending_triggers and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        # Shielded so close() cancelling the timer cannot drop counts already taken off the queue
+        await asyncio.shield(self.flush())
+
+    async def flush(self) -> None:
+        """Write accumulated trigger counts with one bulk_write"""
+        pending, self._pending_triggers = self._pending_triggers, Counter()
+        if not pending:
+            return
+        try:
+            await self.db.fraud_rules.bulk_write(
+                [UpdateOne({"id": rule_id}, {"$inc": {"trigger_count": n}}) for rule_id, n in pending.items()],
+                ordered=False
+            )
+        except Exception as e:
+            # Counts are informational; put them back and let the next flush retry
+            logger.warning(f"Failed to flush fraud rule trigger counts: {e}")
+            self._pending_triggers.update(pending)
+
+    async def close(self) -> None:
+        """Flush outstanding trigger counts (call on shutdown)"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
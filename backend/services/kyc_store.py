@@ -0,0 +1,200 @@
+"""
+KYC Document Store
+Content-addressed, deduplicated storage for uploaded KYC documents.
+
+Each distinct file is stored once, keyed by the SHA-256 of its bytes and
+fanned out two directory levels deep (kyc/sha256/ab/cd/abcd...), so even
+millions of blobs leave a few hundred files per directory. The hash is
+computed while the upload is spooled (Storage.spool), so deduplication costs
+no second read; the spooled file is then handed to the storage backend.
+
+`kyc_blobs` holds one document per stored file - sha256, storage key, size,
+content_type and refcount - and every kyc_documents record pointing at a
+blob holds one reference. A user re-uploading the same scan during onboarding
+adds a reference, not a file. release() drops a reference and removes the
+file with the last one; supersede() releases the blobs of the earlier pending
+or rejected documents a new upload of the same type replaces and moves them to
+the terminal "superseded" status. Listings go through current(), which leaves
+superseded documents (whose files may be gone) out.
+
+Removing a blob tombstones its record (`deleting_at`) before the file is
+deleted, and the record goes only once the file is gone. store_blob never
+takes a reference on a tombstoned record: its upsert collides with it on the
+unique sha256 index (services.db_indexes) and retries until the deletion has
+finished, so a new upload of the same content always writes its file after
+the old one was removed, never before.
+
+kyc_documents keep their per-upload name ({user_id}_{type}_{random}{ext}) in
+stored_name, so document URLs are unchanged; the file endpoint resolves the
+name through kyc_documents -> sha256 -> blob key. Because a blob's name is
+its checksum, verify() detects corruption by re-hashing the file.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# A tombstone older than this belongs to a release that died before removing the record
+KYC_BLOB_DELETE_TIMEOUT_SECONDS = int(os.environ.get("KYC_BLOB_DELETE_TIMEOUT_SECONDS", "60"))
+TOMBSTONE_RETRY_SECONDS = 0.05
+# Status of a document a later upload of the same type replaced; it can no longer be reviewed
+SUPERSEDED = "superseded"
+
+
+def blob_key(sha256: str) -> str:
+    return f"kyc/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+async def store_blob(
+    db,
+    storage: Storage,
+    file,
+    max_bytes: Optional[int] = None,
+    content_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Store an upload under its content hash and take a reference to it
+
+    Args:
+        db: Motor database handle
+        storage: Upload storage backend
+        file: starlette UploadFile
+        max_bytes: Largest accepted upload; None for no limit
+        content_type: MIME type recorded for a new blob
+
+    Returns:
+        The kyc_blobs document, refcount included
+
+    Raises:
+        UploadTooLarge: the upload is bigger than max_bytes; nothing is stored
+    """
+    digest = hashlib.sha256()
+    part, size = await storage.spool(file, max_bytes, digest)
+    sha256 = digest.hexdigest()
+
+    try:
+        blob = await _take_reference(db, sha256, size, content_type)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    try:
+        # Identical content either way; no release can be deleting it now
+        await storage.put_file(part, blob_key(sha256), content_type)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        await release(db, storage, sha256)
+        raise
+    if blob["refcount"] > 1:
+        logger.debug(f"KYC upload deduplicated onto blob {sha256} ({blob['refcount']} references)")
+    return blob
+
+
+async def _take_reference(db, sha256: str, size: int, content_type: Optional[str]) -> Dict[str, Any]:
+    """Add a reference to the blob record, creating it; waits out a blob being removed"""
+    while True:
+        try:
+            return await db.kyc_blobs.find_one_and_update(
+                {"sha256": sha256, "deleting_at": None},
+                {"$inc": {"refcount": 1}, "$setOnInsert": {
+                    "sha256": sha256,
+                    "key": blob_key(sha256),
+                    "size": size,
+                    "content_type": content_type,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent first upload inserted it (the retry adds to it), or the
+            # record is a tombstone whose file is being deleted
+            stale = (datetime.now(timezone.utc) - timedelta(seconds=KYC_BLOB_DELETE_TIMEOUT_SECONDS)).isoformat()
+            result = await db.kyc_blobs.delete_one({"sha256": sha256, "deleting_at": {"$lt": stale}})
+            if result.deleted_count:
+                logger.warning(f"Removed stale KYC blob tombstone {sha256}")
+            else:
+                await asyncio.sleep(TOMBSTONE_RETRY_SECONDS)
+
+
+async def release(db, storage: Storage, sha256: str) -> int:
+    """
+    Drop one reference to a blob, removing the file with the last one
+
+    Returns:
+        References left (0 when the blob was removed)
+    """
+    blob = await db.kyc_blobs.find_one_and_update(
+        {"sha256": sha256, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": -1}},
+        projection={"_id": 0, "refcount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob:
+        return 0
+    if blob["refcount"] > 0:
+        return blob["refcount"]
+    # Tombstone first: from here on no upload can take a reference, so the file
+    # can go. A store that got in before the tombstone keeps the blob alive.
+    deleting_at = datetime.now(timezone.utc).isoformat()
+    tombstone = await db.kyc_blobs.update_one(
+        {"sha256": sha256, "refcount": 0, "deleting_at": None},
+        {"$set": {"deleting_at": deleting_at}}
+    )
+    if not tombstone.modified_count:
+        current = await db.kyc_blobs.find_one({"sha256": sha256}, {"_id": 0, "refcount": 1})
+        return current["refcount"] if current else 0
+    await storage.delete(blob_key(sha256))
+    await db.kyc_blobs.delete_one({"sha256": sha256, "deleting_at": deleting_at})
+    return 0
+
+
+async def supersede(db, storage: Storage, document: Dict[str, Any]) -> int:
+    """
+    Release the blobs of the user's earlier pending or rejected documents of the same type
+
+    Approved documents keep their files. Each replaced document is stamped with
+    superseded_by and the "superseded" status in the same update that selects
+    it, so its reference is dropped exactly once even if two uploads race.
+
+    Returns:
+        Number of documents superseded
+    """
+    query = {
+        "user_id": document["user_id"],
+        "document_type": document["document_type"],
+        "status": {"$in": ["pending", "rejected"]},
+        "created_at": {"$lt": document["created_at"]},
+        "sha256": {"$ne": None},
+        "superseded_by": None,
+    }
+    superseded = 0
+    while old := await db.kyc_documents.find_one_and_update(
+        query,
+        {"$set": {"status": SUPERSEDED, "superseded_by": document["id"],
+                  "superseded_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "sha256": 1}
+    ):
+        await release(db, storage, old["sha256"])
+        superseded += 1
+    return superseded
+
+
+def current(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrow a kyc_documents query to the documents no later upload has superseded"""
+    return {**query, "superseded_by": None}
+
+
+async def verify(storage: Storage, blob: Dict[str, Any]) -> bool:
+    """Whether the stored file still hashes to its name"""
+    return await storage.sha256(blob["key"]) == blob["sha256"]
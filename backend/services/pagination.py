@@ -0,0 +1,103 @@
+"""
+Keyset Pagination
+Cursor-based paging over (created_at, id) for list endpoints.
+
+Pages are returned newest first. The opaque cursor encodes the (created_at, id)
+of the last row on the page; the next page continues strictly after it, so
+response time stays flat however deep the client pages.
+
+Rows without created_at sort after every dated row (null is lowest in MongoDB's
+order), so they form the tail of the listing and are paged by id alone.
+"""
+
+import base64
+import json
+from typing import Optional, Dict, Any, List, Tuple
+
+from fastapi import HTTPException, Response
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+# The admin employees and advances pages load their list in one request and do
+# not follow X-Next-Cursor yet; those routes keep their old 10000-row cap
+ADMIN_LIST_PAGE_SIZE = 10000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SORT = [("created_at", -1), ("id", -1)]
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Build an opaque cursor from the last document on a page"""
+    raw = json.dumps([doc.get("created_at") or None, doc.get("id") or ""], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], str]:
+    """Decode a cursor back into (created_at, id); created_at is None for an undated row"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(created_at, (str, type(None))) or not isinstance(doc_id, str):
+            raise ValueError("cursor fields must be strings")
+        return created_at, doc_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict a query to rows strictly after the cursor position"""
+    if not cursor:
+        return query
+    created_at, doc_id = decode_cursor(cursor)
+    if created_at is None:
+        # Already in the undated tail
+        after = {"created_at": None, "id": {"$lt": doc_id}}
+    else:
+        after = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}},
+            # $lt only compares strings; the undated rows still follow
+            {"created_at": None},
+        ]}
+    return {"$and": [query, after]} if query else after
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, Any]] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    max_limit: int = MAX_PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of documents
+
+    Args:
+        collection: Motor collection
+        query: Filter for the listing
+        projection: Optional projection (must keep created_at and id)
+        cursor: Cursor returned with the previous page
+        limit: Page size
+        max_limit: Largest page size the route allows
+
+    Returns:
+        (documents, next_cursor) - next_cursor is None on the last page
+    """
+    limit = max(1, min(limit, max_limit))
+    docs = await collection.find(
+        keyset_query(query, cursor),
+        projection if projection is not None else {"_id": 0}
+    ).sort(SORT).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    return docs, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Expose the next page cursor on the response (list bodies stay plain arrays)"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,62 @@
+"""
+Password Hashing
+bcrypt hashing and verification off the event loop.
+
+bcrypt is deliberately slow (~250 ms at cost 12) and releases the GIL while it
+works, so calls run in a small dedicated thread pool instead of blocking every
+other request on the uvicorn loop. The pool is bounded so a burst of logins
+queues up rather than starving the default executor.
+
+Configuration (environment):
+    BCRYPT_ROUNDS        cost factor for new hashes (default 12)
+    BCRYPT_MAX_WORKERS   threads in the hashing pool (default: CPU count, max 4)
+
+When BCRYPT_ROUNDS changes, existing hashes are upgraded transparently on the
+next successful login (see needs_rehash).
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+BCRYPT_MAX_WORKERS = int(os.environ.get("BCRYPT_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+
+
+def hash_password_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed: str) -> int:
+    """Cost factor encoded in a bcrypt hash ($2b$<cost>$...), 0 if unparseable"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    """True when a stored hash was made with a different cost factor than the configured one"""
+    return hash_cost(hashed) != rounds
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the bcrypt pool"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password_sync, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Check a password against a stored hash in the bcrypt pool"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password_sync, password, hashed)
+
+
+def shutdown_executor() -> None:
+    _executor.shutdown(wait=False)
@@ -0,0 +1,186 @@
+"""
+Payout Status Reconciler
+Settles disbursements whose Dusupay callback never arrived.
+
+Every RECONCILE_INTERVAL_SECONDS a sweep picks the disbursements still PENDING
+or PROCESSING RECONCILE_MIN_AGE_MINUTES after they were created (index
+status_created_at), oldest first, and asks Dusupay for their status:
+RECONCILE_CONCURRENCY checks in flight, at most RECONCILE_RATE per second in
+total. Answers go through disbursements.apply_status - the same forward-only
+transitions the webhooks use - so a sweep racing a late callback is harmless.
+
+Every checked disbursement is stamped with reconciled_at and left alone for
+one interval, so the oldest stuck payouts do not take up every sweep. That
+includes failed checks (not found, refused, timed out or raising), which also
+count up reconcile_failures on the disbursement. Only checks on a route whose
+circuit breaker is open are left unstamped and picked up by the next sweep.
+
+Each sweep's duration is recorded in telemetry as "payout_reconcile"; the last
+sweep's counts and the remaining backlog are kept for the API Health page.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any
+
+from services.disbursements import ProviderRateLimiter, apply_status
+from services.dusupay import CIRCUIT_OPEN, PayoutStatus
+from services.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get("RECONCILE_INTERVAL_SECONDS", "300"))
+RECONCILE_MIN_AGE_MINUTES = float(os.environ.get("RECONCILE_MIN_AGE_MINUTES", "15"))
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", "500"))
+RECONCILE_CONCURRENCY = int(os.environ.get("RECONCILE_CONCURRENCY", "8"))
+# Status checks per second across all routes
+RECONCILE_RATE = float(os.environ.get("RECONCILE_RATE", "5"))
+
+# Telemetry integration the sweep durations are recorded under
+PAYOUT_RECONCILE = "payout_reconcile"
+
+UNSETTLED_STATUSES = [PayoutStatus.PENDING.value, PayoutStatus.PROCESSING.value]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def backlog_filter(now: datetime, min_age_minutes: float) -> Dict[str, Any]:
+    """Disbursements that should have settled by now"""
+    return {
+        "status": {"$in": UNSETTLED_STATUSES},
+        "created_at": {"$lte": (now - timedelta(minutes=min_age_minutes)).isoformat()},
+    }
+
+
+class PayoutReconciler:
+    """Background loop checking unsettled disbursements with Dusupay"""
+
+    def __init__(
+        self,
+        db,
+        dusupay_factory,
+        interval: float = RECONCILE_INTERVAL_SECONDS,
+        min_age_minutes: float = RECONCILE_MIN_AGE_MINUTES,
+        batch_size: int = RECONCILE_BATCH_SIZE,
+        concurrency: int = RECONCILE_CONCURRENCY,
+        rate_per_second: float = RECONCILE_RATE,
+        metrics=None
+    ):
+        self.db = db
+        self.dusupay_factory = dusupay_factory
+        self.interval = interval
+        self.min_age_minutes = min_age_minutes
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.metrics = metrics or telemetry
+        self.sweeps = 0
+        self.last_sweep: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def backlog(self) -> int:
+        """Disbursements older than min_age_minutes still waiting to settle"""
+        return await self.db.disbursements.count_documents(backlog_filter(_now(), self.min_age_minutes))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "min_age_minutes": self.min_age_minutes,
+            "rate_per_second": self.rate_per_second,
+            "sweeps": self.sweeps,
+            "last_sweep": self.last_sweep,
+        }
+
+    async def sweep(self) -> Dict[str, Any]:
+        """Check one batch of unsettled disbursements and apply what Dusupay reports"""
+        started = time.perf_counter()
+        now = _now()
+        query = backlog_filter(now, self.min_age_minutes)
+        query["$or"] = [
+            {"reconciled_at": None},
+            {"reconciled_at": {"$lte": (now - timedelta(seconds=self.interval)).isoformat()}},
+        ]
+        disbursements = await self.db.disbursements.find(
+            query, {"_id": 0, "merchant_reference": 1, "circuit": 1}
+        ).sort("created_at", 1).to_list(self.batch_size)
+
+        dusupay = self.dusupay_factory()
+        limiter = ProviderRateLimiter(self.rate_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = {"checked": 0, "applied": 0, "unchanged": 0, "skipped": 0, "errors": 0}
+
+        async def reconcile(disbursement: Dict[str, Any]) -> None:
+            reference = disbursement["merchant_reference"]
+            try:
+                async with semaphore:
+                    await limiter.acquire("dusupay")
+                    response = await dusupay.check_payout_status(reference, disbursement.get("circuit"))
+                if response.error_code == CIRCUIT_OPEN:
+                    counts["skipped"] += 1
+                    return
+                if not (response.success and response.status):
+                    counts["errors"] += 1
+                    await self._stamp(reference, failure=response.error_code or response.message)
+                    return
+                counts["checked"] += 1
+                moved = await apply_status(
+                    self.db, reference, response.status.upper(),
+                    (response.raw_response or {}).get("data"), source="status_check"
+                )
+                counts["applied" if moved else "unchanged"] += 1
+                await self._stamp(reference)
+            except Exception as e:
+                counts["errors"] += 1
+                logger.exception(f"Reconciling disbursement {reference} failed")
+                try:
+                    await self._stamp(reference, failure=str(e))
+                except Exception:
+                    logger.exception(f"Stamping disbursement {reference} as reconciled failed")
+
+        await asyncio.gather(*[reconcile(d) for d in disbursements])
+
+        duration = time.perf_counter() - started
+        self.metrics.record(PAYOUT_RECONCILE, duration * 1000, ok=not counts["errors"])
+        self.sweeps += 1
+        self.last_sweep = {
+            "started_at": now.isoformat(),
+            "completed_at": _now().isoformat(),
+            "duration_seconds": round(duration, 3),
+            "candidates": len(disbursements),
+            **counts,
+            "backlog": await self.backlog(),
+        }
+        return self.last_sweep
+
+    async def _stamp(self, reference: str, failure: Optional[str] = None) -> None:
+        """Leave a checked disbursement alone for one interval, counting the check (and failure)"""
+        update = {"$set": {"reconciled_at": _now().isoformat()}, "$inc": {"reconcile_checks": 1}}
+        if failure:
+            update["$set"]["reconcile_error"] = failure
+            update["$inc"]["reconcile_failures"] = 1
+        await self.db.disbursements.update_one({"merchant_reference": reference}, update)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                sweep = await self.sweep()
+                if sweep["candidates"]:
+                    logger.info(f"Payout reconcile: {sweep['applied']} of {sweep['candidates']} settled, "
+                                f"{sweep['backlog']} still unsettled ({sweep['duration_seconds']} s)")
+            except Exception:
+                logger.exception("Payout reconcile sweep failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,150 @@
+"""
+Payroll Processing
+Applies an uploaded payroll to the employer's employees in bulk.
+
+The rows of an upload are resolved against the employees collection with one
+$in query on employee_code, earned wages and advance limits are computed
+column-wise with NumPy, and every changed employee is written in a single
+unordered bulk_write. The caller gets a per-row summary back:
+
+    updated    - earned_wages / advance_limit changed and were written
+    unchanged  - the computed figures equal what is already stored
+    unknown    - no employee of this employer has that employee_code
+    invalid    - days_worked / gross_salary are missing or not numbers
+    duplicate  - a later row in the same upload has the same employee_code
+
+Background payroll jobs pass a run id. Every write then stamps the employee
+with `payroll_run: {id, line}` and only matches if this run has not already
+applied that line (or a later one) to the employee, so a batch replayed
+after a crash never applies a row twice and is reported as it was the
+first time.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+# Earned wages accrue per calendar day over a 30 day month
+DAYS_PER_MONTH = 30
+# Employees may advance up to half of what they have earned
+ADVANCE_LIMIT_RATIO = 0.5
+
+
+def compute_earned_wages(gross_salary: np.ndarray, days_worked: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pro-rata earned wages and advance limits for whole columns at once"""
+    earned_wages = gross_salary / DAYS_PER_MONTH * days_worked
+    return earned_wages, earned_wages * ADVANCE_LIMIT_RATIO
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if np.isfinite(number) else None
+
+
+def _already_applied(employee: Dict[str, Any], run_id: Optional[str], row_number: int) -> bool:
+    run = employee.get("payroll_run") or {}
+    return run_id is not None and run.get("id") == run_id and run.get("line", -1) >= row_number
+
+
+async def apply_payroll(
+    db,
+    employer_id: str,
+    rows: List[Dict[str, Any]],
+    start_row: int = 0,
+    run_id: Optional[str] = None,
+    row_numbers: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Update earned wages / advance limits for one batch of payroll rows
+
+    Args:
+        db: Motor database handle
+        employer_id: Employer the payroll belongs to
+        rows: Payroll rows ({employee_code, days_worked, gross_salary, ...})
+        start_row: Index of rows[0] within the whole upload (for chunked callers)
+        run_id: Payroll run the rows belong to; makes replaying them idempotent
+        row_numbers: Position of each row within the whole upload, instead of start_row + i
+
+    Returns:
+        Counts per outcome plus a per-row result list
+    """
+    if row_numbers is None:
+        row_numbers = [start_row + i for i in range(len(rows))]
+    results = [{"row": row_numbers[i], "employee_code": row.get("employee_code"), "status": None}
+               for i, row in enumerate(rows)]
+
+    # Last row wins for a repeated code, as when rows were applied one by one
+    last_index = {}
+    for i, row in enumerate(rows):
+        if row.get("employee_code") is not None:
+            last_index[row["employee_code"]] = i
+    for i, row in enumerate(rows):
+        code = row.get("employee_code")
+        if code is None:
+            results[i]["status"] = "unknown"
+        elif last_index[code] != i:
+            results[i]["status"] = "duplicate"
+
+    employees = {}
+    if last_index:
+        found = await db.employees.find(
+            {"employer_id": employer_id, "employee_code": {"$in": list(last_index)}},
+            {"_id": 0, "id": 1, "employee_code": 1, "monthly_salary": 1, "earned_wages": 1, "advance_limit": 1,
+             "payroll_run": 1}
+        ).to_list(None)
+        for employee in found:
+            employees.setdefault(employee["employee_code"], employee)
+
+    # Gather the columns for rows that can be computed
+    indices, gross, days = [], [], []
+    for code, i in last_index.items():
+        employee = employees.get(code)
+        if employee is None:
+            results[i]["status"] = "unknown"
+            continue
+        row = rows[i]
+        gross_salary = _number(row.get("gross_salary", employee.get("monthly_salary", 0)))
+        days_worked = _number(row.get("days_worked", 0))
+        if gross_salary is None or days_worked is None:
+            results[i]["status"] = "invalid"
+            continue
+        indices.append(i)
+        gross.append(gross_salary)
+        days.append(days_worked)
+
+    operations = []
+    if indices:
+        earned_wages, advance_limits = compute_earned_wages(np.array(gross, dtype=float), np.array(days, dtype=float))
+        now = datetime.now(timezone.utc).isoformat()
+        for i, earned, limit in zip(indices, earned_wages.tolist(), advance_limits.tolist()):
+            employee = employees[rows[i]["employee_code"]]
+            results[i].update({"employee_id": employee["id"], "earned_wages": earned, "advance_limit": limit})
+            if _already_applied(employee, run_id, row_numbers[i]):
+                # Written by this run before a restart
+                results[i]["status"] = "updated"
+                continue
+            if employee.get("earned_wages") == earned and employee.get("advance_limit") == limit:
+                results[i]["status"] = "unchanged"
+                continue
+            results[i]["status"] = "updated"
+            update = {"earned_wages": earned, "advance_limit": limit, "last_payroll_update": now}
+            query = {"id": employee["id"]}
+            if run_id is not None:
+                update["payroll_run"] = {"id": run_id, "line": row_numbers[i]}
+                query["$or"] = [{"payroll_run.id": {"$ne": run_id}}, {"payroll_run.line": {"$lt": row_numbers[i]}}]
+            operations.append(UpdateOne(query, {"$set": update}))
+
+    if operations:
+        await db.employees.bulk_write(operations, ordered=False)
+
+    summary = {status: 0 for status in ["updated", "unchanged", "unknown", "invalid", "duplicate"]}
+    for result in results:
+        summary[result["status"]] += 1
+    return {"total": len(rows), **summary, "rows": results}
@@ -0,0 +1,158 @@
+"""
+Payroll File Import
+Streaming CSV / XLSX payroll ingestion with progress tracking.
+
+An uploaded file is copied to disk in chunks, then read back row by row
+(csv reader, or openpyxl in read-only mode for XLSX) and applied in batches
+of PAYROLL_BATCH_SIZE with services.payroll.apply_payroll. Only one batch of
+rows is in memory at a time, so a 100k-row file costs the same memory as a
+1k-row one. Running the batches is the job of services.payroll_jobs.
+
+Expected columns (header names are case-insensitive, spaces become underscores):
+employee_code, days_worked, gross_salary (optional), deductions (optional).
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+from services.payroll import apply_payroll
+
+PAYROLL_BATCH_SIZE = int(os.environ.get("PAYROLL_BATCH_SIZE", "1000"))
+SUPPORTED_EXTENSIONS = {".csv", ".xlsx"}
+# Spreadsheet line of the first data row (line 1 is the header)
+FIRST_DATA_LINE = 2
+MAX_DAYS_WORKED = 31
+
+OUTCOMES = ["updated", "unchanged", "unknown", "invalid", "duplicate"]
+
+
+# ======================== PARSING ========================
+
+def _normalise_header(name: Any) -> str:
+    return str(name or "").strip().lower().replace(" ", "_")
+
+
+def iter_csv_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [_normalise_header(h) for h in next(reader, [])]
+        for values in reader:
+            yield dict(zip(header, values))
+
+
+def iter_xlsx_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX uploads require the openpyxl package")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalise_header(h) for h in next(rows, ())]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_jsonl_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def write_jsonl_rows(path: Path, rows: List[Dict[str, Any]]) -> None:
+    """Spool rows posted as JSON so they can be processed like an uploaded file"""
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def first_data_line(path: Path) -> int:
+    """Line number of the first row in the file (JSON lines have no header)"""
+    return 1 if path.suffix.lower() == ".jsonl" else FIRST_DATA_LINE
+
+
+def iter_payroll_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    """Raw rows of a payroll file, chosen by extension"""
+    suffix = path.suffix.lower()
+    if suffix == ".xlsx":
+        return iter_xlsx_rows(path)
+    if suffix == ".jsonl":
+        return iter_jsonl_rows(path)
+    return iter_csv_rows(path)
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate_row(raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Coerce one raw row into a payroll row
+
+    Returns:
+        (row, None) for a valid row, (None, reason) otherwise
+    """
+    code = raw.get("employee_code")
+    if _blank(code):
+        return None, "employee_code is required"
+    # Spreadsheets store numeric codes as numbers; 1001.0 should match "1001"
+    if isinstance(code, float) and code.is_integer():
+        code = int(code)
+    row = {"employee_code": str(code).strip()}
+
+    try:
+        row["days_worked"] = float(raw.get("days_worked")) if not _blank(raw.get("days_worked")) else 0.0
+    except (TypeError, ValueError):
+        return None, "days_worked must be a number"
+    if not 0 <= row["days_worked"] <= MAX_DAYS_WORKED:
+        return None, f"days_worked must be between 0 and {MAX_DAYS_WORKED}"
+
+    for field in ("gross_salary", "deductions"):
+        if _blank(raw.get(field)):
+            continue
+        try:
+            row[field] = float(raw[field])
+        except (TypeError, ValueError):
+            return None, f"{field} must be a number"
+        if row[field] < 0:
+            return None, f"{field} cannot be negative"
+    return row, None
+
+
+# ======================== BATCHES ========================
+
+async def process_batch(
+    db,
+    employer_id: str,
+    raw_rows: List[Dict[str, Any]],
+    first_line: int,
+    run_id: Optional[str] = None
+) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """Validate and apply one batch; returns outcome counts and the rows needing attention"""
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    problems, valid, lines = [], [], []
+    for offset, raw in enumerate(raw_rows):
+        row, reason = validate_row(raw)
+        if reason:
+            counts["invalid"] += 1
+            problems.append({"line": first_line + offset, "employee_code": raw.get("employee_code"),
+                             "status": "invalid", "reason": reason})
+        else:
+            valid.append(row)
+            lines.append(first_line + offset)
+
+    if valid:
+        result = await apply_payroll(db, employer_id, valid, run_id=run_id, row_numbers=lines)
+        for row_result in result["rows"]:
+            counts[row_result["status"]] += 1
+            if row_result["status"] not in ("updated", "unchanged"):
+                problems.append({"line": row_result["row"], "employee_code": row_result["employee_code"],
+                                 "status": row_result["status"]})
+    problems.sort(key=lambda problem: problem["line"])
+    return counts, problems
@@ -0,0 +1,319 @@
+"""
+Payroll Job Runner
+Mongo-backed queue that applies payroll uploads outside the HTTP request.
+
+Upload endpoints store the rows in upload storage (services.storage) under a
+`payroll/` key, insert a `payroll_jobs` document and return its id straight
+away. Workers read the file back by that key, so any API replica can run a
+job whichever replica accepted the upload. A small pool of asyncio workers claims queued
+jobs with a conditional find_one_and_update and works through the file in
+batches of PAYROLL_BATCH_SIZE. After every batch the job's counters, problem
+rows and checkpoint (`rows_processed`) are written in one update, which also
+renews the worker's lease.
+
+If the process stops mid-job the lease runs out and the job is claimed again,
+starting after the last checkpoint. A batch that was applied but not yet
+checkpointed is replayed; apply_payroll is given the job id as payroll run id
+and skips employees this run already wrote for that row, so nothing is
+applied twice.
+
+At most PAYROLL_EMPLOYER_CONCURRENCY jobs run per employer at a time so one
+large employer cannot occupy every worker.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone, timedelta
+from itertools import islice
+from typing import Optional, Dict, Any, List
+
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+from services.payroll_import import (
+    OUTCOMES, PAYROLL_BATCH_SIZE, first_data_line, iter_payroll_rows, process_batch
+)
+from services.storage import Storage
+from services.telemetry import telemetry, PAYROLL_SYNC
+
+logger = logging.getLogger(__name__)
+
+PAYROLL_WORKERS = int(os.environ.get("PAYROLL_WORKERS", "2"))
+PAYROLL_EMPLOYER_CONCURRENCY = int(os.environ.get("PAYROLL_EMPLOYER_CONCURRENCY", "1"))
+PAYROLL_LEASE_SECONDS = 300
+PAYROLL_POLL_SECONDS = 5.0
+PAYROLL_MAX_ATTEMPTS = 3
+MAX_JOB_ERRORS = 100
+# Queued jobs looked at per claim attempt
+CLAIM_CANDIDATES = 20
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job after this worker's lease expired"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def payroll_key(employer_id: str, extension: str) -> str:
+    """Fresh storage key for an employer's payroll file"""
+    return f"payroll/{employer_id}_{uuid.uuid4().hex}{extension}"
+
+
+def new_job(employer_id: str, month: str, file_name: str, stored_key: str) -> Dict[str, Any]:
+    now = _now().isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "employer_id": employer_id,
+        "month": month,
+        "file_name": file_name,
+        "stored_key": stored_key,
+        "status": "queued",
+        "rows_processed": 0,
+        **{outcome: 0 for outcome in OUTCOMES},
+        "errors": [],
+        "error": None,
+        "attempts": 0,
+        "worker_id": None,
+        "lease_expires_at": None,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "completed_at": None,
+    }
+
+
+def claimable_filter(now: str) -> Dict[str, Any]:
+    """Jobs waiting to run, plus running jobs whose worker stopped renewing its lease"""
+    return {"$or": [
+        {"status": "queued"},
+        {"status": "processing", "lease_expires_at": {"$lt": now}},
+    ]}
+
+
+# ======================== RUNNING A JOB ========================
+
+async def _checkpoint(db, job: Dict[str, Any], counts: Dict[str, int], problems: List[Dict[str, Any]], lease_seconds: float) -> None:
+    now = _now()
+    update = {
+        "$inc": {"rows_processed": sum(counts.values()), **counts},
+        "$set": {
+            "updated_at": now.isoformat(),
+            "lease_expires_at": (now + timedelta(seconds=lease_seconds)).isoformat(),
+        },
+    }
+    if problems:
+        update["$push"] = {"errors": {"$each": problems, "$slice": MAX_JOB_ERRORS}}
+    result = await db.payroll_jobs.update_one({"id": job["id"], "worker_id": job["worker_id"]}, update)
+    if result.matched_count == 0:
+        raise LeaseLost(job["id"])
+
+
+async def _finish(db, job: Dict[str, Any], total: int) -> None:
+    completed_at = _now().isoformat()
+    final = await db.payroll_jobs.find_one({"id": job["id"]}, {"_id": 0, "errors": 0})
+    # Keyed on the job so a job resumed after this point stores one record
+    await db.payroll_records.update_one(
+        {"job_id": job["id"]},
+        {"$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "employer_id": job["employer_id"],
+            "month": job["month"],
+            "source": "file" if job["file_name"] else "api",
+            "file_name": job["file_name"],
+            "job_id": job["id"],
+            "employee_count": total,
+            "summary": {outcome: final.get(outcome, 0) for outcome in OUTCOMES},
+            "uploaded_at": completed_at,
+        }},
+        upsert=True
+    )
+    await db.payroll_jobs.update_one(
+        {"id": job["id"], "worker_id": job["worker_id"]},
+        {"$set": {"status": "completed", "completed_at": completed_at, "updated_at": completed_at,
+                  "worker_id": None, "lease_expires_at": None}}
+    )
+
+
+async def run_job(
+    db,
+    storage: Storage,
+    job: Dict[str, Any],
+    batch_size: int = PAYROLL_BATCH_SIZE,
+    lease_seconds: float = PAYROLL_LEASE_SECONDS
+) -> None:
+    """
+    Apply a claimed job's file from its last checkpoint to the end
+
+    Args:
+        db: Motor database handle
+        storage: Upload storage holding the job's file
+        job: The job document as returned by the claim
+        batch_size: Rows parsed, applied and checkpointed together
+        lease_seconds: How long each checkpoint extends the worker's lease
+    """
+    async with storage.local_file(job["stored_key"]) as path:
+        rows = iter_payroll_rows(path)
+        done = job["rows_processed"]
+
+        # Parsing is blocking file I/O; keep it off the event loop
+        if done:
+            await run_in_threadpool(lambda: deque(islice(rows, done), maxlen=0))
+        line = first_data_line(path) + done
+        while True:
+            batch = await run_in_threadpool(lambda: list(islice(rows, batch_size)))
+            if not batch:
+                break
+            with telemetry.timer(PAYROLL_SYNC):
+                counts, problems = await process_batch(db, job["employer_id"], batch, line, run_id=job["id"])
+            await _checkpoint(db, job, counts, problems, lease_seconds)
+            line += len(batch)
+            done += len(batch)
+
+    await _finish(db, job, done)
+    await storage.delete(job["stored_key"])
+
+
+# ======================== QUEUE ========================
+
+class PayrollJobRunner:
+    """Pool of asyncio workers draining the payroll_jobs collection"""
+
+    def __init__(
+        self,
+        db,
+        storage: Storage,
+        workers: int = PAYROLL_WORKERS,
+        per_employer: int = PAYROLL_EMPLOYER_CONCURRENCY,
+        batch_size: int = PAYROLL_BATCH_SIZE,
+        lease_seconds: float = PAYROLL_LEASE_SECONDS,
+        poll_interval: float = PAYROLL_POLL_SECONDS
+    ):
+        self.db = db
+        self.storage = storage
+        self.workers = workers
+        self.per_employer = per_employer
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        self._running: Counter = Counter()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def enqueue(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a new job and wake an idle worker"""
+        await self.db.payroll_jobs.insert_one(job)
+        job.pop("_id", None)
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job whose employer has a free slot"""
+        now = _now()
+        candidates = await self.db.payroll_jobs.find(
+            claimable_filter(now.isoformat()),
+            {"_id": 0, "id": 1, "employer_id": 1}
+        ).sort("created_at", 1).to_list(CLAIM_CANDIDATES)
+
+        for candidate in candidates:
+            employer_id = candidate["employer_id"]
+            if self._running[employer_id] >= self.per_employer:
+                continue
+            # Hold the slot while we check the other workers' leases
+            self._running[employer_id] += 1
+            active = await self.db.payroll_jobs.count_documents({
+                "employer_id": employer_id,
+                "status": "processing",
+                "lease_expires_at": {"$gte": now.isoformat()},
+            })
+            if active < self.per_employer:
+                job = await self.db.payroll_jobs.find_one_and_update(
+                    {"id": candidate["id"], **claimable_filter(now.isoformat())},
+                    {"$set": {
+                        "status": "processing",
+                        "worker_id": f"{self.worker_id}:{uuid.uuid4().hex[:8]}",
+                        "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+                        "started_at": now.isoformat(),
+                        "updated_at": now.isoformat(),
+                    }},
+                    projection={"_id": 0, "errors": 0},
+                    return_document=ReturnDocument.AFTER
+                )
+                if job:
+                    return job
+            self._release(employer_id)
+        return None
+
+    def _release(self, employer_id: str) -> None:
+        self._running[employer_id] -= 1
+        if self._running[employer_id] <= 0:
+            del self._running[employer_id]
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception:
+                logger.exception("Claiming a payroll job failed")
+                job = None
+            if not job:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.execute(job)
+            finally:
+                # A slot for this employer is free again
+                self._wakeup.set()
+
+    async def execute(self, job: Dict[str, Any]) -> None:
+        """Run a claimed job, recording failure or handing it back on shutdown"""
+        try:
+            await self._execute(job)
+        finally:
+            self._release(job["employer_id"])
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        query = {"id": job["id"], "worker_id": job["worker_id"]}
+        try:
+            await run_job(self.db, self.storage, job, self.batch_size, self.lease_seconds)
+        except asyncio.CancelledError:
+            # Shutting down; let the next start pick it up from the checkpoint
+            await self.db.payroll_jobs.update_one(query, {"$set": {"status": "queued", "worker_id": None}})
+            raise
+        except LeaseLost:
+            logger.warning(f"Payroll job {job['id']} was taken over by another worker")
+        except Exception as e:
+            logger.exception(f"Payroll job {job['id']} failed")
+            attempts = job.get("attempts", 0) + 1
+            failed = attempts >= PAYROLL_MAX_ATTEMPTS
+            await self.db.payroll_jobs.update_one(query, {"$set": {
+                "status": "failed" if failed else "queued",
+                "attempts": attempts,
+                "error": str(e),
+                "worker_id": None,
+                "lease_expires_at": None,
+                "updated_at": _now().isoformat(),
+            }})
+            if failed:
+                await self.storage.delete(job["stored_key"])
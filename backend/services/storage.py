@@ -0,0 +1,490 @@
+"""
+Upload Storage Backends
+Where uploaded files live: the API node's disk or an S3-compatible bucket.
+
+UPLOAD_STORAGE selects the backend - "filesystem" (default) or "s3". Files are
+addressed by key ("kyc/sha256/ab/cd/<sha256>", "profiles/<name>",
+"employer_docs/<name>", "payroll/<name>"), so endpoints never build paths
+themselves and several stateless API replicas can share one bucket. Code that
+needs a real file to parse (the payroll workers) gets one from local_file().
+
+FilesystemStorage keeps the existing layout under the upload directory:
+uploads are streamed to a part file beside the destination and renamed into
+place (services.uploads).
+
+S3Storage streams an upload straight into a multipart upload. Chunks are
+buffered up to S3_PART_SIZE and sent as parts from the thread pool, so an
+upload holds at most one part in memory; anything smaller than a part is a
+single PUT. A failed or oversized upload aborts its multipart upload.
+Downloads are not proxied: response() redirects to a presigned GET URL valid
+for S3_PRESIGN_SECONDS, so the bytes go from the bucket to the client.
+
+serve() adds HTTP caching on top of either backend: a strong ETag (the
+caller's content hash) and Cache-Control on every response, 304 Not Modified
+when If-None-Match matches - before the storage is touched - and single
+byte ranges (206 / 416) for files streamed from disk. S3 answers ranges
+itself and is told to send the same Cache-Control through the presigned URL.
+
+S3 settings: S3_BUCKET, S3_ENDPOINT_URL (MinIO, LocalStack or any other
+S3-compatible store), S3_REGION, S3_PREFIX.
+"""
+
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Tuple, AsyncIterator, AsyncContextManager
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from services.uploads import UPLOAD_CHUNK_SIZE, UploadTooLarge, part_path, save_upload, write_part
+
+UPLOAD_STORAGE = os.environ.get("UPLOAD_STORAGE", "filesystem").lower()
+# S3's minimum for every part but the last
+S3_PART_SIZE = int(os.environ.get("S3_PART_SIZE", str(8 * 1024 * 1024)))
+S3_PRESIGN_SECONDS = int(os.environ.get("S3_PRESIGN_SECONDS", "300"))
+S3_MAX_CONNECTIONS = int(os.environ.get("S3_MAX_CONNECTIONS", "50"))
+
+
+def _sha256_of(path: Path) -> Optional[str]:
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Storage(ABC):
+    """Key -> file store used by the upload endpoints; a backend must implement every method"""
+
+    @abstractmethod
+    async def save(self, file, key: str, max_bytes: Optional[int] = None, content_type: Optional[str] = None) -> int:
+        """
+        Stream an upload to `key`
+
+        Returns:
+            Size of the stored file in bytes
+
+        Raises:
+            UploadTooLarge: the upload is bigger than max_bytes; nothing is stored
+        """
+
+    @abstractmethod
+    async def spool(self, file, max_bytes: Optional[int] = None, digest=None) -> Tuple[Path, int]:
+        """Stream an upload to a local part file for a later put_file; (part, size)"""
+
+    @abstractmethod
+    async def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        """Store a local file under `key`; the file is consumed"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether a file is stored under `key`"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove the file under `key`; a missing file is not an error"""
+
+    @abstractmethod
+    async def sha256(self, key: str) -> Optional[str]:
+        """Hex SHA-256 of the stored bytes, None if there is no such file"""
+
+    @abstractmethod
+    def local_file(self, key: str) -> AsyncContextManager[Path]:
+        """
+        Async context manager yielding a local path holding the file, for parsers that need one
+
+        The path keeps the key's extension and is only valid inside the block.
+
+        Raises:
+            FileNotFoundError: there is no such file
+        """
+
+    @abstractmethod
+    async def response(
+        self,
+        key: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        byte_range: Optional[str] = None
+    ) -> Response:
+        """
+        Response delivering the file to the client
+
+        Args:
+            key: Storage key
+            media_type: Content-Type to send
+            headers: Extra headers (ETag, Cache-Control)
+            byte_range: The request's Range header, if it should be honoured
+
+        Raises:
+            FileNotFoundError: the backend knows the file does not exist
+        """
+
+
+# ======================== FILESYSTEM ========================
+
+class FilesystemStorage(Storage):
+    """Files under a local directory - a single API node, or a shared volume"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def save(self, file, key: str, max_bytes: Optional[int] = None, content_type: Optional[str] = None) -> int:
+        destination = self.path(key)
+        await run_in_threadpool(destination.parent.mkdir, parents=True, exist_ok=True)
+        return await save_upload(file, destination, max_bytes)
+
+    async def spool(self, file, max_bytes: Optional[int] = None, digest=None) -> Tuple[Path, int]:
+        # Same filesystem as the destination, so put_file is a rename
+        await run_in_threadpool(self.root.mkdir, parents=True, exist_ok=True)
+        part = part_path(self.root / "upload")
+        return part, await write_part(file, part, max_bytes, digest=digest)
+
+    async def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        destination = self.path(key)
+        await run_in_threadpool(destination.parent.mkdir, parents=True, exist_ok=True)
+        await run_in_threadpool(os.replace, path, destination)
+
+    async def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.path(key).unlink, True)
+
+    async def sha256(self, key: str) -> Optional[str]:
+        return await run_in_threadpool(_sha256_of, self.path(key))
+
+    @asynccontextmanager
+    async def local_file(self, key: str) -> AsyncIterator[Path]:
+        path = self.path(key)
+        if not path.exists():
+            raise FileNotFoundError(key)
+        yield path
+
+    async def response(
+        self,
+        key: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        byte_range: Optional[str] = None
+    ) -> Response:
+        path = self.path(key)
+        if not path.exists():
+            raise FileNotFoundError(key)
+        headers = {**(headers or {}), "accept-ranges": "bytes"}
+        if not byte_range:
+            return FileResponse(path, media_type=media_type, headers=headers)
+
+        size = path.stat().st_size
+        span = parse_range(byte_range, size)
+        if span is None:
+            return FileResponse(path, media_type=media_type, headers=headers)
+        if span == UNSATISFIABLE:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        start, end = span
+        return StreamingResponse(
+            _read_range(path, start, end),
+            status_code=206,
+            media_type=media_type or "application/octet-stream",
+            headers={**headers, "content-range": f"bytes {start}-{end}/{size}", "content-length": str(end - start + 1)},
+        )
+
+
+# ======================== S3 ========================
+
+class S3Storage(Storage):
+    """Objects in an S3 (or S3-compatible) bucket, served through presigned URLs"""
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        prefix: str = "",
+        part_size: int = S3_PART_SIZE,
+        presign_seconds: int = S3_PRESIGN_SECONDS,
+        client=None
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("S3 upload storage requires the boto3 package")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self.presign_seconds = presign_seconds
+        self._client_error = ClientError
+        self._transfer_config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size)
+        self.client = client or boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=S3_MAX_CONNECTIONS,
+                # Emulators and most self-hosted stores do not do virtual-host buckets
+                s3={"addressing_style": "path"} if endpoint_url else {},
+            ),
+        )
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def save(self, file, key: str, max_bytes: Optional[int] = None, content_type: Optional[str] = None) -> int:
+        declared = getattr(file, "size", None)
+        if max_bytes is not None and declared is not None and declared > max_bytes:
+            raise UploadTooLarge(max_bytes)
+
+        target = {"Bucket": self.bucket, "Key": self.object_key(key)}
+        extra = {"ContentType": content_type} if content_type else {}
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+
+        async def send_part() -> None:
+            nonlocal upload_id
+            if upload_id is None:
+                created = await run_in_threadpool(self.client.create_multipart_upload, **target, **extra)
+                upload_id = created["UploadId"]
+            number = len(parts) + 1
+            sent = await run_in_threadpool(
+                self.client.upload_part, **target, UploadId=upload_id, PartNumber=number, Body=bytes(buffer)
+            )
+            parts.append({"ETag": sent["ETag"], "PartNumber": number})
+            buffer.clear()
+
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                buffer += chunk
+                if len(buffer) >= self.part_size:
+                    await send_part()
+            if upload_id is None:
+                await run_in_threadpool(self.client.put_object, **target, Body=bytes(buffer), **extra)
+            else:
+                if buffer:
+                    await send_part()
+                await run_in_threadpool(
+                    self.client.complete_multipart_upload,
+                    **target, UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await run_in_threadpool(self.client.abort_multipart_upload, **target, UploadId=upload_id)
+            raise
+        return size
+
+    async def spool(self, file, max_bytes: Optional[int] = None, digest=None) -> Tuple[Path, int]:
+        part = part_path(Path(tempfile.gettempdir()) / "upload")
+        return part, await write_part(file, part, max_bytes, digest=digest)
+
+    async def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        try:
+            await run_in_threadpool(
+                self.client.upload_file, str(path), self.bucket, self.object_key(key),
+                ExtraArgs={"ContentType": content_type} if content_type else None,
+                Config=self._transfer_config
+            )
+        finally:
+            path.unlink(missing_ok=True)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=self.object_key(key))
+        except self._client_error as e:
+            if self._missing(e):
+                return False
+            raise
+        return True
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    def _sha256_of_object(self, key: str) -> Optional[str]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))["Body"]
+        except self._client_error as e:
+            if self._missing(e):
+                return None
+            raise
+        digest = hashlib.sha256()
+        with body:
+            while chunk := body.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    async def sha256(self, key: str) -> Optional[str]:
+        return await run_in_threadpool(self._sha256_of_object, key)
+
+    @asynccontextmanager
+    async def local_file(self, key: str) -> AsyncIterator[Path]:
+        fd, name = tempfile.mkstemp(suffix=Path(key).suffix)
+        os.close(fd)
+        path = Path(name)
+        try:
+            try:
+                await run_in_threadpool(
+                    self.client.download_file, self.bucket, self.object_key(key), name, Config=self._transfer_config
+                )
+            except self._client_error as e:
+                if self._missing(e):
+                    raise FileNotFoundError(key)
+                raise
+            yield path
+        finally:
+            path.unlink(missing_ok=True)
+
+    def presigned_url(self, key: str, media_type: Optional[str] = None, cache_control: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": self.object_key(key)}
+        if media_type:
+            params["ResponseContentType"] = media_type
+        if cache_control:
+            params["ResponseCacheControl"] = cache_control
+        # Signed locally; no request to S3
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presign_seconds)
+
+    async def response(
+        self,
+        key: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        byte_range: Optional[str] = None
+    ) -> Response:
+        # S3 handles Range and conditional requests on the redirected GET
+        url = self.presigned_url(key, media_type, (headers or {}).get("cache-control"))
+        # The redirect itself must not outlive the signature
+        return RedirectResponse(url, status_code=307, headers={"cache-control": "no-store"})
+
+
+# ======================== HTTP ========================
+
+# parse_range result for a range that starts past the end of the file
+UNSATISFIABLE = (-1, -1)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single-range Range header
+
+    Returns:
+        None when the header is malformed or asks for several ranges (the whole
+        file is sent), UNSATISFIABLE when the range lies outside the file
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return UNSATISFIABLE
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    f = await run_in_threadpool(open, path, "rb")
+    try:
+        await run_in_threadpool(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await run_in_threadpool(f.read, min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(f.close)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison, as RFC 9110 asks)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def serve(
+    storage: Storage,
+    key: str,
+    request: Request,
+    media_type: Optional[str] = None,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """
+    Response for a stored file with caching headers, 304 and Range handling
+
+    Args:
+        storage: Upload storage backend
+        key: Storage key
+        request: The incoming request (If-None-Match, Range, If-Range)
+        media_type: Content-Type to send
+        etag: Content hash of the file, sent as a strong ETag
+        cache_control: Cache-Control policy for this class of file
+
+    Raises:
+        FileNotFoundError: the backend knows the file does not exist
+    """
+    headers = {}
+    if etag:
+        etag = f'"{etag}"'
+        headers["etag"] = etag
+    if cache_control:
+        headers["cache-control"] = cache_control
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is of another version
+    if byte_range and if_range and if_range != etag:
+        byte_range = None
+    return await storage.response(key, media_type, headers, byte_range)
+
+
+def storage_from_env(root: Path) -> Storage:
+    """Backend chosen by UPLOAD_STORAGE; `root` is the filesystem backend's directory"""
+    if UPLOAD_STORAGE == "filesystem":
+        return FilesystemStorage(root)
+    if UPLOAD_STORAGE == "s3":
+        return S3Storage(
+            os.environ["S3_BUCKET"],
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+            prefix=os.environ.get("S3_PREFIX", ""),
+        )
+    raise ValueError(f"Unknown UPLOAD_STORAGE: {UPLOAD_STORAGE}")
@@ -0,0 +1,327 @@
+"""
+Integration Telemetry
+Latency, error rate and uptime of outbound integrations (Dusupay payout routes,
+payroll sync), measured in process and served by /admin/api-health.
+
+Every call is recorded with telemetry.record(integration, latency_ms, ok):
+- the last TELEMETRY_SAMPLES calls per integration sit in a ring buffer, from
+  which snapshots read p50/p95/p99 latency and the recent error rate
+- calls are also counted into per-minute buckets (calls, errors, latency
+  histogram) kept for 24 hours; a minute with calls is "down" when more than
+  half of them failed, and uptime is the share of such minutes that were up
+
+Reading a snapshot sorts at most TELEMETRY_SAMPLES floats per integration and
+never touches the database. TelemetryFlusher writes closed minute buckets to
+the `integration_metrics` time-series collection every TELEMETRY_FLUSH_SECONDS
+(one document per integration, minute and process) for history across
+restarts and workers.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_SAMPLES = int(os.environ.get("TELEMETRY_SAMPLES", "1024"))
+TELEMETRY_FLUSH_SECONDS = float(os.environ.get("TELEMETRY_FLUSH_SECONDS", "60"))
+TELEMETRY_RETENTION_DAYS = int(os.environ.get("TELEMETRY_RETENTION_DAYS", "30"))
+METRICS_COLLECTION = "integration_metrics"
+MINUTES_KEPT = 24 * 60
+# Status looks at the calls of the last few minutes only
+RECENT_SECONDS = 300
+DEGRADED_ERROR_RATE = 0.05
+DOWN_ERROR_RATE = 0.5
+# Histogram bucket upper bounds (ms); one extra bucket counts everything slower
+LATENCY_BOUNDS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+PAYROLL_SYNC = "payroll_sync"
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def histogram_percentile(histogram: List[int], p: float) -> Optional[float]:
+    """Upper bound of the histogram bucket holding the p-th percentile (None for the overflow bucket)"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = math.ceil(p / 100 * total)
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            return float(LATENCY_BOUNDS_MS[i]) if i < len(LATENCY_BOUNDS_MS) else None
+    return None
+
+
+def status_of(calls: int, errors: int) -> str:
+    """healthy / degraded / down from an error count, in the API Health page's terms"""
+    if not calls:
+        return "healthy"
+    rate = errors / calls
+    if rate >= DOWN_ERROR_RATE:
+        return "down"
+    if rate >= DEGRADED_ERROR_RATE:
+        return "degraded"
+    return "healthy"
+
+
+class MinuteBucket:
+    __slots__ = ("minute", "calls", "errors", "latency_sum", "latency_max", "histogram")
+
+    def __init__(self, minute: int):
+        self.minute = minute
+        self.calls = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.histogram = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+
+    def add(self, latency_ms: float, ok: bool) -> None:
+        self.calls += 1
+        self.errors += 0 if ok else 1
+        self.latency_sum += latency_ms
+        self.latency_max = max(self.latency_max, latency_ms)
+        self.histogram[bisect_left(LATENCY_BOUNDS_MS, latency_ms)] += 1
+
+    @property
+    def up(self) -> bool:
+        return self.errors * 2 <= self.calls
+
+
+class IntegrationStats:
+    """Ring buffer of recent calls plus 24 hours of minute buckets for one integration"""
+
+    def __init__(self, name: str, samples: int):
+        self.name = name
+        self.samples: deque = deque(maxlen=samples)  # (timestamp, latency_ms, ok)
+        self.minutes: deque = deque(maxlen=MINUTES_KEPT)
+        self.flushed_minute = -1
+        self.total_calls = 0
+        self.total_errors = 0
+
+    def record(self, now: float, latency_ms: float, ok: bool) -> None:
+        self.samples.append((now, latency_ms, ok))
+        self.total_calls += 1
+        self.total_errors += 0 if ok else 1
+        minute = int(now // 60)
+        if not self.minutes or self.minutes[-1].minute != minute:
+            self.minutes.append(MinuteBucket(minute))
+        self.minutes[-1].add(latency_ms, ok)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        latencies = sorted(latency for _, latency, _ in self.samples)
+        errors = sum(1 for _, _, ok in self.samples if not ok)
+        recent = [ok for ts, _, ok in self.samples if ts >= now - RECENT_SECONDS]
+
+        day_start = now - 24 * 3600
+        today_start = now - now % 86400
+        minutes = [b for b in self.minutes if b.minute * 60 >= day_start]
+        last = self.samples[-1][0] if self.samples else None
+        return {
+            "integration": self.name,
+            "status": status_of(len(recent), recent.count(False)),
+            "samples": len(latencies),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            },
+            "error_rate": round(errors / len(latencies), 4) if latencies else None,
+            "uptime_percent": round(100 * sum(b.up for b in minutes) / len(minutes), 2) if minutes else None,
+            "calls_24h": sum(b.calls for b in minutes),
+            "calls_today": sum(b.calls for b in minutes if b.minute * 60 >= today_start),
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "last_call_at": datetime.fromtimestamp(last, timezone.utc).isoformat() if last else None,
+        }
+
+    def closed_minutes(self, now: float) -> List[MinuteBucket]:
+        """Minute buckets that are complete and not yet flushed"""
+        current = int(now // 60)
+        return [b for b in self.minutes if self.flushed_minute < b.minute < current]
+
+
+class Telemetry:
+    """Per-integration stats, created on first use"""
+
+    def __init__(self, samples: int = TELEMETRY_SAMPLES, clock: Callable[[], float] = time.time):
+        self.samples = samples
+        self.clock = clock
+        self._integrations: Dict[str, IntegrationStats] = {}
+
+    def _stats(self, integration: str) -> IntegrationStats:
+        stats = self._integrations.get(integration)
+        if stats is None:
+            stats = self._integrations[integration] = IntegrationStats(integration, self.samples)
+        return stats
+
+    def record(self, integration: str, latency_ms: float, ok: bool) -> None:
+        self._stats(integration).record(self.clock(), latency_ms, ok)
+
+    @contextmanager
+    def timer(self, integration: str):
+        """Record the wrapped block as one call; an exception counts as an error"""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(integration, (time.perf_counter() - started) * 1000, ok)
+
+    def snapshot(self, integration: str) -> Dict[str, Any]:
+        """Live numbers for one integration (empty figures if it has no calls yet)"""
+        return self._stats(integration).snapshot(self.clock())
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        now = self.clock()
+        return [self._integrations[name].snapshot(now) for name in sorted(self._integrations)]
+
+    def closed_minutes(self) -> List[Dict[str, Any]]:
+        """Time-series documents for every completed, unflushed minute"""
+        now = self.clock()
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        return [
+            {
+                "minute": datetime.fromtimestamp(bucket.minute * 60, timezone.utc),
+                "integration": name,
+                "process": host,
+                "calls": bucket.calls,
+                "errors": bucket.errors,
+                "latency_ms_sum": round(bucket.latency_sum, 1),
+                "latency_ms_max": round(bucket.latency_max, 1),
+                "histogram": bucket.histogram,
+            }
+            for name, stats in self._integrations.items()
+            for bucket in stats.closed_minutes(now)
+        ]
+
+    def mark_flushed(self, docs: List[Dict[str, Any]]) -> None:
+        for doc in docs:
+            stats = self._integrations[doc["integration"]]
+            stats.flushed_minute = max(stats.flushed_minute, int(doc["minute"].timestamp() // 60))
+
+
+telemetry = Telemetry()
+
+
+# ======================== PERSISTENCE ========================
+
+async def ensure_metrics_collection(db) -> None:
+    """Create integration_metrics as a time-series collection (plain collection on MongoDB < 5.0)"""
+    try:
+        await db.create_collection(
+            METRICS_COLLECTION,
+            timeseries={"timeField": "minute", "metaField": "integration", "granularity": "minutes"},
+            expireAfterSeconds=TELEMETRY_RETENTION_DAYS * 86400
+        )
+    except CollectionInvalid:
+        pass  # already exists
+    except OperationFailure as e:
+        logger.warning(f"Time-series collections unavailable ({e}); storing metrics in a plain collection")
+
+
+async def flush(db, source: Telemetry = telemetry) -> int:
+    """Write completed minute buckets; returns the number of documents written"""
+    docs = source.closed_minutes()
+    if docs:
+        # insert_many adds _id to the dicts; mark_flushed only reads integration and minute
+        await db[METRICS_COLLECTION].insert_many(docs, ordered=False)
+        source.mark_flushed(docs)
+    return len(docs)
+
+
+async def history(db, integration: str, hours: int = 24) -> List[Dict[str, Any]]:
+    """Hourly calls, errors, latency and uptime for an integration, summed across processes"""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    docs = await db[METRICS_COLLECTION].find(
+        {"integration": integration, "minute": {"$gte": since}},
+        {"_id": 0, "minute": 1, "calls": 1, "errors": 1, "latency_ms_sum": 1, "histogram": 1}
+    ).to_list(None)
+
+    minutes: Dict[datetime, Dict[str, Any]] = {}
+    for doc in docs:
+        minute = minutes.setdefault(doc["minute"], {"calls": 0, "errors": 0, "latency_ms_sum": 0.0,
+                                                    "histogram": [0] * (len(LATENCY_BOUNDS_MS) + 1)})
+        minute["calls"] += doc["calls"]
+        minute["errors"] += doc["errors"]
+        minute["latency_ms_sum"] += doc["latency_ms_sum"]
+        minute["histogram"] = [a + b for a, b in zip(minute["histogram"], doc["histogram"])]
+
+    hours_out: Dict[datetime, Dict[str, Any]] = {}
+    for at, minute in sorted(minutes.items()):
+        hour = hours_out.setdefault(at.replace(minute=0, second=0, microsecond=0), {
+            "calls": 0, "errors": 0, "latency_ms_sum": 0.0, "minutes": 0, "minutes_up": 0,
+            "histogram": [0] * (len(LATENCY_BOUNDS_MS) + 1)})
+        hour["calls"] += minute["calls"]
+        hour["errors"] += minute["errors"]
+        hour["latency_ms_sum"] += minute["latency_ms_sum"]
+        hour["minutes"] += 1
+        hour["minutes_up"] += minute["errors"] * 2 <= minute["calls"]
+        hour["histogram"] = [a + b for a, b in zip(hour["histogram"], minute["histogram"])]
+
+    return [
+        {
+            "hour": hour.isoformat(),
+            "calls": h["calls"],
+            "errors": h["errors"],
+            "error_rate": round(h["errors"] / h["calls"], 4) if h["calls"] else None,
+            "latency_ms_avg": round(h["latency_ms_sum"] / h["calls"], 1) if h["calls"] else None,
+            "latency_ms_p95": histogram_percentile(h["histogram"], 95),
+            "uptime_percent": round(100 * h["minutes_up"] / h["minutes"], 2),
+        }
+        for hour, h in hours_out.items()
+    ]
+
+
+class TelemetryFlusher:
+    """Background loop flushing closed minutes to integration_metrics"""
+
+    def __init__(self, db, source: Telemetry = telemetry, interval: float = TELEMETRY_FLUSH_SECONDS):
+        self.db = db
+        self.source = source
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Whatever is complete still gets written on a clean shutdown
+        try:
+            await flush(self.db, self.source)
+        except Exception:
+            logger.exception("Flushing integration telemetry on shutdown failed")
+
+    async def _loop(self) -> None:
+        try:
+            await ensure_metrics_collection(self.db)
+        except Exception:
+            logger.exception("Creating the integration_metrics collection failed")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await flush(self.db, self.source)
+            except Exception:
+                logger.exception("Flushing integration telemetry failed")
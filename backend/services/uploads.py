@@ -0,0 +1,110 @@
+"""
+Upload Storage
+Copies multipart uploads to disk without holding them in memory or blocking
+the event loop.
+
+save_upload reads the upload UPLOAD_CHUNK_SIZE bytes at a time and writes each
+chunk from the thread pool into a hidden ".part" file next to the destination.
+The size limit is checked as the bytes arrive (and up front when the client
+sent a size), so an oversized file is abandoned at the first chunk past the
+limit. Only a complete file is renamed into place - os.replace is atomic on
+the same filesystem - and the part file is removed on any failure, so readers
+never see a half-written document.
+"""
+
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    """The upload is bigger than the endpoint allows"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def part_path(destination: Path) -> Path:
+    """Hidden temporary file the upload is written to before the rename"""
+    return destination.with_name(f".{destination.name}.{uuid.uuid4().hex[:8]}.part")
+
+
+def _write_chunk(out, chunk: bytes, digest) -> None:
+    if digest is not None:
+        digest.update(chunk)
+    out.write(chunk)
+
+
+async def write_part(
+    file,
+    part: Path,
+    max_bytes: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    digest=None
+) -> int:
+    """
+    Stream an upload into `part`, removing it again if anything goes wrong
+
+    Args:
+        file: starlette UploadFile (anything with an async read(size))
+        part: Temporary file to write
+        max_bytes: Largest accepted upload; None for no limit
+        chunk_size: Bytes read and written per step
+        digest: hashlib object fed every chunk, e.g. hashlib.sha256()
+
+    Returns:
+        Size of the upload in bytes
+
+    Raises:
+        UploadTooLarge: the upload is bigger than max_bytes
+    """
+    declared = getattr(file, "size", None)
+    if max_bytes is not None and declared is not None and declared > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    size = 0
+    try:
+        out = await run_in_threadpool(open, part, "wb")
+        try:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                await run_in_threadpool(_write_chunk, out, chunk, digest)
+        finally:
+            await run_in_threadpool(out.close)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return size
+
+
+async def save_upload(
+    file,
+    destination: Path,
+    max_bytes: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> int:
+    """
+    Stream an upload to `destination`, replacing it atomically when complete
+
+    Returns:
+        Size of the stored file in bytes
+
+    Raises:
+        UploadTooLarge: the upload is bigger than max_bytes; nothing is stored
+    """
+    part = part_path(destination)
+    size = await write_part(file, part, max_bytes, chunk_size)
+    try:
+        await run_in_threadpool(os.replace, part, destination)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return size
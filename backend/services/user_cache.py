@@ -0,0 +1,111 @@
+"""
+Authenticated User Cache
+Short-TTL, in-process LRU cache in front of the users lookup in get_current_user.
+
+Every authenticated request resolves its JWT subject to a user document; with
+dashboards polling, that is one Mongo round trip per request on the hottest
+path in the API. Entries live for USER_CACHE_TTL_SECONDS (default 30) and the
+cache holds at most USER_CACHE_MAX_ENTRIES users (default 10,000).
+
+Any endpoint that writes to a user document must call invalidate(user_id).
+The cache is per process, so with several workers another worker may serve
+the old document until its TTL expires; keep the TTL short.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTLCache:
+    """LRU cache whose entries also expire after a fixed time-to-live"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Loads in flight per key, and a counter invalidate bumps while any are, so a
+        # load that started before a write cannot repopulate stale data. Both only
+        # hold keys being loaded right now.
+        self._loading: Dict[str, int] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if key in self._loading:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        # Loads in flight must not repopulate the cache either
+        for key in self._loading:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        Return the cached value for key, calling loader on a miss
+
+        None results are not cached, so an unknown user is looked up again next time.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self._generations.get(key, 0)
+        self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            value = await loader()
+        finally:
+            stale = self._generations.get(key, 0) != generation
+            self._loading[key] -= 1
+            if not self._loading[key]:
+                del self._loading[key]
+                self._generations.pop(key, None)
+        if value is not None and not stale:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = TTLCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
@@ -0,0 +1,288 @@
+"""
+Dusupay Webhook Ingestion
+Callbacks are acknowledged as soon as they are stored; the status transitions
+they carry are applied afterwards by a worker pool.
+
+The endpoint verifies the signature, inserts the raw event into
+`inbound_webhooks` with status "pending" and returns - one insert on the
+request path. WebhookProcessor workers claim pending events with a conditional
+find_one_and_update (and a lease, so a crashed worker's event is taken over)
+and apply them to the disbursement, advance and transaction.
+
+Events for the same merchant_reference are applied strictly in the order they
+were received: an event is only claimable when no earlier event for its
+reference is still pending or processing. A claim skips the references held
+up by an event that is backing off or leased, then takes the oldest due event
+of the rest in one find_one_and_update - the oldest due event of a reference
+that is not held up is its first unfinished one. A claim that raced another
+worker onto a later event of the same reference is handed back. A failed event is retried with
+exponential backoff up to WEBHOOK_MAX_ATTEMPTS times and holds back later
+events for its reference until it succeeds or is given up ("failed"). A
+callback that arrives before its disbursement record has been written is
+retried the same way.
+
+Resent callbacks are dropped at the door: a unique index on (merchant_reference,
+transaction_status, provider_event_id) turns the insert of a replay into a
+duplicate-key error. provider_event_id is Dusupay's event id when the callback
+carries one, otherwise a hash of the callback body. Anything that still gets
+through (the same status under a new event id, statuses arriving out of
+order) is a no-op in the disbursement state machine.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.disbursements import DisbursementNotFound, apply_status
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "6"))
+WEBHOOK_LEASE_SECONDS = 60
+WEBHOOK_POLL_SECONDS = 2.0
+WEBHOOK_RETRY_BASE_SECONDS = 2.0
+WEBHOOK_RETRY_MAX_SECONDS = 300.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(WEBHOOK_RETRY_MAX_SECONDS, WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def provider_event_id(payload: Dict[str, Any]) -> str:
+    """Dusupay's id for the callback, or a digest of its body when it has none"""
+    event_payload = payload.get("payload", {}) or {}
+    for source in (payload, event_payload):
+        for key in ("event_id", "id"):
+            if source.get(key):
+                return str(source[key])
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return "sha256:" + hashlib.sha256(body.encode()).hexdigest()
+
+
+def new_event(payload: Dict[str, Any], signature_valid: bool) -> Dict[str, Any]:
+    """inbound_webhooks document for a Dusupay callback body"""
+    now = _now().isoformat()
+    event_payload = payload.get("payload", {}) or {}
+    return {
+        "id": str(uuid.uuid4()),
+        "source": "dusupay",
+        "provider_event_id": provider_event_id(payload),
+        "event": payload.get("event", ""),
+        "merchant_reference": event_payload.get("merchant_reference"),
+        "internal_reference": event_payload.get("internal_reference"),
+        "transaction_status": str(event_payload.get("transaction_status", "")).upper(),
+        "payload": event_payload,
+        "signature_valid": signature_valid,
+        "status": "pending",
+        "attempts": 0,
+        "error": None,
+        "result": None,
+        "worker_id": None,
+        "lease_expires_at": None,
+        "available_at": now,
+        "received_at": now,
+        "processed_at": None,
+    }
+
+
+def claimable_filter(now: str) -> Dict[str, Any]:
+    """Events due for (another) attempt, plus events whose worker stopped renewing its lease"""
+    return {"$or": [
+        {"status": "pending", "available_at": {"$lte": now}},
+        {"status": "processing", "lease_expires_at": {"$lt": now}},
+    ]}
+
+
+def waiting_filter(now: str) -> Dict[str, Any]:
+    """Unfinished events that cannot be claimed yet: backing off, or leased by a live worker"""
+    return {"$or": [
+        {"status": "pending", "available_at": {"$gt": now}},
+        {"status": "processing", "lease_expires_at": {"$gte": now}},
+    ]}
+
+
+# ======================== APPLYING AN EVENT ========================
+
+async def apply_event(db, event: Dict[str, Any]) -> str:
+    """
+    Apply a callback's transaction status through the disbursement state machine
+
+    Returns:
+        The transaction status applied, or "stale" when it would not move the disbursement
+
+    Raises:
+        DisbursementNotFound: no disbursement has this merchant_reference (yet)
+    """
+    moved = await apply_status(db, event["merchant_reference"], event["transaction_status"], event["payload"])
+    return event["transaction_status"] if moved else "stale"
+
+
+# ======================== WORKER POOL ========================
+
+class WebhookProcessor:
+    """Pool of asyncio workers draining inbound_webhooks in per-reference order"""
+
+    def __init__(
+        self,
+        db,
+        workers: int = WEBHOOK_WORKERS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        lease_seconds: float = WEBHOOK_LEASE_SECONDS,
+        poll_interval: float = WEBHOOK_POLL_SECONDS
+    ):
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        # References a worker of this process is applying right now
+        self._active: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def ingest(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Persist a received callback and wake an idle worker; None if it was already received"""
+        try:
+            await self.db.inbound_webhooks.insert_one(event)
+        except DuplicateKeyError:
+            return None
+        event.pop("_id", None)
+        if self._wakeup:
+            self._wakeup.set()
+        return event
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest due event that is next in line for its merchant_reference"""
+        now = _now()
+        # References whose next event is backing off or being applied elsewhere
+        held = set(await self.db.inbound_webhooks.distinct("merchant_reference", waiting_filter(now.isoformat())))
+        held |= self._active
+        while True:
+            worker_id = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+            event = await self.db.inbound_webhooks.find_one_and_update(
+                {**claimable_filter(now.isoformat()), "merchant_reference": {"$nin": list(held)}},
+                {"$set": {
+                    "status": "processing",
+                    "worker_id": worker_id,
+                    "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+                }},
+                projection={"_id": 0},
+                sort=[("received_at", 1), ("id", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not event:
+                return None
+            reference = event["merchant_reference"]
+            self._active.add(reference)
+            earlier = await self.db.inbound_webhooks.count_documents({
+                "merchant_reference": reference,
+                "status": {"$in": ["pending", "processing"]},
+                "id": {"$ne": event["id"]},
+                "$or": [
+                    {"received_at": {"$lt": event["received_at"]}},
+                    {"received_at": event["received_at"], "id": {"$lt": event["id"]}},
+                ],
+            })
+            if not earlier:
+                return event
+            # Another worker claimed an earlier event of this reference in the meantime
+            await self.db.inbound_webhooks.update_one(
+                {"id": event["id"], "worker_id": worker_id},
+                {"$set": {"status": "pending", "worker_id": None, "lease_expires_at": None}}
+            )
+            self._active.discard(reference)
+            held.add(reference)
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                event = await self.claim()
+            except Exception:
+                logger.exception("Claiming a webhook event failed")
+                event = None
+            if not event:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.execute(event)
+            finally:
+                # The next event for this reference may be claimable now
+                self._wakeup.set()
+
+    async def execute(self, event: Dict[str, Any]) -> None:
+        """Apply a claimed event, scheduling a retry or giving up on failure"""
+        try:
+            await self._execute(event)
+        finally:
+            self._active.discard(event["merchant_reference"])
+
+    async def _execute(self, event: Dict[str, Any]) -> None:
+        query = {"id": event["id"], "worker_id": event["worker_id"]}
+        attempts = event.get("attempts", 0) + 1
+        try:
+            result = await apply_event(self.db, event)
+        except asyncio.CancelledError:
+            # Shutting down; hand the event back untouched
+            await self.db.inbound_webhooks.update_one(
+                query, {"$set": {"status": "pending", "worker_id": None, "lease_expires_at": None}}
+            )
+            raise
+        except Exception as e:
+            given_up = attempts >= self.max_attempts
+            if isinstance(e, DisbursementNotFound):
+                error = f"Disbursement not found for reference: {e}"
+            else:
+                error = str(e)
+                logger.exception(f"Webhook event {event['id']} failed (attempt {attempts})")
+            now = _now()
+            await self.db.inbound_webhooks.update_one(query, {"$set": {
+                "status": ("not_found" if isinstance(e, DisbursementNotFound) else "failed") if given_up else "pending",
+                "attempts": attempts,
+                "error": error,
+                "available_at": (now + timedelta(seconds=retry_delay(attempts))).isoformat(),
+                "processed_at": now.isoformat() if given_up else None,
+                "worker_id": None,
+                "lease_expires_at": None,
+            }})
+            if given_up:
+                logger.warning(f"Webhook event {event['id']} given up after {attempts} attempts: {error}")
+            return
+
+        await self.db.inbound_webhooks.update_one(query, {"$set": {
+            "status": "processed",
+            "attempts": attempts,
+            "result": result,
+            "error": None,
+            "processed_at": _now().isoformat(),
+            "worker_id": None,
+            "lease_expires_at": None,
+        }})
@@ -0,0 +1,39 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Make backend modules (services.*) importable from the tests
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+@pytest.fixture(scope="session")
+def mongo_client():
+    """Synchronous client for test setup, skipped when MongoDB is unreachable (pinged once)"""
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("MongoDB not reachable - skipping database tests")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def motor_db(request, mongo_client):
+    """Fresh scratch database per test, skipped when MongoDB is unreachable"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    module = request.module.__name__.rsplit(".", 1)[-1].removeprefix("test_")
+    db_name = f"eaziwage_{module}_test_{uuid.uuid4().hex[:8]}"
+    motor_client = AsyncIOMotorClient(MONGO_URL)
+    yield motor_client[db_name]
+    motor_client.close()
+    mongo_client.drop_database(db_name)
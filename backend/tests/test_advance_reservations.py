@@ -0,0 +1,125 @@
+"""
+Test race-free advance reservation
+- 100 parallel reservations against one employee never hold more than the earned wages
+- Release / settle keep reserved_amount consistent
+- 100 parallel POST /api/advances as the demo employee never exceed the available wages
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from services import advance_reservations
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+EMPLOYEE_EMAIL = "demo.employee@eaziwage.com"
+EMPLOYEE_PASSWORD = "Employee@123"
+ADMIN_EMAIL = "superadmin@eaziwage.com"
+ADMIN_PASSWORD = "Admin@12345"
+
+PARALLEL_REQUESTS = 100
+
+
+def _employee(**overrides):
+    doc = {"id": "ee-1", "user_id": "u-1", "status": "approved", "kyc_status": "approved",
+           "earned_wages": 10000, "advance_limit": 5000}
+    doc.update(overrides)
+    return doc
+
+
+class TestReservationStress:
+    """Parallel reservations against a scratch database"""
+
+    def test_parallel_reservations_never_exceed_wages(self, motor_db):
+        async def run():
+            await motor_db.employees.insert_one(_employee())
+            results = await asyncio.gather(*[
+                advance_reservations.reserve(motor_db, "u-1", 700) for _ in range(PARALLEL_REQUESTS)
+            ])
+            granted = [r for r in results if r]
+            employee = await motor_db.employees.find_one({"id": "ee-1"})
+            assert len(granted) == 10000 // 700
+            assert employee["reserved_amount"] == len(granted) * 700
+            assert employee["reserved_amount"] <= employee["earned_wages"]
+
+        asyncio.run(run())
+
+    def test_conditions_checked_in_the_update(self, motor_db):
+        async def run():
+            await motor_db.employees.insert_many([
+                _employee(),
+                _employee(id="ee-2", user_id="u-2", kyc_status="pending"),
+            ])
+            assert await advance_reservations.reserve(motor_db, "u-1", 5001) is None  # over advance_limit
+            assert await advance_reservations.reserve(motor_db, "u-2", 100) is None  # not verified
+            assert await advance_reservations.reserve(motor_db, "u-missing", 100) is None
+
+        asyncio.run(run())
+
+    def test_release_and_settle(self, motor_db):
+        async def run():
+            await motor_db.employees.insert_one(_employee())
+            await advance_reservations.reserve(motor_db, "u-1", 3000)
+            await advance_reservations.reserve(motor_db, "u-1", 2000)
+            pending = {"employee_id": "ee-1", "amount": 3000, "reserved_amount": 3000, "status": "pending"}
+
+            await advance_reservations.settle(motor_db, pending)
+            await advance_reservations.release(motor_db, {**pending, "amount": 2000, "reserved_amount": 2000})
+            # Releasing an advance that was no longer pending is a no-op
+            await advance_reservations.release(motor_db, {**pending, "status": "approved"})
+
+            employee = await motor_db.employees.find_one({"id": "ee-1"})
+            assert employee["reserved_amount"] == 0
+            assert employee["earned_wages"] == 7000
+
+        asyncio.run(run())
+
+
+def _login(email, password):
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        pytest.skip(f"Login failed for {email} - skipping live reservation test")
+    return {"Authorization": f"Bearer {response.json().get('access_token')}"}
+
+
+class TestCreateAdvanceStress:
+    """Parallel POST /api/advances against a running server"""
+
+    def test_parallel_requests_respect_earned_wages(self):
+        if not BASE_URL:
+            pytest.skip("REACT_APP_BACKEND_URL not set")
+        employee_headers = _login(EMPLOYEE_EMAIL, EMPLOYEE_PASSWORD)
+        admin_headers = _login(ADMIN_EMAIL, ADMIN_PASSWORD)
+
+        profile = requests.get(f"{BASE_URL}/api/employees/me", headers=employee_headers)
+        if profile.status_code != 200:
+            pytest.skip("Demo employee profile unavailable")
+        earned_wages = profile.json().get("earned_wages", 0)
+        advance_limit = profile.json().get("advance_limit", 0)
+        amount = int(min(advance_limit, earned_wages / 10))
+        if amount < 1:
+            pytest.skip("Demo employee has no earned wages to advance against")
+
+        def request_advance(_):
+            return requests.post(f"{BASE_URL}/api/advances", headers=employee_headers, json={
+                "amount": amount, "disbursement_method": "mobile_money", "reason": "reservation stress test"
+            })
+
+        with ThreadPoolExecutor(max_workers=PARALLEL_REQUESTS) as pool:
+            responses = list(pool.map(request_advance, range(PARALLEL_REQUESTS)))
+
+        created = [r.json() for r in responses if r.status_code == 200]
+        try:
+            assert all(r.status_code in (200, 400) for r in responses)
+            held = sum(a["amount"] for a in created if a["status"] == "pending")
+            assert held <= earned_wages, f"Reserved {held} against {earned_wages} earned"
+        finally:
+            # Release the holds again
+            for advance in created:
+                if advance["status"] == "pending":
+                    requests.patch(f"{BASE_URL}/api/advances/{advance['id']}/reject",
+                                   headers=admin_headers, params={"reason": "reservation stress test"})
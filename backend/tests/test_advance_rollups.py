@@ -0,0 +1,123 @@
+"""
+Test incrementally maintained advance rollups
+- Creating advances and moving them between statuses keeps buckets exact
+- Incremental buckets match a full rebuild from the advances collection
+- Report queries read totals and monthly figures from the buckets
+"""
+
+import asyncio
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from services.advance_rollups import (
+    ROLLUP_COLLECTION, record_advances, record_advance, move_advance,
+    rebuild_rollups, monthly_breakdown, totals_by
+)
+
+SETTLED = ["approved", "disbursed", "repaid"]
+
+
+def _advance(employer_id, created_at, status="pending", amount=1000, country=None):
+    return {
+        "id": str(uuid.uuid4()),
+        "employer_id": employer_id,
+        "amount": amount,
+        "fee_amount": amount * 0.05,
+        "status": status,
+        "country": country,
+        "created_at": created_at.isoformat(),
+    }
+
+
+async def _buckets(db):
+    rows = await db[ROLLUP_COLLECTION].find({"count": {"$ne": 0}}, {"_id": 0}).to_list(None)
+    return sorted(
+        ((r["day"], r["employer_id"], r["country"], r["status"], r["count"], round(r["amount"], 2), round(r["fee_amount"], 2))
+         for r in rows)
+    )
+
+
+class TestIncrementalRollups:
+    """Incremental $inc maintenance agrees with a rebuild"""
+
+    def test_incremental_matches_rebuild(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.employers.insert_many([
+                {"id": "er-ke", "country": "KE"},
+                {"id": "er-ug", "country": "UG"},
+            ])
+            now = datetime.now(timezone.utc)
+            rng = random.Random(7)
+            advances = []
+            for i in range(200):
+                employer_id = rng.choice(["er-ke", "er-ug"])
+                advances.append(_advance(
+                    employer_id, now - timedelta(days=rng.randint(0, 90)),
+                    amount=rng.randint(500, 20000),
+                    country="KE" if employer_id == "er-ke" else "UG"
+                ))
+            await db.advances.insert_many([dict(a) for a in advances])
+            await record_advances(db, advances)
+
+            # Walk a subset through the lifecycle the API drives
+            for advance in advances[:150]:
+                for new_status in rng.choice([["approved", "disbursing", "disbursed"], ["rejected"], ["approved"]]):
+                    before = await db.advances.find_one_and_update(
+                        {"id": advance["id"]}, {"$set": {"status": new_status}}, projection={"_id": 0}
+                    )
+                    await move_advance(db, before, new_status)
+
+            incremental = await _buckets(db)
+            await rebuild_rollups(db)
+            assert incremental == await _buckets(db)
+
+        asyncio.run(run())
+
+    def test_country_falls_back_to_employer(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.employers.insert_one({"id": "er-tz", "country": "TZ"})
+            await record_advance(db, _advance("er-tz", datetime.now(timezone.utc)))
+            assert set((await totals_by(db, "country")).keys()) == {"TZ"}
+
+        asyncio.run(run())
+
+    def test_same_status_move_is_noop(self, motor_db):
+        async def run():
+            db = motor_db
+            advance = _advance("er-1", datetime.now(timezone.utc), status="approved", country="KE")
+            await record_advance(db, advance)
+            await move_advance(db, advance, "approved")
+            totals = await totals_by(db, None)
+            assert totals[None]["count"] == 1
+
+        asyncio.run(run())
+
+
+class TestRollupQueries:
+    """Report queries over the buckets"""
+
+    def test_monthly_breakdown_and_totals(self, motor_db):
+        async def run():
+            db = motor_db
+            jan = datetime(2026, 1, 15, tzinfo=timezone.utc)
+            feb = datetime(2026, 2, 3, tzinfo=timezone.utc)
+            await record_advances(db, [
+                _advance("er-1", jan, "approved", 1000, "KE"),
+                _advance("er-1", jan, "rejected", 5000, "KE"),
+                _advance("er-2", feb, "pending", 2000, "UG"),
+                _advance("er-2", feb, "repaid", 3000, "UG"),
+            ])
+
+            monthly = await monthly_breakdown(db, SETTLED)
+            assert monthly["2026-01"] == {"disbursed": 1000, "fees": 50.0, "count": 1}
+            assert monthly["2026-02"] == {"disbursed": 3000, "fees": 150.0, "count": 1}
+
+            assert (await totals_by(db, None))[None]["count"] == 4
+            by_country = await totals_by(db, "country", SETTLED)
+            assert by_country["KE"]["amount"] == 1000
+            assert by_country["UG"]["amount"] == 3000
+
+        asyncio.run(run())
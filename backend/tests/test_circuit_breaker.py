@@ -0,0 +1,164 @@
+"""
+Test payout circuit breakers
+- closed -> open after consecutive gateway failures, half-open after the cool-down
+- An open route fails fast without calling Dusupay; business errors do not trip it
+- Route health rolls up into the API Health statuses
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from services import circuit_breaker, dusupay
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, group_health
+from services.dusupay import CIRCUIT_OPEN, DusupayConfig, DusupayService
+from services.telemetry import Telemetry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """State machine"""
+
+    def test_opens_after_threshold_and_probes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("KE:safaricom_ke", failure_threshold=3, reset_seconds=30, clock=clock)
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure("TIMEOUT")
+        assert breaker.state == CLOSED
+        breaker.record_failure("TIMEOUT")
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.retry_after() == 30
+
+        clock.now += 30
+        assert breaker.state == HALF_OPEN
+        # One trial at a time
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure("GATEWAY_ERROR")
+        assert breaker.state == OPEN
+        assert breaker.times_opened == 2
+
+        clock.now += 30
+        assert breaker.allow()
+        breaker.record_success(50.0)
+        assert breaker.state == CLOSED
+        assert breaker.consecutive_failures == 0
+        assert breaker.rejected == 2
+
+    def test_success_resets_consecutive_failures(self):
+        breaker = CircuitBreaker("UG:mtn_ug", failure_threshold=2)
+        breaker.record_failure("TIMEOUT")
+        breaker.record_success()
+        breaker.record_failure("TIMEOUT")
+        assert breaker.state == CLOSED
+
+    def test_abandoned_trial_expires(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("RW:bank", failure_threshold=1, reset_seconds=10, clock=clock)
+        breaker.record_failure("NETWORK_ERROR")
+        clock.now += 10
+        assert breaker.allow()
+        assert not breaker.allow()
+        # The trial never reported back
+        clock.now += 10
+        assert breaker.allow()
+
+    def test_group_health(self):
+        closed = {"state": CLOSED, "consecutive_failures": 0}
+        assert group_health([]) == "healthy"
+        assert group_health([closed]) == "healthy"
+        assert group_health([closed, {"state": CLOSED, "consecutive_failures": 2}]) == "degraded"
+        assert group_health([closed, {"state": OPEN, "consecutive_failures": 5}]) == "degraded"
+        assert group_health([{"state": OPEN, "consecutive_failures": 5}]) == "down"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("DUSUPAY_PUBLIC_KEY", "pk")
+    monkeypatch.setenv("DUSUPAY_SECRET_KEY", "sk")
+    monkeypatch.setenv("DUSUPAY_RETRY_BASE_DELAY", "0.001")
+    monkeypatch.setenv("DUSUPAY_PAYOUT_MAX_ATTEMPTS", "2")
+    breakers = CircuitBreakers(failure_threshold=3, reset_seconds=60)
+    monkeypatch.setattr(dusupay, "payout_circuits", breakers)
+    monkeypatch.setattr(circuit_breaker, "payout_circuits", breakers)
+    monkeypatch.setattr(dusupay, "telemetry", Telemetry())
+    calls = []
+
+    def install(handler):
+        def record(request):
+            calls.append(request.url.path)
+            return handler(request)
+
+        client = httpx.AsyncClient(base_url="https://gateway.test/v1", transport=httpx.MockTransport(record))
+        monkeypatch.setattr(dusupay, "_http_client", client)
+        return DusupayService(DusupayConfig())
+
+    install.calls = calls
+    install.breakers = breakers
+    return install
+
+
+def _payout(service, provider="mpesa"):
+    return service.create_mobile_money_payout(
+        amount=1000, country_code="KE", provider_name=provider, phone_number="+254700000000",
+        recipient_name="Jane", reference="EWA-1"
+    )
+
+
+class TestPayoutCircuit:
+    """DusupayService behind the breaker"""
+
+    def test_open_route_fails_fast(self, service):
+        def handler(request):
+            if request.url.path.endswith("/status"):
+                return httpx.Response(404, json={"message": "Transaction not found"})
+            raise httpx.ConnectTimeout("down")
+
+        dusupay_service = service(handler)
+
+        async def run():
+            first = await _payout(dusupay_service)
+            assert first.error_code == "TIMEOUT"
+            assert first.circuit == "KE:safaricom_ke"
+            # Third consecutive timeout opens the breaker; the retry is refused
+            second = await _payout(dusupay_service)
+            assert second.error_code == CIRCUIT_OPEN
+            assert [a["outcome"] for a in second.attempts] == ["TIMEOUT", CIRCUIT_OPEN]
+
+            posts = len(service.calls)
+            third = await _payout(dusupay_service)
+            assert third.error_code == CIRCUIT_OPEN
+            assert len(service.calls) == posts
+
+            # Another provider in the same country is unaffected
+            assert service.breakers.state("KE:airtel_ke") == CLOSED
+            status = await dusupay_service.check_payout_status("EWA-1", "KE:safaricom_ke")
+            assert status.error_code == CIRCUIT_OPEN
+            # Refused calls never reached the gateway and are not in the latency figures
+            assert dusupay.telemetry.snapshot("mpesa")["total_errors"] == 3
+
+        asyncio.run(run())
+
+    def test_business_errors_do_not_trip(self, service):
+        dusupay_service = service(lambda request: httpx.Response(400, json={"code": 400, "message": "Invalid account"}))
+
+        async def run():
+            for _ in range(5):
+                response = await _payout(dusupay_service)
+                assert response.error_code == "400"
+            snapshot = service.breakers.get("KE:safaricom_ke").snapshot()
+            assert (snapshot["state"], snapshot["successes"], snapshot["failures"]) == (CLOSED, 5, 0)
+            live = dusupay.telemetry.snapshot("mpesa")
+            assert (live["total_calls"], live["total_errors"], live["status"]) == (5, 0, "healthy")
+
+        asyncio.run(run())
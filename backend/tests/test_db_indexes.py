@@ -0,0 +1,112 @@
+"""
+Test MongoDB index bootstrap
+- Reconciles the declared index set into a scratch database
+- Runs the API's hot queries and asserts each one is served by an index via explain()
+- Checks drift reporting for missing / changed / extra indexes
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from services.db_indexes import INDEXES, reconcile_indexes, diff_indexes
+
+
+@pytest.fixture
+def test_db(motor_db, mongo_client):
+    """Scratch database with the declared indexes applied, through the synchronous client for explain()"""
+    asyncio.run(reconcile_indexes(motor_db))
+    db = mongo_client[motor_db.name]
+
+    # Seed enough rows that the planner has a real choice to make
+    now = datetime.now(timezone.utc)
+    db.users.insert_many([{"id": str(uuid.uuid4()), "email": f"user{i}@test.com"} for i in range(50)])
+    db.employees.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "employer_id": f"er-{i % 5}",
+         "employee_code": f"EMP-{i:04d}", "status": "approved", "kyc_status": "approved"}
+        for i in range(50)
+    ])
+    db.advances.insert_many([
+        {"id": str(uuid.uuid4()), "employee_id": f"ee-{i % 10}", "employer_id": f"er-{i % 5}",
+         "status": "pending", "created_at": (now - timedelta(hours=i)).isoformat()}
+        for i in range(50)
+    ])
+    db.disbursements.insert_many([
+        {"merchant_reference": f"EWA-{i}", "advance_id": str(uuid.uuid4())} for i in range(50)
+    ])
+    db.audit_trail.insert_many([
+        {"id": str(uuid.uuid4()), "type": "platform_settings", "changed_at": (now - timedelta(minutes=i)).isoformat()}
+        for i in range(50)
+    ])
+
+    return db
+
+
+def _stages(plan: dict) -> list:
+    """Flatten the stage names of a winning plan"""
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return stages
+
+
+def _assert_uses_index(cursor):
+    explain = cursor.explain()
+    stages = _stages(explain["queryPlanner"]["winningPlan"])
+    assert "COLLSCAN" not in stages, f"Query fell back to a collection scan: {stages}"
+    assert "IXSCAN" in stages or "IDHACK" in stages or "EXPRESS_IXSCAN" in stages, f"No index stage: {stages}"
+
+
+class TestHotQueriesUseIndexes:
+    """Each hot query from server.py must be index-backed"""
+
+    def test_user_by_id(self, test_db):
+        _assert_uses_index(test_db.users.find({"id": "x"}).limit(1))
+
+    def test_user_by_email(self, test_db):
+        _assert_uses_index(test_db.users.find({"email": "user1@test.com"}).limit(1))
+
+    def test_employee_by_user_id(self, test_db):
+        _assert_uses_index(test_db.employees.find({"user_id": "x"}).limit(1))
+
+    def test_employee_by_employer_and_code(self, test_db):
+        _assert_uses_index(test_db.employees.find({"employer_id": "er-1", "employee_code": "EMP-0001"}).limit(1))
+
+    def test_advances_by_employee_since(self, test_db):
+        since = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+        _assert_uses_index(test_db.advances.find({"employee_id": "ee-1", "created_at": {"$gte": since}}))
+
+    def test_advances_by_employer_sorted(self, test_db):
+        _assert_uses_index(test_db.advances.find({"employer_id": "er-1"}).sort("created_at", -1))
+
+    def test_disbursement_by_merchant_reference(self, test_db):
+        _assert_uses_index(test_db.disbursements.find({"merchant_reference": "EWA-1"}).limit(1))
+
+    def test_audit_trail_sorted_by_changed_at(self, test_db):
+        _assert_uses_index(test_db.audit_trail.find({}).sort("changed_at", -1).limit(100))
+
+
+class TestIndexDrift:
+    """Drift detection between declared and live indexes"""
+
+    def test_no_drift_after_reconcile(self, test_db):
+        for collection, models in INDEXES.items():
+            drift = diff_indexes(models, test_db[collection].index_information())
+            assert not drift["missing"], f"{collection} missing {drift['missing']}"
+            assert not drift["changed"], f"{collection} changed {drift['changed']}"
+
+    def test_diff_reports_missing_changed_and_extra(self):
+        live = {
+            "_id_": {"key": [("_id", 1)]},
+            "email_1": {"key": [("email", 1)]},  # declared unique, live is not
+            "phone_1": {"key": [("phone", 1)]},  # not declared
+        }
+        drift = diff_indexes(INDEXES["users"], live)
+        assert drift["missing"] == ["id_unique"]
+        assert len(drift["changed"]) == 1 and drift["changed"][0].startswith("email_unique")
+        assert drift["extra"] == ["phone_1"]
@@ -0,0 +1,348 @@
+"""
+Test batch disbursement
+- Provider rate limiting and round-robin ordering
+- A batch pays every claimable approved advance once and records per-item outcomes
+- Locked advances are skipped; advances without payout details fail without a payout
+- Payouts refused by an open circuit breaker are queued and re-sent on the same reference
+- A payout that timed out on every attempt keeps its reference; re-disbursing never pays twice
+- A batch payout that raises is flagged for manual review and never claimed again until cleared
+- A batch claims a chunk at a time; a payout whose lock went stale and was taken over is not sent
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from services import circuit_breaker, disbursements, dusupay as dusupay_module
+from services.disbursements import (
+    PayoutQueue, ProviderRateLimiter, claim, clear_review, disburse_one, interleave_by, new_batch, run_batch
+)
+from services.dusupay import CIRCUIT_OPEN, DusupayConfig, DusupayService, MockDusupayService, PayoutResponse
+
+
+class TestScheduling:
+    """Rate limiter and ordering"""
+
+    def test_rate_limit_per_provider(self):
+        async def run():
+            limiter = ProviderRateLimiter(rate_per_second=20)
+            started = time.monotonic()
+            sent = {}
+
+            async def send(key, i):
+                await limiter.acquire(key)
+                sent[(key, i)] = time.monotonic() - started
+
+            await asyncio.gather(*[send(key, i) for key in ("KE:mpesa", "UG:mtn") for i in range(5)])
+            for key in ("KE:mpesa", "UG:mtn"):
+                times = sorted(t for (k, _), t in sent.items() if k == key)
+                assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+            # Different providers do not wait for each other
+            assert sent[("UG:mtn", 0)] < 0.02
+
+        asyncio.run(run())
+
+    def test_interleave_by(self):
+        items = [{"p": "a"}, {"p": "a"}, {"p": "a"}, {"p": "b"}, {"p": "c"}]
+        assert [i["p"] for i in interleave_by(items, lambda i: i["p"])] == ["a", "b", "c", "a", "a"]
+
+
+async def _seed(db, count):
+    await db.employers.insert_one({"id": "er-1", "country": "UG"})
+    await db.users.insert_many([{"id": f"u-{i}", "full_name": f"Employee {i}"} for i in range(count)])
+    await db.employees.insert_many([
+        {"id": f"ee-{i}", "user_id": f"u-{i}", "employer_id": "er-1", "mobile_money_number": f"+2567{i:08d}"}
+        for i in range(count)
+    ])
+    await db.advances.insert_many([
+        {"id": f"adv-{i}", "employee_id": f"ee-{i}", "employer_id": "er-1", "country": "UG", "amount": 1000,
+         "net_amount": 950, "status": "approved", "disbursement_method": "mobile_money",
+         "disbursement_details": {"provider": "mtn" if i % 2 else "airtel"}, "created_at": f"2026-01-01T00:00:{i:02d}"}
+        for i in range(count)
+    ])
+
+
+class TestRunBatch:
+    """Batches against a scratch database and the mock gateway"""
+
+    def test_batch_outcomes(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 12)
+            # Already being disbursed by someone else
+            await claim(db, ["adv-0"], "single-request")
+            # Nothing to pay out to
+            await db.employees.update_one({"id": "ee-1"}, {"$unset": {"mobile_money_number": ""}})
+
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, MockDusupayService(), batch, concurrency=4,
+                                     limiter=ProviderRateLimiter(1000))
+
+            assert result["status"] == "completed"
+            assert (result["total"], result["skipped"], result["initiated"], result["failed"]) == (11, 1, 10, 1)
+            assert result["payouts_per_second"] > 0
+
+            items = await db.disbursement_batch_items.find({"batch_id": batch["id"]}).to_list(None)
+            assert len(items) == 11
+            failed = [i for i in items if i["status"] == "failed"]
+            assert [(i["advance_id"], i["error"]) for i in failed] == [
+                ("adv-1", "Mobile money number not configured for employee")]
+
+            assert await db.advances.count_documents({"status": "disbursing"}) == 10
+            assert await db.disbursements.count_documents({}) == 10
+            assert await db.transactions.count_documents({"type": "disbursement"}) == 10
+            # Only the other request's lock is left
+            assert await db.advances.count_documents({"disbursement_lock": {"$exists": True}}) == 1
+
+        asyncio.run(run())
+
+    def test_overlapping_batches_pay_once(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 20)
+            dusupay = MockDusupayService(latency_seconds=0.01)
+            batches = [new_batch("admin-1", None, 100) for _ in range(3)]
+            await db.disbursement_batches.insert_many([dict(b) for b in batches])
+
+            results = await asyncio.gather(*[run_batch(db, dusupay, b, limiter=ProviderRateLimiter(1000)) for b in batches])
+            assert sum(r["initiated"] for r in results) == 20
+            assert await db.disbursements.count_documents({}) == 20
+
+        asyncio.run(run())
+
+
+class FlakyRouteDusupay(MockDusupayService):
+    """Mock gateway whose routes time out and then trip their breaker while `down`"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = True
+
+    async def create_mobile_money_payout(self, amount, country_code, provider_name, *args, reference=None, **kwargs):
+        if self.down:
+            return PayoutResponse(
+                success=False, message="paused", merchant_reference=reference, error_code=CIRCUIT_OPEN,
+                circuit=f"{country_code}:{self.get_provider_id(country_code, provider_name)}",
+                attempts=[{"attempt": 1, "outcome": "TIMEOUT"}, {"attempt": 2, "outcome": CIRCUIT_OPEN}]
+            )
+        return await super().create_mobile_money_payout(
+            amount, country_code, provider_name, *args, reference=reference, **kwargs)
+
+
+class CrashingDusupay(MockDusupayService):
+    """Mock gateway that raises after the payout may have gone out"""
+
+    async def create_mobile_money_payout(self, *args, **kwargs):
+        await super().create_mobile_money_payout(*args, **kwargs)
+        raise RuntimeError("connection reset after send")
+
+
+class TestManualReview:
+    """Advances whose payout raised part-way through a batch"""
+
+    def test_crashed_payout_flagged_until_cleared(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 1)
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, CrashingDusupay(), batch, limiter=ProviderRateLimiter(1000))
+            assert result["failed"] == 1
+            item = await db.disbursement_batch_items.find_one({"batch_id": batch["id"]})
+            assert (item["needs_review"], item["error"]) == (True, "connection reset after send")
+
+            advance = await db.advances.find_one({"id": "adv-0"})
+            assert advance["disbursement_review"]["reason"] == "connection reset after send"
+            # Even once the lock is stale the advance is not claimed again
+            await db.advances.update_one({"id": "adv-0"}, {"$set": {"disbursement_locked_at": "2000-01-01T00:00:00"}})
+            assert await claim(db, ["adv-0"], "later-request") == 0
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, MockDusupayService(), batch, limiter=ProviderRateLimiter(1000))
+            assert (result["total"], result["skipped"]) == (0, 1)
+
+            assert await clear_review(db, "adv-0")
+            assert not await clear_review(db, "adv-0")
+            assert await claim(db, ["adv-0"], "after-review") == 1
+
+        asyncio.run(run())
+
+
+class InterruptingDusupay(MockDusupayService):
+    """Mock gateway that runs `during_payout` while its first payout is in flight"""
+
+    def __init__(self, during_payout):
+        super().__init__()
+        self.during_payout = during_payout
+        self.sent = []
+
+    async def create_mobile_money_payout(self, *args, reference=None, **kwargs):
+        self.sent.append(reference)
+        if len(self.sent) == 1:
+            await self.during_payout()
+        return await super().create_mobile_money_payout(*args, reference=reference, **kwargs)
+
+
+class TestLockExpiry:
+    """Locks that go stale while a batch is still running"""
+
+    def test_stale_lock_taken_over_is_not_paid(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 1)
+            assert await claim(db, ["adv-0"], "batch-1") == 1
+            advance = await db.advances.find_one({"id": "adv-0"}, {"_id": 0})
+            # batch-1 stalled past the lock timeout and another request took the advance over
+            await db.advances.update_one({"id": "adv-0"}, {"$set": {"disbursement_locked_at": "2000-01-01T00:00:00"}})
+            assert await claim(db, ["adv-0"], "second-request") == 1
+
+            dusupay = InterruptingDusupay(None)
+            employee = await db.employees.find_one({"id": "ee-0"}, {"_id": 0})
+            outcome = await disburse_one(db, dusupay, advance, employee, None, None)
+            assert outcome["status"] == "skipped"
+            assert dusupay.sent == []
+            assert (await db.advances.find_one({"id": "adv-0"}))["disbursement_lock"] == "second-request"
+
+        asyncio.run(run())
+
+    def test_batch_claims_chunk_before_paying_it(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 4)
+            # One provider, so the limiter holds adv-1 back while adv-0 is in flight
+            await db.advances.update_many({}, {"$set": {"disbursement_details.provider": "airtel"}})
+
+            async def second_claimer():
+                # Only the first chunk is locked; the batch stalls past the lock timeout
+                locked = await db.advances.find({"disbursement_lock": batch["id"]}).to_list(None)
+                assert sorted(a["id"] for a in locked) == ["adv-0", "adv-1"]
+                await db.advances.update_many({}, {"$set": {"disbursement_locked_at": "2000-01-01T00:00:00"}})
+                assert await claim(db, ["adv-1", "adv-2"], "second-request") == 2
+
+            dusupay = InterruptingDusupay(second_claimer)
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, dusupay, batch, concurrency=2, limiter=ProviderRateLimiter(5))
+
+            # adv-1 lost its lock before its send, adv-2 was taken before its chunk was claimed
+            assert (result["total"], result["skipped"], result["initiated"]) == (3, 2, 2)
+            disbursements = await db.disbursements.find({}, {"_id": 0}).to_list(None)
+            assert sorted(d["advance_id"] for d in disbursements) == ["adv-0", "adv-3"]
+            assert len(dusupay.sent) == 2
+            second = await db.advances.find({"disbursement_lock": "second-request"}).to_list(None)
+            assert sorted(a["id"] for a in second) == ["adv-1", "adv-2"]
+
+        asyncio.run(run())
+
+
+class TestPayoutQueue:
+    """Queueing while a route is open and draining afterwards"""
+
+    def test_queue_and_drain(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, 4)
+            dusupay = FlakyRouteDusupay()
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, dusupay, batch, limiter=ProviderRateLimiter(1000))
+            assert (result["queued"], result["initiated"], result["failed"]) == (4, 0, 0)
+
+            queued = await db.advances.find({"payout_queue": {"$ne": None}}, {"_id": 0}).to_list(None)
+            assert len(queued) == 4
+            assert all(a["status"] == "approved" and "disbursement_lock" not in a for a in queued)
+            # The timed-out attempt may have reached Dusupay, so its reference is kept
+            references = {a["id"]: a["payout_queue"]["reference"] for a in queued}
+            assert all(references.values())
+            assert {a["payout_queue"]["key"] for a in queued} == {"UG:mtn_ug", "UG:airtel_ug"}
+
+            dusupay.down = False
+            drained = await PayoutQueue(db, lambda: dusupay).drain()
+            assert (drained["requested_by"], drained["initiated"]) == ("payout-queue", 4)
+            disbursements = await db.disbursements.find({}, {"_id": 0}).to_list(None)
+            assert {d["advance_id"]: d["merchant_reference"] for d in disbursements} == references
+            assert await db.advances.count_documents({"payout_queue": {"$exists": True}}) == 0
+            assert await PayoutQueue(db, lambda: dusupay).drain() is None
+
+        asyncio.run(run())
+
+
+class TimeoutGateway:
+    """Dusupay that times out every payout POST until `up`, recording the references posted"""
+
+    def __init__(self):
+        self.up = False
+        self.posted = []
+        self.accepted = {}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/payouts/status"):
+            reference = request.url.params["merchant_reference"]
+            if reference in self.accepted:
+                return httpx.Response(200, json={"data": {
+                    "internal_reference": self.accepted[reference], "transaction_status": "PENDING"}})
+            return httpx.Response(404, json={"code": 404, "message": "Transaction not found"})
+        reference = json.loads(request.content)["merchant_reference"]
+        self.posted.append(reference)
+        if not self.up:
+            raise httpx.ReadTimeout("slow")
+        self.accepted[reference] = f"DUSU-{len(self.accepted) + 1}"
+        return httpx.Response(202, json={"message": "Transaction Initiated", "data": {
+            "internal_reference": self.accepted[reference], "merchant_reference": reference,
+            "transaction_status": "PENDING"}})
+
+
+@pytest.fixture
+def timeout_dusupay(monkeypatch):
+    monkeypatch.setenv("DUSUPAY_PUBLIC_KEY", "pk")
+    monkeypatch.setenv("DUSUPAY_SECRET_KEY", "sk")
+    monkeypatch.setenv("DUSUPAY_RETRY_BASE_DELAY", "0.001")
+    monkeypatch.setenv("DUSUPAY_PAYOUT_MAX_ATTEMPTS", "3")
+    # Fresh breakers: three timeouts must not trip a breaker left over from another test
+    breakers = circuit_breaker.CircuitBreakers()
+    for module in (dusupay_module, disbursements):
+        monkeypatch.setattr(module, "payout_circuits", breakers)
+    gateway = TimeoutGateway()
+    client = httpx.AsyncClient(base_url="https://gateway.test/v1", transport=httpx.MockTransport(gateway))
+    monkeypatch.setattr(dusupay_module, "_http_client", client)
+    return gateway, DusupayService(DusupayConfig())
+
+
+class TestUnclearPayouts:
+    """Payouts whose retries ran out without Dusupay saying yes or no"""
+
+    def test_timed_out_payout_not_paid_twice(self, motor_db, timeout_dusupay):
+        async def run():
+            db = motor_db
+            gateway, service = timeout_dusupay
+            await _seed(db, 1)
+
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, service, batch, limiter=ProviderRateLimiter(1000))
+            assert (result["queued"], result["failed"]) == (1, 0)
+            assert len(gateway.posted) == 3
+
+            advance = await db.advances.find_one({"id": "adv-0"}, {"_id": 0})
+            assert advance["status"] == "approved" and "disbursement_lock" not in advance
+            assert advance["payout_queue"]["sent"]
+            assert advance["payout_queue"]["reference"] == gateway.posted[0]
+
+            # Re-disburse: the status check comes first, then a POST on the same reference
+            gateway.up = True
+            batch = new_batch("admin-1", None, 100)
+            await db.disbursement_batches.insert_one(batch)
+            result = await run_batch(db, service, batch, limiter=ProviderRateLimiter(1000))
+            assert result["initiated"] == 1
+            assert len(gateway.posted) == 4
+            assert set(gateway.posted) == {advance["payout_queue"]["reference"]}
+
+            disbursement = await db.disbursements.find_one({"advance_id": "adv-0"})
+            assert disbursement["merchant_reference"] == gateway.posted[0]
+            assert await db.disbursements.count_documents({}) == 1
+
+        asyncio.run(run())
@@ -0,0 +1,99 @@
+"""
+Test the shared Dusupay HTTP client
+- Every service instance uses one pooled client with the configured limits and timeouts
+- Connection reuse is counted against a local keep-alive server
+- Closing releases the client; the next use opens a fresh one
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import dusupay
+from services.dusupay import DusupayConfig, DusupayService, close_http_client, http_client, http_client_stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(0.02)
+        body = json.dumps({"data": {"transaction_status": "COMPLETED"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Local keep-alive HTTP server standing in for the Dusupay API"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("DUSUPAY_PUBLIC_KEY", "pk")
+    monkeypatch.setenv("DUSUPAY_SECRET_KEY", "sk")
+    monkeypatch.setenv("DUSUPAY_MAX_CONNECTIONS", "3")
+    monkeypatch.setenv("DUSUPAY_CONNECT_TIMEOUT", "2")
+    monkeypatch.setattr(dusupay, "client_stats", dusupay.ClientStats())
+    config = DusupayConfig()
+    config.sandbox_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield config
+    server.shutdown()
+    server.server_close()
+
+
+class TestSharedClient:
+    """Pool sharing, reuse statistics and shutdown"""
+
+    def test_instances_share_one_pool(self, gateway):
+        async def run():
+            first, second = DusupayService(gateway), DusupayService(gateway)
+            assert first.client is second.client
+            timeout = first.client.timeout
+            assert (timeout.connect, timeout.read) == (2.0, 30.0)
+            await close_http_client()
+
+        asyncio.run(run())
+
+    def test_connections_are_reused(self, gateway):
+        async def run():
+            service = DusupayService(gateway)
+            for _ in range(5):
+                status = await service.check_payout_status("EWA-1")
+                assert status.status == "COMPLETED"
+
+            stats = http_client_stats()
+            assert stats["requests"] == 5
+            assert stats["connections_opened"] == 1
+            assert stats["connections_reused"] == 4
+            assert stats["http_versions"] == {"HTTP/1.1": 5}
+
+            # A burst never opens more than max_connections
+            await asyncio.gather(*[service.check_payout_status(f"EWA-{i}") for i in range(12)])
+            stats = http_client_stats()
+            assert stats["connections_opened"] <= 3
+            assert stats["peak_in_flight"] == 12
+            assert stats["in_flight"] == 0
+            await close_http_client()
+
+        asyncio.run(run())
+
+    def test_close_and_reopen(self, gateway):
+        async def run():
+            client = http_client(gateway)
+            await close_http_client()
+            assert client.is_closed
+            assert http_client_stats()["open"] is False
+            assert http_client(gateway) is not client
+            await close_http_client()
+
+        asyncio.run(run())
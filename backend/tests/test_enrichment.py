@@ -0,0 +1,69 @@
+"""
+Test batch enrichment helpers
+- Key collection skips empties and duplicates
+- fetch_by_keys joins with one $in query and keeps the key in inclusion projections
+- count_by groups counts per key
+"""
+
+import asyncio
+import uuid
+
+from services.enrichment import collect_keys, fetch_by_keys, fetch_related, count_by
+
+
+class TestCollectKeys:
+    """Foreign key collection"""
+
+    def test_distinct_in_order_without_empties(self):
+        docs = [{"employer_id": "b"}, {"employer_id": None}, {"employer_id": "a"}, {}, {"employer_id": "b"}, {"employer_id": ""}]
+        assert collect_keys(docs, "employer_id") == ["b", "a"]
+
+
+class TestBatchLookups:
+    """Joins against a scratch database"""
+
+    def test_fetch_related_joins_page(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.users.insert_many([
+                {"id": "u1", "full_name": "Jane", "email": "jane@test.com", "password_hash": "x"},
+                {"id": "u2", "full_name": "John", "email": "john@test.com", "password_hash": "y"},
+            ])
+            employers = [{"id": "e1", "user_id": "u1"}, {"id": "e2", "user_id": "u2"}, {"id": "e3", "user_id": "missing"}]
+
+            users = await fetch_related(db.users, employers, "user_id", projection={"_id": 0, "password_hash": 0})
+            assert set(users) == {"u1", "u2"}
+            assert "password_hash" not in users["u1"]
+
+            # Inclusion projections still carry the join key
+            names = await fetch_related(db.users, employers, "user_id", projection={"_id": 0, "full_name": 1})
+            assert names["u2"] == {"id": "u2", "full_name": "John"}
+
+        asyncio.run(run())
+
+    def test_fetch_by_keys_first_match_wins(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.employee_settings.insert_many([
+                {"employee_id": "ee1", "version": 1},
+                {"employee_id": "ee1", "version": 2},
+            ])
+            settings = await fetch_by_keys(db.employee_settings, ["ee1", "ee2"], key_field="employee_id", projection={"_id": 0})
+            assert list(settings) == ["ee1"]
+            assert settings["ee1"]["version"] == 1
+            assert await fetch_by_keys(db.employee_settings, [None, ""]) == {}
+
+        asyncio.run(run())
+
+    def test_count_by(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.employees.insert_many(
+                [{"id": str(uuid.uuid4()), "employer_id": "e1"} for _ in range(3)]
+                + [{"id": str(uuid.uuid4()), "employer_id": "e2"}]
+            )
+            counts = await count_by(db.employees, "employer_id", ["e1", "e2", "e3"])
+            assert counts == {"e1": 3, "e2": 1}
+            assert counts.get("e3", 0) == 0
+
+        asyncio.run(run())
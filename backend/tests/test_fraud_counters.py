@@ -0,0 +1,136 @@
+"""
+Test sliding-window velocity counters
+- Replays timestamped request sequences and checks count / sum answers against a brute-force recount
+- Replays create_advance traffic through the fraud engine and compares with the original
+  per-request advances queries for the frequency and velocity rules
+- Windows are seeded from existing advances and pruned as they age
+"""
+
+import asyncio
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from services.fraud_counters import COUNTER_COLLECTION, RETENTION, SlidingWindow, load_window, record_event
+from services.fraud_engine import FraudContext, FraudEngine
+
+START = datetime(2026, 3, 1, 8, 0, tzinfo=timezone.utc)
+
+
+def _replay(seed, n=300):
+    """A bursty request sequence: gaps from seconds to hours, as (datetime, amount)"""
+    rng = random.Random(seed)
+    at, events = START, []
+    for _ in range(n):
+        at += timedelta(seconds=rng.choice([5, 30, 90, 600, 3600, 5 * 3600, 20 * 3600]))
+        events.append((at, rng.randint(500, 25000)))
+    return events
+
+
+def _brute_force(history, cutoff):
+    selected = [a for t, a in history if t >= cutoff]
+    return len(selected), sum(selected)
+
+
+class TestSlidingWindowReplay:
+    """Pure window arithmetic over replayed sequences"""
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_matches_brute_force(self, seed):
+        history = []
+        for at, amount in _replay(seed):
+            window = SlidingWindow(history)
+            for span in (timedelta(minutes=1), timedelta(hours=1), timedelta(days=1)):
+                cutoff = (at - span).isoformat()
+                assert (window.count_since(cutoff), window.sum_since(cutoff)) == _brute_force(history, cutoff)
+            history.append((at.isoformat(), amount))
+
+    def test_cutoff_is_inclusive(self):
+        window = SlidingWindow([("2026-03-01T10:00:00+00:00", 100), ("2026-03-01T09:00:00+00:00", 50)])
+        assert window.count_since("2026-03-01T10:00:00+00:00") == 1
+        assert window.sum_since("2026-03-01T09:00:00+00:00") == 150
+        assert window.events()[0] == ("2026-03-01T09:00:00+00:00", 50)
+
+
+async def _legacy_check(db, employee, amount, now, frequency_threshold, velocity_threshold):
+    """The original per-request advances queries for the frequency and velocity rules"""
+    recent_count = await db.advances.count_documents({
+        "employee_id": employee["id"],
+        "created_at": {"$gte": (now - timedelta(days=1)).isoformat()}
+    })
+    triggered = set()
+    if recent_count >= frequency_threshold:
+        triggered.add("frequency")
+    if employee.get("tenure_months", 0) < 1:
+        recent = await db.advances.find({
+            "employee_id": employee["id"],
+            "created_at": {"$gte": (now - timedelta(hours=1)).isoformat()}
+        }, {"_id": 0, "amount": 1}).to_list(None)
+        if sum(a.get("amount", 0) for a in recent) + amount > velocity_threshold:
+            triggered.add("velocity")
+    return triggered
+
+
+class TestCountersAgainstAdvances:
+    """Replay create_advance traffic through record_event and the fraud engine"""
+
+    def test_replay_matches_original_queries(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.fraud_rules.insert_many([
+                {"id": "r-freq", "name": "Frequency", "type": "frequency", "threshold": 3,
+                 "severity": "medium", "action": "flag", "enabled": True},
+                {"id": "r-vel", "name": "Velocity", "type": "velocity", "threshold": 20000,
+                 "severity": "high", "action": "block", "enabled": True},
+            ])
+            engine = FraudEngine(db, flush_delay=0.01)
+            employee = {"id": "ee-new", "tenure_months": 0}
+
+            # A few advances that predate the counters collection
+            for at, amount in _replay(7, n=4):
+                await db.advances.insert_one({"id": str(uuid.uuid4()), "employee_id": employee["id"],
+                                              "amount": amount, "created_at": at.isoformat()})
+            replay_start = START + timedelta(days=1)
+
+            for at, amount in _replay(11, n=120):
+                at += replay_start - START
+                expected = await _legacy_check(db, employee, amount, at, 3, 20000)
+
+                # Evaluate as of the replayed timestamp
+                window = await load_window(db, employee["id"], at)
+                compiled = await engine.rules()
+                ctx = FraudContext(amount=amount, employee=employee, history=window, now=at)
+                got = {c.rule["type"] for c in compiled if c.evaluate(ctx)}
+                assert got == expected, f"at {at.isoformat()}"
+
+                # What create_advance does after the checks
+                await db.advances.insert_one({"id": str(uuid.uuid4()), "employee_id": employee["id"],
+                                              "amount": amount, "created_at": at.isoformat()})
+                await record_event(db, employee["id"], at.isoformat(), amount)
+            await engine.close()
+
+        asyncio.run(run())
+
+    def test_window_pruned_as_it_ages(self, motor_db):
+        async def run():
+            db = motor_db
+            await load_window(db, "ee-1", START)  # seeds an empty window
+            for hours in range(0, 48, 6):
+                at = START + timedelta(hours=hours)
+                await record_event(db, "ee-1", at.isoformat(), 1000)
+            doc = await db[COUNTER_COLLECTION].find_one({"employee_id": "ee-1"})
+            newest = START + timedelta(hours=42)
+            assert all(e["at"] >= (newest - RETENTION).isoformat() for e in doc["events"])
+            assert len(doc["events"]) == 5
+
+        asyncio.run(run())
+
+    def test_record_without_window_is_noop(self, motor_db):
+        async def run():
+            db = motor_db
+            await record_event(db, "ee-2", START.isoformat(), 1000)
+            assert await db[COUNTER_COLLECTION].count_documents({}) == 0
+
+        asyncio.run(run())
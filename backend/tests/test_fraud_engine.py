@@ -0,0 +1,98 @@
+"""
+Test the compiled fraud rule engine
+- Rule evaluators match the original amount / frequency / velocity semantics
+- The compiled rule set is cached until invalidated
+- Trigger counts are written in one batched flush
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from services.fraud_counters import SlidingWindow
+from services.fraud_engine import FraudContext, FraudEngine, compile_rules
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def _rule(rule_type, threshold, action="flag"):
+    return {"id": str(uuid.uuid4()), "name": rule_type, "type": rule_type, "threshold": threshold,
+            "severity": "high", "action": action, "enabled": True, "trigger_count": 0}
+
+
+def _ctx(amount, history=(), tenure_months=12):
+    return FraudContext(
+        amount=amount,
+        employee={"id": "ee-1", "tenure_months": tenure_months},
+        history=SlidingWindow([((NOW - age).isoformat(), amt) for age, amt in history]),
+        now=NOW
+    )
+
+
+class TestRuleEvaluators:
+    """Compiled evaluators, no database"""
+
+    def test_amount_threshold(self):
+        [rule] = compile_rules([_rule("amount_threshold", 50000)])
+        assert rule.evaluate(_ctx(50001))
+        assert not rule.evaluate(_ctx(50000))
+        assert rule.window is None
+
+    def test_frequency_counts_last_24_hours(self):
+        [rule] = compile_rules([_rule("frequency", 3)])
+        recent = [(timedelta(hours=h), 1000) for h in (1, 5, 20)]
+        assert rule.evaluate(_ctx(1000, recent))
+        assert not rule.evaluate(_ctx(1000, recent[:2] + [(timedelta(hours=30), 1000)]))
+
+    def test_velocity_only_for_new_employees(self):
+        [rule] = compile_rules([_rule("velocity", 20000, action="block")])
+        history = [(timedelta(minutes=10), 15000), (timedelta(hours=2), 50000)]
+        assert rule.evaluate(_ctx(6000, history, tenure_months=0))
+        assert not rule.evaluate(_ctx(5000, history, tenure_months=0))
+        assert not rule.evaluate(_ctx(6000, history, tenure_months=3))
+
+    def test_unknown_and_employer_rules_skipped(self):
+        assert compile_rules([_rule("employer_cooldown", 3), _rule("something_else", 1)]) == []
+
+
+class TestFraudEngine:
+    """Caching, invalidation and batched trigger counts against a scratch database"""
+
+    def test_rules_cached_until_invalidated(self, motor_db):
+        async def run():
+            engine = FraudEngine(motor_db, flush_delay=0.01)
+            rule = _rule("amount_threshold", 1000)
+            await motor_db.fraud_rules.insert_one(dict(rule))
+
+            assert not (await engine.check({"amount": 2000}, {"id": "ee-1"}))["passed"]
+            await motor_db.fraud_rules.update_one({"id": rule["id"]}, {"$set": {"enabled": False}})
+            # Still the cached rule set
+            assert not (await engine.check({"amount": 2000}, {"id": "ee-1"}))["passed"]
+            engine.invalidate()
+            assert (await engine.check({"amount": 2000}, {"id": "ee-1"}))["passed"]
+            await engine.close()
+
+        asyncio.run(run())
+
+    def test_history_and_batched_trigger_counts(self, motor_db):
+        async def run():
+            engine = FraudEngine(motor_db, flush_delay=0.05)
+            frequency, amount = _rule("frequency", 2), _rule("amount_threshold", 100)
+            await motor_db.fraud_rules.insert_many([dict(frequency), dict(amount)])
+            now = datetime.now(timezone.utc)
+            await motor_db.advances.insert_many([
+                {"id": str(uuid.uuid4()), "employee_id": "ee-1", "amount": 500,
+                 "created_at": (now - timedelta(hours=h)).isoformat()}
+                for h in (1, 2, 48)
+            ])
+
+            results = await asyncio.gather(*[engine.check({"amount": 500}, {"id": "ee-1"}) for _ in range(5)])
+            assert all(r["should_flag"] and len(r["violations"]) == 2 for r in results)
+            assert (await engine.check({"amount": 50}, {"id": "ee-2"}))["passed"]
+
+            await asyncio.sleep(0.2)
+            counts = {r["id"]: r["trigger_count"] async for r in motor_db.fraud_rules.find({}, {"_id": 0})}
+            assert counts == {frequency["id"]: 5, amount["id"]: 5}
+            await engine.close()
+
+        asyncio.run(run())
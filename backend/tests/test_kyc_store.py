@@ -0,0 +1,157 @@
+"""
+Test the content-addressed KYC document store
+- Identical uploads share one sharded blob file with a reference count
+- Releasing the last reference removes the blob; verify detects corruption
+- A re-upload supersedes earlier pending / rejected documents and releases their blobs
+- Superseded documents drop out of the document listings and can no longer be reviewed
+- An upload racing the removal of the same blob waits for it and keeps its file
+"""
+
+import asyncio
+import hashlib
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from services.kyc_store import SUPERSEDED, blob_key, current, release, store_blob, supersede, verify
+from services.storage import FilesystemStorage
+from services.uploads import UploadTooLarge
+
+
+def _upload(data):
+    return UploadFile(io.BytesIO(data), filename="id_front.png")
+
+
+class SlowDeleteStorage(FilesystemStorage):
+    """Filesystem storage whose deletes take a while, to race uploads against them"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.deleting = asyncio.Event()
+
+    async def delete(self, key):
+        self.deleting.set()
+        await asyncio.sleep(0.2)
+        await super().delete(key)
+
+
+def test_blob_key():
+    sha256 = hashlib.sha256(b"scan").hexdigest()
+    assert blob_key(sha256) == f"kyc/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class TestKycStore:
+    """Blob storage against a scratch database and a temporary directory"""
+
+    def test_dedup_and_release(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            storage = FilesystemStorage(tmp_path)
+            scan = b"passport scan" * 1000
+            sha256 = hashlib.sha256(scan).hexdigest()
+
+            first = await store_blob(db, storage, _upload(scan), content_type="image/png")
+            second = await store_blob(db, storage, _upload(scan), content_type="image/png")
+            other = await store_blob(db, storage, _upload(b"payslip"), content_type="application/pdf")
+            assert (first["sha256"], first["refcount"], second["refcount"]) == (sha256, 1, 2)
+            assert (first["size"], first["key"]) == (len(scan), blob_key(sha256))
+            assert storage.path(blob_key(sha256)).read_bytes() == scan
+            # One file per distinct content, nothing left over from the uploads
+            files = sorted(p.name for p in tmp_path.rglob("*") if p.is_file())
+            assert files == sorted([sha256, other["sha256"]])
+
+            assert await release(db, storage, sha256) == 1
+            assert storage.path(blob_key(sha256)).exists()
+            assert await release(db, storage, sha256) == 0
+            assert not storage.path(blob_key(sha256)).exists()
+            assert await db.kyc_blobs.find_one({"sha256": sha256}) is None
+            assert await release(db, storage, sha256) == 0
+
+        asyncio.run(run())
+
+    def test_verify_and_size_limit(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            storage = FilesystemStorage(tmp_path)
+            blob = await store_blob(db, storage, _upload(b"selfie"))
+            assert await verify(storage, blob)
+            storage.path(blob["key"]).write_bytes(b"selfi3")
+            assert not await verify(storage, blob)
+
+            with pytest.raises(UploadTooLarge):
+                await store_blob(db, storage, _upload(b"x" * 2048), max_bytes=1024)
+            assert await db.kyc_blobs.count_documents({}) == 1
+            assert not list(tmp_path.glob(".*.part"))
+
+        asyncio.run(run())
+
+    def test_supersede_releases_replaced_documents(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            storage = FilesystemStorage(tmp_path)
+            documents = []
+            for i, (scan, status) in enumerate([(b"approved", "approved"), (b"rejected", "rejected"),
+                                                (b"pending", "pending"), (b"latest", "pending")]):
+                blob = await store_blob(db, storage, _upload(scan))
+                documents.append({"id": f"doc-{i}", "user_id": "u-1", "document_type": "id_front",
+                                  "sha256": blob["sha256"], "status": status, "created_at": f"2026-01-0{i + 1}"})
+            await db.kyc_documents.insert_many([dict(d) for d in documents])
+            await db.kyc_documents.insert_one({"id": "other", "user_id": "u-1", "document_type": "selfie",
+                                               "sha256": documents[2]["sha256"], "status": "pending",
+                                               "created_at": "2026-01-01"})
+            await db.kyc_blobs.update_one({"sha256": documents[2]["sha256"]}, {"$inc": {"refcount": 1}})
+
+            assert await supersede(db, storage, documents[3]) == 2
+            assert await supersede(db, storage, documents[3]) == 0
+            superseded = await db.kyc_documents.find({"superseded_by": "doc-3"}).to_list(None)
+            assert sorted(d["id"] for d in superseded) == ["doc-1", "doc-2"]
+            # The rejected scan had no other reference; the pending one is still a selfie
+            assert not storage.path(blob_key(documents[1]["sha256"])).exists()
+            assert storage.path(blob_key(documents[2]["sha256"])).exists()
+            assert storage.path(blob_key(documents[0]["sha256"])).exists()
+
+        asyncio.run(run())
+
+    def test_listing_after_reupload(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            storage = FilesystemStorage(tmp_path)
+            for i, scan in enumerate([b"blurry", b"sharp"]):
+                blob = await store_blob(db, storage, _upload(scan))
+                document = {"id": f"doc-{i}", "user_id": "u-1", "document_type": "id_front", "sha256": blob["sha256"],
+                            "status": "pending", "created_at": f"2026-01-0{i + 1}"}
+                await db.kyc_documents.insert_one(dict(document))
+                await supersede(db, storage, document)
+
+            replaced = await db.kyc_documents.find_one({"id": "doc-0"})
+            assert (replaced["status"], replaced["superseded_by"]) == (SUPERSEDED, "doc-1")
+            # The admin review screen and the employee's own list only show the new upload
+            for query in ({"user_id": "u-1"}, {"status": "pending"}, {}):
+                listed = await db.kyc_documents.find(current(query)).to_list(None)
+                assert [d["id"] for d in listed] == ["doc-1"]
+            # Reviews match on the same filter, so the replaced document cannot be approved
+            result = await db.kyc_documents.update_one(current({"id": "doc-0"}), {"$set": {"status": "approved"}})
+            assert result.matched_count == 0
+
+        asyncio.run(run())
+
+    def test_store_during_removal_keeps_file(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            await db.kyc_blobs.create_index("sha256", unique=True)
+            storage = SlowDeleteStorage(tmp_path)
+            scan = b"driving licence" * 100
+            sha256 = (await store_blob(db, storage, _upload(scan)))["sha256"]
+
+            removal = asyncio.create_task(release(db, storage, sha256))
+            await storage.deleting.wait()
+            # The file is being deleted; the new upload must not be deleted with it
+            blob = await store_blob(db, storage, _upload(scan))
+            assert await removal == 0
+
+            assert blob["refcount"] == 1 and blob.get("deleting_at") is None
+            assert storage.path(blob_key(sha256)).read_bytes() == scan
+            assert await db.kyc_blobs.count_documents({"sha256": sha256}) == 1
+
+        asyncio.run(run())
@@ -0,0 +1,104 @@
+"""
+Test cursor-based pagination on list endpoints
+- GET /api/admin/advances, /api/admin/employees, /api/admin/employers with limit + cursor
+- Next page cursor is returned in the X-Next-Cursor header
+- Walking all pages returns every row exactly once, newest first
+"""
+
+import pytest
+import requests
+import os
+
+from services.pagination import encode_cursor, decode_cursor, keyset_query
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+ADMIN_EMAIL = "superadmin@eaziwage.com"
+ADMIN_PASSWORD = "Admin@12345"
+
+
+@pytest.fixture(scope="module")
+def admin_headers():
+    """Get admin auth headers"""
+    if not BASE_URL:
+        pytest.skip("REACT_APP_BACKEND_URL not set - skipping pagination endpoint tests")
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": ADMIN_EMAIL,
+        "password": ADMIN_PASSWORD
+    })
+    if response.status_code != 200:
+        pytest.skip("Admin authentication failed - skipping pagination tests")
+    return {"Authorization": f"Bearer {response.json().get('access_token')}"}
+
+
+def _walk(url, headers, page_size):
+    rows, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(url, headers=headers, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert isinstance(page, list)
+        assert len(page) <= page_size
+        rows.extend(page)
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows, pages
+
+
+class TestCursorHelpers:
+    """Cursor encoding round-trips and builds a strict keyset predicate"""
+
+    def test_round_trip(self):
+        cursor = encode_cursor({"created_at": "2026-02-01T10:00:00+00:00", "id": "abc"})
+        assert decode_cursor(cursor) == ("2026-02-01T10:00:00+00:00", "abc")
+
+    def test_keyset_query_wraps_filter(self):
+        cursor = encode_cursor({"created_at": "2026-02-01", "id": "abc"})
+        query = keyset_query({"status": "approved"}, cursor)
+        assert query["$and"][0] == {"status": "approved"}
+        assert {"created_at": {"$lt": "2026-02-01"}} in query["$and"][1]["$or"]
+
+    def test_undated_rows_follow_dated_ones(self):
+        dated = keyset_query({}, encode_cursor({"created_at": "2026-02-01", "id": "abc"}))
+        assert {"created_at": None} in dated["$or"]
+
+        cursor = encode_cursor({"id": "abc"})
+        assert decode_cursor(cursor) == (None, "abc")
+        assert keyset_query({}, cursor) == {"created_at": None, "id": {"$lt": "abc"}}
+
+    def test_no_cursor_is_passthrough(self):
+        assert keyset_query({"status": "pending"}, None) == {"status": "pending"}
+
+
+class TestPaginatedEndpoints:
+    """Walk admin list endpoints page by page"""
+
+    @pytest.mark.parametrize("path", ["/api/admin/advances", "/api/admin/employees", "/api/admin/employers"])
+    def test_pages_cover_all_rows_once(self, admin_headers, path):
+        full = requests.get(f"{BASE_URL}{path}", headers=admin_headers, params={"limit": 1000}).json()
+        if len(full) < 3:
+            pytest.skip(f"Not enough data on {path} to paginate")
+
+        rows, pages = _walk(f"{BASE_URL}{path}", admin_headers, page_size=2)
+        ids = [r["id"] for r in rows]
+        assert len(ids) == len(set(ids)), "Duplicate rows across pages"
+        assert pages >= 2
+
+        keys = [(r.get("created_at") or "", r["id"]) for r in rows]
+        assert keys == sorted(keys, reverse=True), "Rows not ordered newest first"
+
+    def test_invalid_cursor_rejected(self, admin_headers):
+        response = requests.get(
+            f"{BASE_URL}/api/admin/advances",
+            headers=admin_headers,
+            params={"cursor": "not-a-cursor"}
+        )
+        assert response.status_code == 400
+
+    def test_limit_out_of_range_rejected(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/admin/advances", headers=admin_headers, params={"limit": 0})
+        assert response.status_code == 422
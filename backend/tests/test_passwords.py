@@ -0,0 +1,53 @@
+"""
+Test password hashing helpers
+- Hash / verify round-trip through the bcrypt thread pool
+- Cost factor parsing and rehash detection
+- The event loop keeps running while a hash is computed
+"""
+
+import asyncio
+import time
+
+from services.passwords import (
+    BCRYPT_ROUNDS, hash_password, verify_password, hash_password_sync, hash_cost, needs_rehash
+)
+
+
+class TestPasswordHashing:
+    """Async helpers and rehash detection"""
+
+    def test_round_trip(self):
+        async def run():
+            hashed = await hash_password("Secret@123")
+            assert hash_cost(hashed) == BCRYPT_ROUNDS
+            assert await verify_password("Secret@123", hashed)
+            assert not await verify_password("wrong", hashed)
+
+        asyncio.run(run())
+
+    def test_needs_rehash_on_cost_change(self):
+        hashed = hash_password_sync("Secret@123", rounds=4)
+        assert hash_cost(hashed) == 4
+        assert needs_rehash(hashed, rounds=5)
+        assert not needs_rehash(hashed, rounds=4)
+        assert hash_cost("") == 0
+
+    def test_event_loop_not_blocked(self):
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            task = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            await asyncio.gather(*[hash_password("Secret@123") for _ in range(4)])
+            elapsed = time.perf_counter() - start
+            task.cancel()
+            # The ticker should keep firing for most of the time spent hashing
+            assert ticks >= elapsed / 0.005 * 0.5
+
+        asyncio.run(run())
@@ -0,0 +1,150 @@
+"""
+Test the payout status reconciler
+- Unsettled disbursements past the minimum age are checked and settled through apply_status
+- Checks stay within the concurrency limit and rate budget
+- Failed checks are stamped too, so permanently failing payouts do not starve newer ones
+- Sweep duration and backlog are reported
+"""
+
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from services.dusupay import CIRCUIT_OPEN, PayoutResponse
+from services.payout_reconciler import PAYOUT_RECONCILE, PayoutReconciler
+from services.telemetry import Telemetry
+
+
+class FakeDusupay:
+    """check_payout_status answering from a reference -> status map"""
+
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = statuses
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def check_payout_status(self, merchant_reference, circuit=None):
+        self.calls.append(merchant_reference)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        status = self.statuses.get(merchant_reference)
+        if status == CIRCUIT_OPEN:
+            return PayoutResponse(success=False, message="paused", error_code=CIRCUIT_OPEN)
+        if status is None:
+            return PayoutResponse(success=False, message="Transaction not found", error_code="404")
+        return PayoutResponse(
+            success=True, message="Status retrieved", merchant_reference=merchant_reference, status=status,
+            raw_response={"data": {"transaction_status": status, "failure_reason": "Declined"}}
+        )
+
+
+async def _seed(db, reference, status="PENDING", age_minutes=60):
+    created_at = (datetime.now(timezone.utc) - timedelta(minutes=age_minutes)).isoformat()
+    await db.disbursements.insert_one({
+        "id": f"d-{reference}", "advance_id": f"adv-{reference}", "merchant_reference": reference,
+        "status": status, "circuit": "KE:safaricom_ke", "created_at": created_at
+    })
+    await db.advances.insert_one({
+        "id": f"adv-{reference}", "employee_id": "ee-1", "employer_id": "er-1", "amount": 1000, "net_amount": 950,
+        "fee_amount": 50, "country": "KE", "status": "disbursing", "disbursement_reference": reference,
+        "created_at": created_at
+    })
+    await db.transactions.insert_one({"id": f"t-{reference}", "reference": reference, "status": "pending"})
+
+
+class TestPayoutReconciler:
+    """Sweeps against a scratch database"""
+
+    def test_sweep_settles_stale_disbursements(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, "EWA-DONE")
+            await _seed(db, "EWA-FAILED", status="PROCESSING")
+            await _seed(db, "EWA-STILL")
+            await _seed(db, "EWA-PAUSED")
+            # Too recent, and already settled: not checked
+            await _seed(db, "EWA-NEW", age_minutes=1)
+            await _seed(db, "EWA-SETTLED", status="COMPLETED")
+            dusupay = FakeDusupay({
+                "EWA-DONE": "COMPLETED", "EWA-FAILED": "FAILED", "EWA-STILL": "PENDING",
+                "EWA-PAUSED": CIRCUIT_OPEN, "EWA-NEW": "COMPLETED", "EWA-SETTLED": "COMPLETED",
+            })
+            metrics = Telemetry()
+            reconciler = PayoutReconciler(db, lambda: dusupay, min_age_minutes=15, metrics=metrics)
+
+            sweep = await reconciler.sweep()
+            assert sorted(dusupay.calls) == ["EWA-DONE", "EWA-FAILED", "EWA-PAUSED", "EWA-STILL"]
+            assert (sweep["candidates"], sweep["checked"], sweep["applied"], sweep["unchanged"], sweep["skipped"]) == (
+                4, 3, 2, 1, 1)
+            assert sweep["backlog"] == 2
+
+            advance = await db.advances.find_one({"id": "adv-EWA-DONE"})
+            assert (advance["status"], advance["disbursement_status"]) == ("disbursed", "COMPLETED")
+            advance = await db.advances.find_one({"id": "adv-EWA-FAILED"})
+            assert (advance["status"], advance["disbursement_error"]) == ("approved", "Declined")
+            disbursement = await db.disbursements.find_one({"merchant_reference": "EWA-DONE"})
+            assert (disbursement["status_source"], disbursement["reconcile_checks"]) == ("status_check", 1)
+
+            # Checked and still pending: left alone until the next interval; the paused route is retried
+            dusupay.calls.clear()
+            await reconciler.sweep()
+            assert dusupay.calls == ["EWA-PAUSED"]
+            assert metrics.snapshot(PAYOUT_RECONCILE)["total_calls"] == 2
+            assert reconciler.stats()["sweeps"] == 2
+
+        asyncio.run(run())
+
+    def test_failed_checks_do_not_starve_newer_payouts(self, motor_db):
+        async def run():
+            db = motor_db
+            for i in range(3):
+                await _seed(db, f"EWA-LOST-{i}", age_minutes=600 - i)
+
+            class RaisingDusupay(FakeDusupay):
+                async def check_payout_status(self, merchant_reference, circuit=None):
+                    if merchant_reference == "EWA-LOST-2":
+                        raise RuntimeError("connection reset")
+                    return await super().check_payout_status(merchant_reference, circuit)
+
+            # Unknown to Dusupay (404) or raising, every sweep
+            dusupay = RaisingDusupay({"EWA-NEWER": "COMPLETED"})
+            reconciler = PayoutReconciler(db, lambda: dusupay, batch_size=3, metrics=Telemetry())
+            sweep = await reconciler.sweep()
+            assert (sweep["candidates"], sweep["errors"]) == (3, 3)
+            lost = await db.disbursements.find({"merchant_reference": {"$regex": "^EWA-LOST"}}).to_list(None)
+            assert all(d["reconciled_at"] and d["reconcile_failures"] == 1 for d in lost)
+            assert {d["reconcile_error"] for d in lost} == {"404", "connection reset"}
+
+            # The oldest rows failed last time; the next sweep reaches the newer payout
+            await _seed(db, "EWA-NEWER", age_minutes=60)
+            dusupay.calls.clear()
+            sweep = await reconciler.sweep()
+            assert dusupay.calls == ["EWA-NEWER"]
+            assert (sweep["applied"], sweep["errors"]) == (1, 0)
+
+        asyncio.run(run())
+
+    def test_rate_budget_and_concurrency(self, motor_db):
+        async def run():
+            db = motor_db
+            references = [f"EWA-{i}" for i in range(10)]
+            for ref in references:
+                await _seed(db, ref)
+            dusupay = FakeDusupay({ref: "COMPLETED" for ref in references}, delay=0.02)
+            reconciler = PayoutReconciler(
+                db, lambda: dusupay, concurrency=3, rate_per_second=40, metrics=Telemetry()
+            )
+
+            sweep = await reconciler.sweep()
+            assert sweep["applied"] == 10
+            assert dusupay.max_in_flight <= 3
+            # 10 checks spaced 1/40 s apart
+            assert sweep["duration_seconds"] >= 9 / 40
+            assert await reconciler.backlog() == 0
+
+        asyncio.run(run())
@@ -0,0 +1,108 @@
+"""
+Test payout retries
+- Transient failures are retried with the same merchant_reference
+- A payout that reached Dusupay before timing out is found by the status check, not posted again
+- Permanent errors are not retried; every attempt is recorded
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services import dusupay
+from services.dusupay import DusupayConfig, DusupayService, backoff_delay
+
+
+class FakeGateway:
+    """Scripted /payouts and /payouts/status responses"""
+
+    def __init__(self, payouts, statuses=()):
+        self.payouts = list(payouts)
+        self.statuses = list(statuses)
+        self.posted = []
+        self.status_checks = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/payouts/status"):
+            self.status_checks += 1
+            return self.statuses.pop(0)
+        self.posted.append(json.loads(request.content)["merchant_reference"])
+        outcome = self.payouts.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _accepted(reference="EWA-1"):
+    return httpx.Response(202, json={"message": "Transaction Initiated", "data": {
+        "internal_reference": "DUSU-1", "merchant_reference": reference, "transaction_status": "PENDING"}})
+
+
+def _not_found():
+    return httpx.Response(404, json={"code": 404, "message": "Transaction not found"})
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("DUSUPAY_PUBLIC_KEY", "pk")
+    monkeypatch.setenv("DUSUPAY_SECRET_KEY", "sk")
+    monkeypatch.setenv("DUSUPAY_RETRY_BASE_DELAY", "0.001")
+    monkeypatch.setenv("DUSUPAY_PAYOUT_MAX_ATTEMPTS", "3")
+
+    def install(gateway):
+        client = httpx.AsyncClient(base_url="https://gateway.test/v1", transport=httpx.MockTransport(gateway))
+        monkeypatch.setattr(dusupay, "_http_client", client)
+        return DusupayService(DusupayConfig())
+
+    return install
+
+
+def _payout(service):
+    return service.create_mobile_money_payout(
+        amount=1000, country_code="KE", provider_name="mpesa", phone_number="+254700000000",
+        recipient_name="Jane", reference="EWA-1"
+    )
+
+
+class TestPayoutRetries:
+    """Retry behaviour of DusupayService._execute_payout"""
+
+    def test_timeout_then_success_reuses_reference(self, service):
+        gateway = FakeGateway([httpx.ReadTimeout("slow"), _accepted()], [_not_found()])
+        response = asyncio.run(_payout(service(gateway)))
+        assert response.success
+        assert gateway.posted == ["EWA-1", "EWA-1"]
+        assert [a["outcome"] for a in response.attempts] == ["TIMEOUT", "accepted"]
+        assert response.attempts[1]["status_check"] == "404"
+        assert all(a["latency_ms"] >= 0 for a in response.attempts)
+
+    def test_timed_out_payout_found_by_status_check(self, service):
+        found = httpx.Response(200, json={"data": {"internal_reference": "DUSU-1", "transaction_status": "PENDING"}})
+        gateway = FakeGateway([httpx.ReadTimeout("slow")], [found])
+        response = asyncio.run(_payout(service(gateway)))
+        assert response.success
+        assert response.internal_reference == "DUSU-1"
+        # Never posted a second time
+        assert gateway.posted == ["EWA-1"]
+        assert [a["outcome"] for a in response.attempts] == ["TIMEOUT", "found"]
+
+    def test_gives_up_after_max_attempts(self, service):
+        gateway = FakeGateway([httpx.Response(503, text="<html>busy</html>")] * 3, [_not_found()] * 2)
+        response = asyncio.run(_payout(service(gateway)))
+        assert not response.success
+        assert response.error_code == "GATEWAY_ERROR"
+        assert len(response.attempts) == 3
+        assert gateway.status_checks == 2
+
+    def test_permanent_error_not_retried(self, service):
+        gateway = FakeGateway([httpx.Response(400, json={"code": 400, "message": "Invalid account"})])
+        response = asyncio.run(_payout(service(gateway)))
+        assert (response.success, response.error_code, len(response.attempts)) == (False, "400", 1)
+        assert gateway.status_checks == 0
+
+    def test_backoff_delay_bounds(self):
+        for retry in range(1, 8):
+            delay = backoff_delay(retry, base=0.5, cap=8)
+            assert 0 <= delay <= min(8, 0.5 * 2 ** (retry - 1))
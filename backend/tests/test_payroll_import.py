@@ -0,0 +1,59 @@
+"""
+Test streaming payroll file import
+- CSV / XLSX rows are read lazily with normalised headers
+- Row validation while streaming
+"""
+
+import csv
+
+import pytest
+
+from services.payroll_import import iter_payroll_rows, validate_row, write_jsonl_rows
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Employee Code", "Days Worked", "Gross Salary"])
+        writer.writerows(rows)
+
+
+class TestParsing:
+    """Row readers and validation"""
+
+    def test_csv_rows(self, tmp_path):
+        path = tmp_path / "payroll.csv"
+        _write_csv(path, [["EMP-1", "10", "30000"], ["EMP-2", "", ""]])
+        rows = iter_payroll_rows(path)
+        assert next(rows) == {"employee_code": "EMP-1", "days_worked": "10", "gross_salary": "30000"}
+        assert next(rows)["employee_code"] == "EMP-2"
+        assert next(rows, None) is None
+
+    def test_xlsx_rows(self, tmp_path):
+        openpyxl = pytest.importorskip("openpyxl")
+        path = tmp_path / "payroll.xlsx"
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["employee_code", "days_worked", "gross_salary"])
+        workbook.active.append([1001, 12, 45000])
+        workbook.save(path)
+
+        rows = list(iter_payroll_rows(path))
+        assert rows == [{"employee_code": 1001, "days_worked": 12, "gross_salary": 45000}]
+        row, reason = validate_row(rows[0])
+        assert reason is None
+        assert row == {"employee_code": "1001", "days_worked": 12.0, "gross_salary": 45000.0}
+
+    def test_jsonl_rows(self, tmp_path):
+        path = tmp_path / "payroll.jsonl"
+        rows = [{"employee_code": "EMP-1", "days_worked": 22, "gross_salary": 126758}]
+        write_jsonl_rows(path, rows)
+        assert list(iter_payroll_rows(path)) == rows
+
+    def test_validation(self):
+        assert validate_row({"employee_code": " EMP-1 ", "days_worked": ""}) == (
+            {"employee_code": "EMP-1", "days_worked": 0.0}, None)
+        assert validate_row({"days_worked": "3"})[1] == "employee_code is required"
+        assert validate_row({"employee_code": "E", "days_worked": "ten"})[1] == "days_worked must be a number"
+        assert validate_row({"employee_code": "E", "days_worked": "40"})[1] == "days_worked must be between 0 and 31"
+        assert validate_row({"employee_code": "E", "days_worked": "4", "gross_salary": "-1"})[1] == \
+            "gross_salary cannot be negative"
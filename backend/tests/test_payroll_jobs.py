@@ -0,0 +1,192 @@
+"""
+Test the background payroll job runner
+- A claimed job applies its file in batches and records progress / problem rows
+- A job interrupted mid-file resumes from its checkpoint without applying rows twice
+- Per-employer concurrency and reclaiming jobs whose lease expired
+- Jobs read their file from upload storage by key, so any replica can run them
+"""
+
+import asyncio
+import csv
+import shutil
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+
+from services import payroll_jobs
+from services.payroll_jobs import PayrollJobRunner, new_job
+from services.storage import FilesystemStorage
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["employee_code", "days_worked", "gross_salary"])
+        writer.writerows(rows)
+
+
+async def _seed_employees(db, count=25):
+    await db.employees.insert_many([
+        {"id": f"ee-{i}", "employer_id": "er-1", "employee_code": f"EMP-{i}", "monthly_salary": 30000}
+        for i in range(count)
+    ])
+
+
+class TestRunJob:
+    """Batched job runs against a scratch database"""
+
+    def test_job_progress_and_errors(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            await _seed_employees(db)
+            path = tmp_path / "payroll.csv"
+            rows = [[f"EMP-{i}", "10", ""] for i in range(25)]
+            rows += [["EMP-404", "10", ""], ["", "5", ""], ["EMP-1", "99", ""]]
+            _write_csv(path, rows)
+
+            runner = PayrollJobRunner(db, FilesystemStorage(tmp_path), batch_size=10)
+            job = await runner.enqueue(new_job("er-1", "2026-01", "payroll.csv", path.name))
+            await runner.execute(await runner.claim())
+
+            done = await db.payroll_jobs.find_one({"id": job["id"]}, {"_id": 0})
+            assert done["status"] == "completed"
+            assert done["rows_processed"] == 28
+            assert (done["updated"], done["unknown"], done["invalid"]) == (25, 1, 2)
+            assert [(e["line"], e["status"]) for e in done["errors"]] == [(27, "unknown"), (28, "invalid"), (29, "invalid")]
+            assert not path.exists()
+
+            employee = await db.employees.find_one({"id": "ee-24"})
+            assert employee["earned_wages"] == 10000.0
+            record = await db.payroll_records.find_one({"job_id": job["id"]})
+            assert record["employee_count"] == 28
+            assert "employees" not in record
+
+        asyncio.run(run())
+
+    def test_resume_after_crash(self, motor_db, tmp_path, monkeypatch):
+        async def run():
+            db = motor_db
+            await _seed_employees(db)
+            path = tmp_path / "payroll.csv"
+            rows = [[f"EMP-{i}", "10", ""] for i in range(25)]
+            rows.append(["EMP-3", "20", ""])  # later row for the same employee wins
+            _write_csv(path, rows)
+
+            runner = PayrollJobRunner(db, FilesystemStorage(tmp_path), batch_size=10)
+            job = await runner.enqueue(new_job("er-1", "2026-01", "payroll.csv", path.name))
+
+            # Die after the second batch was applied but before it was checkpointed
+            checkpoint = payroll_jobs._checkpoint
+            calls = []
+
+            async def crashing_checkpoint(*args, **kwargs):
+                calls.append(1)
+                if len(calls) == 2:
+                    raise RuntimeError("connection lost")
+                await checkpoint(*args, **kwargs)
+
+            monkeypatch.setattr(payroll_jobs, "_checkpoint", crashing_checkpoint)
+            await runner.execute(await runner.claim())
+            interrupted = await db.payroll_jobs.find_one({"id": job["id"]})
+            assert (interrupted["status"], interrupted["rows_processed"], interrupted["attempts"]) == ("queued", 10, 1)
+
+            # Change an employee the lost batch already wrote; a replay must not overwrite it
+            await db.employees.update_one({"id": "ee-12"}, {"$set": {"earned_wages": 1.0}})
+
+            monkeypatch.setattr(payroll_jobs, "_checkpoint", checkpoint)
+            await runner.execute(await runner.claim())
+            done = await db.payroll_jobs.find_one({"id": job["id"]})
+            assert done["status"] == "completed"
+            assert (done["rows_processed"], done["updated"], done["unchanged"]) == (26, 26, 0)
+            assert (await db.employees.find_one({"id": "ee-12"}))["earned_wages"] == 1.0
+            assert (await db.employees.find_one({"id": "ee-3"}))["earned_wages"] == 20000.0
+            assert await db.payroll_records.count_documents({"job_id": job["id"]}) == 1
+
+        asyncio.run(run())
+
+    def test_job_runs_on_another_replica(self, motor_db, tmp_path):
+        async def run():
+            db = motor_db
+            await _seed_employees(db, 3)
+            shared = FilesystemStorage(tmp_path / "bucket")
+            part = tmp_path / "upload.csv"
+            _write_csv(part, [[f"EMP-{i}", "10", ""] for i in range(3)])
+            await shared.put_file(part, "payroll/er-1_upload.csv")
+
+            # The replica that accepted the upload is not the one that runs it
+            await PayrollJobRunner(db, shared).enqueue(new_job("er-1", "2026-01", "upload.csv", "payroll/er-1_upload.csv"))
+            fetched = []
+
+            class RemoteStorage(FilesystemStorage):
+                """Shared store reached through local copies, like the S3 backend"""
+
+                @asynccontextmanager
+                async def local_file(self, key):
+                    async with shared.local_file(key) as source:
+                        copy = tmp_path / "replica-2" / source.name
+                        copy.parent.mkdir(exist_ok=True)
+                        shutil.copyfile(source, copy)
+                    fetched.append(key)
+                    yield copy
+
+                async def delete(self, key):
+                    await shared.delete(key)
+
+            other = PayrollJobRunner(db, RemoteStorage(tmp_path / "replica-2"))
+            await other.execute(await other.claim())
+
+            assert fetched == ["payroll/er-1_upload.csv"]
+            done = await db.payroll_jobs.find_one({"file_name": "upload.csv"})
+            assert (done["status"], done["updated"]) == ("completed", 3)
+            assert not await shared.exists("payroll/er-1_upload.csv")
+
+        asyncio.run(run())
+
+    def test_unreadable_file_fails_after_retries(self, motor_db, tmp_path):
+        async def run():
+            path = tmp_path / "payroll.xlsx"
+            path.write_bytes(b"not a workbook")
+            runner = PayrollJobRunner(motor_db, FilesystemStorage(tmp_path))
+            job = await runner.enqueue(new_job("er-1", "2026-01", "payroll.xlsx", path.name))
+            for _ in range(payroll_jobs.PAYROLL_MAX_ATTEMPTS):
+                await runner.execute(await runner.claim())
+
+            failed = await motor_db.payroll_jobs.find_one({"id": job["id"]})
+            assert failed["status"] == "failed"
+            assert failed["error"]
+            assert await runner.claim() is None
+
+        asyncio.run(run())
+
+
+class TestClaim:
+    """Which queued jobs a worker may take"""
+
+    def test_one_job_per_employer(self, motor_db, tmp_path):
+        async def run():
+            runner = PayrollJobRunner(motor_db, FilesystemStorage(tmp_path), per_employer=1)
+            first = await runner.enqueue(new_job("er-1", "2026-01", "a.csv", "a.csv"))
+            await runner.enqueue(new_job("er-1", "2026-02", "b.csv", "b.csv"))
+            other = await runner.enqueue(new_job("er-2", "2026-01", "c.csv", "c.csv"))
+
+            assert (await runner.claim())["id"] == first["id"]
+            # er-1 is busy, so its second job waits behind er-2's
+            assert (await runner.claim())["id"] == other["id"]
+            assert await runner.claim() is None
+
+            # Another process sees er-1's running job through its lease
+            assert await PayrollJobRunner(motor_db, FilesystemStorage(tmp_path), per_employer=1).claim() is None
+
+        asyncio.run(run())
+
+    def test_expired_lease_is_reclaimed(self, motor_db, tmp_path):
+        async def run():
+            job = new_job("er-1", "2026-01", "a.csv", "a.csv")
+            expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+            job.update({"status": "processing", "worker_id": "dead-worker", "lease_expires_at": expired})
+            await motor_db.payroll_jobs.insert_one(job)
+
+            claimed = await PayrollJobRunner(motor_db, FilesystemStorage(tmp_path)).claim()
+            assert claimed["id"] == job["id"]
+            assert claimed["worker_id"] != "dead-worker"
+
+        asyncio.run(run())
@@ -0,0 +1,254 @@
+"""
+Test the upload storage backends
+- Filesystem and S3 backends store, hash, serve and delete by key
+- A backend missing any Storage method cannot be constructed
+- local_file() hands out a local copy (or the file itself) for parsers that need a path
+- S3 uploads stream as multipart uploads; a rejected upload leaves nothing behind
+- S3 downloads are redirects to presigned URLs
+- serve(): ETag / Cache-Control, If-None-Match -> 304 and byte ranges
+
+The S3 tests run against a local S3 emulator: the endpoint in
+S3_TEST_ENDPOINT_URL (MinIO, LocalStack, ...) or, when unset, an in-process
+moto server. They are skipped when neither is available.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import uuid
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import FileResponse, RedirectResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.storage import UNSATISFIABLE, FilesystemStorage, S3Storage, Storage, etag_matches, parse_range, serve
+from services.uploads import UploadTooLarge
+
+S3_TEST_ENDPOINT_URL = os.environ.get("S3_TEST_ENDPOINT_URL")
+MB = 1024 * 1024
+
+
+def _upload(data):
+    return UploadFile(io.BytesIO(data), filename="scan.pdf")
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    if S3_TEST_ENDPOINT_URL:
+        yield S3_TEST_ENDPOINT_URL
+        return
+    moto_server = pytest.importorskip("moto.server")
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3_storage(s3_endpoint, monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", os.environ.get("AWS_ACCESS_KEY_ID", "test"))
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", os.environ.get("AWS_SECRET_ACCESS_KEY", "test"))
+    bucket = f"eaziwage-test-{uuid.uuid4().hex[:8]}"
+    client = boto3.client("s3", endpoint_url=s3_endpoint, region_name="us-east-1")
+    try:
+        client.create_bucket(Bucket=bucket)
+    except Exception as e:
+        pytest.skip(f"S3 emulator not reachable - skipping S3 storage tests ({e})")
+    # 5 MB is the smallest part S3 accepts
+    yield S3Storage(bucket, endpoint_url=s3_endpoint, region="us-east-1", prefix="uploads/", part_size=5 * MB)
+    for obj in client.list_objects_v2(Bucket=bucket).get("Contents", []):
+        client.delete_object(Bucket=bucket, Key=obj["Key"])
+    client.delete_bucket(Bucket=bucket)
+
+
+@pytest.fixture(params=["filesystem", "s3"])
+def storage(request, tmp_path):
+    if request.param == "filesystem":
+        return FilesystemStorage(tmp_path)
+    return request.getfixturevalue("s3_storage")
+
+
+def test_incomplete_backend_rejected():
+    class SaveOnlyStorage(Storage):
+        async def save(self, file, key, max_bytes=None, content_type=None):
+            return 0
+
+    with pytest.raises(TypeError, match="abstract"):
+        SaveOnlyStorage()
+
+
+class TestStorage:
+    """Behaviour shared by both backends"""
+
+    def test_save_hash_delete(self, storage):
+        async def run():
+            data = b"profile picture" * 100
+            assert await storage.save(_upload(data), "profiles/u1.png", max_bytes=len(data),
+                                      content_type="image/png") == len(data)
+            assert await storage.exists("profiles/u1.png")
+            assert await storage.sha256("profiles/u1.png") == hashlib.sha256(data).hexdigest()
+
+            await storage.delete("profiles/u1.png")
+            assert not await storage.exists("profiles/u1.png")
+            assert await storage.sha256("profiles/u1.png") is None
+
+        asyncio.run(run())
+
+    def test_spool_and_put_file(self, storage):
+        async def run():
+            data = b"national id" * 1000
+            digest = hashlib.sha256()
+            part, size = await storage.spool(_upload(data), digest=digest)
+            assert (size, part.read_bytes()) == (len(data), data)
+
+            await storage.put_file(part, "kyc/sha256/doc", "application/pdf")
+            assert not part.exists()
+            assert await storage.sha256("kyc/sha256/doc") == digest.hexdigest()
+
+        asyncio.run(run())
+
+    def test_local_file(self, storage):
+        async def run():
+            data = b"employee_code,days_worked\nEMP-1,10\n"
+            await storage.save(_upload(data), "payroll/er-1_abc.csv")
+            async with storage.local_file("payroll/er-1_abc.csv") as path:
+                assert (path.suffix, path.read_bytes()) == (".csv", data)
+            assert await storage.exists("payroll/er-1_abc.csv")
+
+            with pytest.raises(FileNotFoundError):
+                async with storage.local_file("payroll/missing.csv"):
+                    pass
+
+        asyncio.run(run())
+
+    def test_size_limit(self, storage):
+        async def run():
+            with pytest.raises(UploadTooLarge):
+                await storage.save(_upload(b"x" * 4096), "profiles/big.png", max_bytes=1024)
+            assert not await storage.exists("profiles/big.png")
+
+        asyncio.run(run())
+
+
+class TestFilesystemStorage:
+    def test_response(self, tmp_path):
+        async def run():
+            storage = FilesystemStorage(tmp_path)
+            await storage.save(_upload(b"png"), "profiles/u1.png")
+            assert (tmp_path / "profiles" / "u1.png").read_bytes() == b"png"
+            assert isinstance(await storage.response("profiles/u1.png"), FileResponse)
+            with pytest.raises(FileNotFoundError):
+                await storage.response("profiles/missing.png")
+
+        asyncio.run(run())
+
+
+class TestS3Storage:
+    def test_multipart_upload(self, s3_storage):
+        async def run():
+            data = os.urandom(11 * MB)
+            assert await s3_storage.save(_upload(data), "kyc/big.pdf", content_type="application/pdf") == len(data)
+            head = s3_storage.client.head_object(Bucket=s3_storage.bucket, Key="uploads/kyc/big.pdf")
+            # Three parts: 5 MB, 5 MB and the 1 MB rest
+            assert head["ETag"].strip('"').endswith("-3")
+            assert (head["ContentLength"], head["ContentType"]) == (len(data), "application/pdf")
+
+        asyncio.run(run())
+
+    def test_oversized_multipart_aborted(self, s3_storage):
+        async def run():
+            with pytest.raises(UploadTooLarge):
+                await s3_storage.save(_upload(os.urandom(7 * MB)), "kyc/big.pdf", max_bytes=6 * MB)
+            assert not await s3_storage.exists("kyc/big.pdf")
+            uploads = s3_storage.client.list_multipart_uploads(Bucket=s3_storage.bucket)
+            assert not uploads.get("Uploads")
+
+        asyncio.run(run())
+
+    def test_presigned_redirect(self, s3_storage):
+        async def run():
+            await s3_storage.save(_upload(b"selfie"), "profiles/u1.jpg", content_type="image/jpeg")
+            response = await s3_storage.response("profiles/u1.jpg", "image/jpeg")
+            assert isinstance(response, RedirectResponse)
+            assert response.status_code == 307
+            url = response.headers["location"]
+            async with httpx.AsyncClient() as client:
+                fetched = await client.get(url)
+            assert (fetched.status_code, fetched.content) == (200, b"selfie")
+            assert fetched.headers["content-type"] == "image/jpeg"
+
+        asyncio.run(run())
+
+
+class TestHttpCaching:
+    """Range parsing, ETag matching and serve() behind a Starlette app"""
+
+    def test_parse_range(self):
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-", 1000) == (900, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=500-5000", 1000) == (500, 999)
+        assert parse_range("bytes=1000-", 1000) == UNSATISFIABLE
+        # Malformed or multi-range: send the whole file
+        assert parse_range("bytes=0-9,20-29", 1000) is None
+        assert parse_range("items=0-9", 1000) is None
+        assert parse_range("bytes=abc", 1000) is None
+        assert parse_range("bytes=9-0", 1000) is None
+
+    def test_etag_matches(self):
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('"x", W/"abc"', '"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"abcd"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+    def _client(self, storage, etag="c0ffee"):
+        async def endpoint(request):
+            return await serve(storage, "kyc/doc.pdf", request, "application/pdf", etag, "private, max-age=300")
+
+        return TestClient(Starlette(routes=[Route("/doc", endpoint)]))
+
+    def test_serve_from_disk(self, tmp_path):
+        storage = FilesystemStorage(tmp_path)
+        data = bytes(range(256)) * 4
+        (tmp_path / "kyc").mkdir()
+        (tmp_path / "kyc" / "doc.pdf").write_bytes(data)
+        client = self._client(storage)
+
+        full = client.get("/doc")
+        assert (full.status_code, full.content) == (200, data)
+        assert (full.headers["etag"], full.headers["cache-control"]) == ('"c0ffee"', "private, max-age=300")
+        assert full.headers["accept-ranges"] == "bytes"
+
+        cached = client.get("/doc", headers={"If-None-Match": '"c0ffee"'})
+        assert (cached.status_code, cached.content, cached.headers["etag"]) == (304, b"", '"c0ffee"')
+
+        part = client.get("/doc", headers={"Range": "bytes=100-199"})
+        assert (part.status_code, part.content) == (206, data[100:200])
+        assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+        assert part.headers["content-type"] == "application/pdf"
+
+        # If-Range for another version: the whole (new) file instead of a part
+        stale = client.get("/doc", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+        assert (stale.status_code, len(stale.content)) == (200, len(data))
+
+        beyond = client.get("/doc", headers={"Range": "bytes=5000-"})
+        assert (beyond.status_code, beyond.headers["content-range"]) == (416, f"bytes */{len(data)}")
+
+    def test_serve_from_s3(self, s3_storage):
+        asyncio.run(s3_storage.save(_upload(b"%PDF-1.7 scan"), "kyc/doc.pdf", content_type="application/pdf"))
+        client = self._client(s3_storage)
+
+        assert client.get("/doc", headers={"If-None-Match": '"c0ffee"'}).status_code == 304
+        redirect = client.get("/doc", follow_redirects=False)
+        assert (redirect.status_code, redirect.headers["cache-control"]) == (307, "no-store")
+        fetched = httpx.get(redirect.headers["location"], headers={"Range": "bytes=0-3"})
+        assert (fetched.status_code, fetched.content) == (206, b"%PDF")
+        assert fetched.headers["cache-control"] == "private, max-age=300"
@@ -0,0 +1,130 @@
+"""
+Test integration telemetry
+- Percentiles, error rate and uptime from the in-memory ring buffer and minute buckets
+- Only closed, unflushed minutes are written; history sums them per hour
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.telemetry import (
+    LATENCY_BOUNDS_MS, Telemetry, ensure_metrics_collection, flush, histogram_percentile, history, percentile
+)
+
+# 2026-01-01T00:00:00Z
+START = 1767225600.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+
+class TestTelemetry:
+    """In-memory numbers"""
+
+    def test_percentiles(self):
+        values = sorted(float(v) for v in range(1, 101))
+        assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+        assert percentile([], 50) is None
+        histogram = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        histogram[2], histogram[4] = 90, 10
+        assert histogram_percentile(histogram, 50) == 100
+        assert histogram_percentile(histogram, 95) == 500
+
+    def test_snapshot(self):
+        clock = FakeClock()
+        telemetry = Telemetry(samples=100, clock=clock)
+        for i in range(150):
+            telemetry.record("mpesa", float(i), ok=i % 10 != 0)
+        live = telemetry.snapshot("mpesa")
+        # Only the last 100 calls are kept in the ring buffer
+        assert live["samples"] == 100
+        assert live["latency_ms"] == {"p50": 99.0, "p95": 144.0, "p99": 148.0}
+        assert live["error_rate"] == 0.1
+        assert live["status"] == "degraded"
+        assert (live["calls_24h"], live["calls_today"], live["total_errors"]) == (150, 150, 15)
+
+        # No traffic yet: empty figures, still listed as healthy
+        empty = telemetry.snapshot("bank_api")
+        assert (empty["status"], empty["latency_ms"]["p50"], empty["uptime_percent"]) == ("healthy", None, None)
+
+    def test_uptime_by_minute(self):
+        clock = FakeClock()
+        telemetry = Telemetry(clock=clock)
+        for minute in range(4):
+            clock.now = START + minute * 60
+            telemetry.record("airtel_money", 80.0, ok=True)
+            # Minute 2 mostly failed
+            telemetry.record("airtel_money", 80.0, ok=minute != 2)
+            telemetry.record("airtel_money", 80.0, ok=minute != 2)
+        assert telemetry.snapshot("airtel_money")["uptime_percent"] == 75.0
+
+        # Recent calls decide the status; old failures age out of the window
+        clock.now = START + 3600
+        telemetry.record("airtel_money", 80.0, ok=True)
+        assert telemetry.snapshot("airtel_money")["status"] == "healthy"
+
+    def test_timer_records_errors(self):
+        telemetry = Telemetry()
+        with telemetry.timer("payroll_sync"):
+            pass
+        with pytest.raises(ValueError):
+            with telemetry.timer("payroll_sync"):
+                raise ValueError("bad batch")
+        live = telemetry.snapshot("payroll_sync")
+        assert (live["total_calls"], live["total_errors"]) == (2, 1)
+
+    def test_closed_minutes(self):
+        clock = FakeClock()
+        telemetry = Telemetry(clock=clock)
+        telemetry.record("mpesa", 40.0, ok=True)
+        clock.now += 30
+        telemetry.record("mpesa", 400.0, ok=False)
+        # The current minute is still open
+        assert telemetry.closed_minutes() == []
+
+        clock.now += 60
+        telemetry.record("mpesa", 40.0, ok=True)
+        docs = telemetry.closed_minutes()
+        assert len(docs) == 1
+        doc = docs[0]
+        assert doc["minute"] == datetime.fromtimestamp(START, timezone.utc)
+        assert (doc["integration"], doc["calls"], doc["errors"], doc["latency_ms_max"]) == ("mpesa", 2, 1, 400.0)
+        assert sum(doc["histogram"]) == 2
+
+        telemetry.mark_flushed(docs)
+        assert telemetry.closed_minutes() == []
+
+
+class TestFlush:
+    """integration_metrics round trip"""
+
+    def test_flush_and_history(self, motor_db):
+        async def run():
+            db = motor_db
+            await ensure_metrics_collection(db)
+            clock = FakeClock()
+            clock.now = datetime.now(timezone.utc).timestamp() - 3 * 60
+            # Two processes' worth of telemetry for the same minutes
+            sources = [Telemetry(clock=clock), Telemetry(clock=clock)]
+            for minute in range(2):
+                for source in sources:
+                    source.record("mpesa", 60.0, ok=True)
+                    source.record("mpesa", 60.0, ok=minute == 0)
+                clock.now += 60
+
+            assert [await flush(db, source) for source in sources] == [2, 2]
+            assert await flush(db, sources[0]) == 0
+
+            hours = await history(db, "mpesa", hours=1)
+            assert sum(h["calls"] for h in hours) == 8
+            assert sum(h["errors"] for h in hours) == 2
+            assert all(h["latency_ms_p95"] == 100.0 for h in hours)
+
+        asyncio.run(run())
@@ -0,0 +1,79 @@
+"""
+Test streamed upload storage
+- Uploads are copied in chunks and renamed into place when complete
+- The size limit is enforced while streaming and from the declared size
+- Nothing is left behind when an upload is rejected or fails
+"""
+
+import asyncio
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from services.uploads import UploadTooLarge, save_upload
+
+
+class CountingFile(io.BytesIO):
+    """BytesIO recording the size of every read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.reads.append(len(chunk))
+        return chunk
+
+
+class BrokenFile(io.BytesIO):
+    """Fails after the first chunk, like a client disconnecting mid-upload"""
+
+    def read(self, size=-1):
+        if self.tell():
+            raise OSError("connection reset")
+        return super().read(size)
+
+
+def _upload(data, file=None, size=None):
+    return UploadFile(file or io.BytesIO(data), size=size, filename="id.png")
+
+
+class TestSaveUpload:
+    def test_streams_in_chunks(self, tmp_path):
+        data = bytes(range(256)) * 40
+        source = CountingFile(data)
+        destination = tmp_path / "doc.png"
+
+        size = asyncio.run(save_upload(_upload(data, source), destination, max_bytes=len(data), chunk_size=1024))
+        assert size == len(data)
+        assert destination.read_bytes() == data
+        assert max(source.reads) == 1024
+        assert [p.name for p in tmp_path.iterdir()] == ["doc.png"]
+
+    def test_limit_enforced_while_streaming(self, tmp_path):
+        data = b"x" * 5000
+        source = CountingFile(data)
+        destination = tmp_path / "doc.png"
+
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(save_upload(_upload(data, source), destination, max_bytes=2000, chunk_size=1024))
+        # Stopped at the first chunk past the limit
+        assert source.reads == [1024, 1024]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_declared_size_rejected_up_front(self, tmp_path):
+        source = CountingFile(b"x" * 10)
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(save_upload(_upload(b"", source, size=5000), tmp_path / "doc.png", max_bytes=2000))
+        assert source.reads == []
+
+    def test_failed_upload_keeps_previous_file(self, tmp_path):
+        destination = tmp_path / "doc.png"
+        destination.write_bytes(b"previous")
+
+        with pytest.raises(OSError):
+            asyncio.run(save_upload(_upload(b"", BrokenFile(b"y" * 4096)), destination, chunk_size=1024))
+        assert destination.read_bytes() == b"previous"
+        assert [p.name for p in tmp_path.iterdir()] == ["doc.png"]
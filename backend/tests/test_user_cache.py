@@ -0,0 +1,123 @@
+"""
+Test the authenticated-user TTL cache
+- Hits, misses, TTL expiry and LRU eviction
+- Invalidation, including a load racing with a write
+- Invalidation bookkeeping does not grow with the number of users
+"""
+
+import asyncio
+
+from services.user_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _loader(value, calls):
+    async def load():
+        calls.append(value)
+        return value
+    return load
+
+
+class TestTTLCache:
+    """Cache semantics with a controllable clock"""
+
+    def test_hit_after_miss(self):
+        async def run():
+            cache, calls = TTLCache(30, 10), []
+            assert await cache.get_or_load("u1", _loader({"id": "u1"}, calls)) == {"id": "u1"}
+            assert await cache.get_or_load("u1", _loader({"id": "other"}, calls)) == {"id": "u1"}
+            assert len(calls) == 1
+            stats = cache.stats()
+            assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 50.0)
+
+        asyncio.run(run())
+
+    def test_entries_expire(self):
+        async def run():
+            clock = FakeClock()
+            cache, calls = TTLCache(30, 10, clock=clock), []
+            await cache.get_or_load("u1", _loader({"v": 1}, calls))
+            clock.now += 31
+            assert await cache.get_or_load("u1", _loader({"v": 2}, calls)) == {"v": 2}
+            assert len(calls) == 2
+
+        asyncio.run(run())
+
+    def test_lru_eviction(self):
+        cache = TTLCache(30, 2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_missing_user_not_cached(self):
+        async def run():
+            cache, calls = TTLCache(30, 10), []
+            assert await cache.get_or_load("ghost", _loader(None, calls)) is None
+            await cache.get_or_load("ghost", _loader(None, calls))
+            assert len(calls) == 2
+
+        asyncio.run(run())
+
+    def test_invalidate_forces_reload(self):
+        async def run():
+            cache, calls = TTLCache(30, 10), []
+            await cache.get_or_load("u1", _loader({"name": "old"}, calls))
+            cache.invalidate("u1")
+            assert await cache.get_or_load("u1", _loader({"name": "new"}, calls)) == {"name": "new"}
+
+        asyncio.run(run())
+
+    def test_load_racing_with_invalidate_is_not_cached(self):
+        async def run():
+            cache = TTLCache(30, 10)
+            release = asyncio.Event()
+
+            async def slow_load():
+                await release.wait()
+                return {"name": "stale"}
+
+            pending = asyncio.create_task(cache.get_or_load("u1", slow_load))
+            await asyncio.sleep(0)
+            cache.invalidate("u1")  # a write lands while the read is in flight
+            release.set()
+            assert await pending == {"name": "stale"}
+            assert cache.get("u1") is None
+
+        asyncio.run(run())
+
+    def test_invalidations_leave_no_bookkeeping(self):
+        async def run():
+            cache, calls = TTLCache(30, 10), []
+            for i in range(1000):
+                await cache.get_or_load(f"u{i}", _loader({"id": i}, calls))
+                cache.invalidate(f"u{i}")
+            cache.invalidate("never-loaded")
+            assert (cache._generations, cache._loading) == ({}, {})
+
+            # Two overlapping loads: an invalidate during them spoils both
+            release = asyncio.Event()
+
+            async def slow_load():
+                await release.wait()
+                return {"name": "stale"}
+
+            loads = [asyncio.create_task(cache.get_or_load("u1", slow_load)) for _ in range(2)]
+            await asyncio.sleep(0)
+            cache.invalidate("u1")
+            release.set()
+            await asyncio.gather(*loads)
+            assert cache.get("u1") is None
+            assert (cache._generations, cache._loading) == ({}, {})
+
+        asyncio.run(run())
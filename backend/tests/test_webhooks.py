@@ -0,0 +1,268 @@
+"""
+Test asynchronous Dusupay webhook ingestion
+- Callbacks are stored as pending events and applied by the worker pool
+- Events for one merchant_reference are applied in the order received
+- A backlog held up behind a backing-off event does not starve other references
+- Failures and callbacks for unknown disbursements are retried, then given up
+- Resent callbacks are rejected at ingest; shuffled replays never move a status backwards
+"""
+
+import asyncio
+import random
+from datetime import datetime, timezone, timedelta
+
+from services.db_indexes import INDEXES
+from services.disbursements import STATUS_RANK, apply_status, can_transition, previous_statuses
+from services import webhooks
+from services.webhooks import WebhookProcessor, new_event, provider_event_id, retry_delay
+
+STATUSES = ["PENDING", "PROCESSING", "COMPLETED", "FAILED", "CANCELLED"]
+
+
+def _callback(reference, status, **extra):
+    return {"event": "transaction.updated", "payload": {
+        "merchant_reference": reference, "internal_reference": f"DUSU-{reference}", "transaction_status": status, **extra}}
+
+
+class TestEvents:
+    """Event documents and retry schedule"""
+
+    def test_new_event(self):
+        event = new_event(_callback("EWA-1", "completed"), signature_valid=False)
+        assert (event["merchant_reference"], event["transaction_status"], event["status"]) == ("EWA-1", "COMPLETED", "pending")
+        assert event["signature_valid"] is False
+        assert event["available_at"] == event["received_at"]
+
+    def test_retry_delay(self):
+        assert [retry_delay(n) for n in (1, 2, 3)] == [2, 4, 8]
+        assert retry_delay(20) == 300
+
+    def test_provider_event_id(self):
+        assert provider_event_id({"event_id": "evt-9", "payload": {}}) == "evt-9"
+        assert provider_event_id(_callback("EWA-1", "COMPLETED", id="tx-1")) == "tx-1"
+        # No id: the same body always hashes the same, key order aside
+        body = _callback("EWA-1", "COMPLETED")
+        reordered = {"payload": dict(reversed(list(body["payload"].items()))), "event": body["event"]}
+        assert provider_event_id(body) == provider_event_id(reordered)
+        assert provider_event_id(body) != provider_event_id(_callback("EWA-1", "FAILED"))
+
+
+class TestStateMachine:
+    """Forward-only transitions: shuffled, duplicated and unknown statuses"""
+
+    def test_fuzz_never_moves_backwards(self):
+        rng = random.Random(20)
+        for _ in range(2000):
+            sequence = [rng.choice(STATUSES + ["UNKNOWN"]) for _ in range(rng.randint(1, 8))]
+            current = None
+            for status in sequence:
+                if can_transition(current, status):
+                    assert current is None or STATUS_RANK[status] > STATUS_RANK[current]
+                    current = status
+            # The first terminal status seen is the one that sticks
+            terminal = [s for s in sequence if STATUS_RANK.get(s) == 2]
+            if terminal:
+                assert current == terminal[0]
+
+    def test_unknown_status_applies_nowhere(self, motor_db):
+        async def run():
+            db = motor_db
+            assert previous_statuses("REVERSED") == []
+            await db.disbursements.insert_many([
+                {"id": "d-1", "advance_id": "adv-1", "merchant_reference": "EWA-1"},
+                {"id": "d-2", "advance_id": "adv-2", "merchant_reference": "EWA-2", "status": "PENDING"},
+            ])
+            for reference in ("EWA-1", "EWA-2"):
+                assert await apply_status(db, reference, "REVERSED") is False
+            disbursements = await db.disbursements.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+            assert [d.get("status") for d in disbursements] == [None, "PENDING"]
+
+        asyncio.run(run())
+
+
+async def _seed(db, references):
+    await db.disbursements.insert_many([
+        {"id": f"d-{ref}", "advance_id": f"adv-{ref}", "merchant_reference": ref, "status": "PENDING"}
+        for ref in references
+    ])
+    await db.advances.insert_many([
+        {"id": f"adv-{ref}", "employee_id": "ee-1", "employer_id": "er-1", "amount": 1000, "net_amount": 950,
+         "fee_amount": 50, "country": "KE", "status": "disbursing", "disbursement_reference": ref,
+         "created_at": "2026-01-01T00:00:00+00:00"}
+        for ref in references
+    ])
+    await db.transactions.insert_many([{"id": f"t-{ref}", "reference": ref, "status": "pending"} for ref in references])
+
+
+class TestWebhookProcessor:
+    """Ordering, retries and the worker pool against a scratch database"""
+
+    def test_applies_in_order_per_reference(self, motor_db):
+        async def run():
+            db = motor_db
+            await _seed(db, ["EWA-1"])
+            processor = WebhookProcessor(db)
+            first = await processor.ingest(new_event(_callback("EWA-1", "PROCESSING"), True))
+            second = await processor.ingest(new_event(_callback("EWA-1", "COMPLETED"), True))
+
+            claimed = await processor.claim()
+            assert claimed["id"] == first["id"]
+            # The later event waits while the first is being applied
+            assert await processor.claim() is None
+            await processor.execute(claimed)
+
+            claimed = await processor.claim()
+            assert claimed["id"] == second["id"]
+            await processor.execute(claimed)
+
+            events = await db.inbound_webhooks.find({}, {"_id": 0}).sort("received_at", 1).to_list(None)
+            assert [(e["status"], e["result"], e["attempts"]) for e in events] == [
+                ("processed", "PROCESSING", 1), ("processed", "COMPLETED", 1)]
+            advance = await db.advances.find_one({"id": "adv-EWA-1"})
+            assert (advance["status"], advance["disbursement_status"]) == ("disbursed", "COMPLETED")
+            assert (await db.transactions.find_one({"reference": "EWA-1"}))["status"] == "completed"
+
+        asyncio.run(run())
+
+    def test_unknown_reference_retried_then_given_up(self, motor_db):
+        async def run():
+            db = motor_db
+            processor = WebhookProcessor(db, max_attempts=2)
+            event = await processor.ingest(new_event(_callback("EWA-LATE", "COMPLETED"), True))
+            later = await processor.ingest(new_event(_callback("EWA-LATE", "FAILED"), True))
+
+            await processor.execute(await processor.claim())
+            stored = await db.inbound_webhooks.find_one({"id": event["id"]})
+            assert (stored["status"], stored["attempts"]) == ("pending", 1)
+            assert stored["available_at"] > stored["received_at"]
+            # Not due yet, and it holds back the later event for the same reference
+            assert await processor.claim() is None
+
+            await db.inbound_webhooks.update_one({"id": event["id"]}, {"$set": {"available_at": stored["received_at"]}})
+            await processor.execute(await processor.claim())
+            stored = await db.inbound_webhooks.find_one({"id": event["id"]})
+            assert (stored["status"], stored["attempts"]) == ("not_found", 2)
+            assert (await processor.claim())["id"] == later["id"]
+
+        asyncio.run(run())
+
+    def test_held_up_backlog_does_not_starve_others(self, motor_db):
+        async def run():
+            db = motor_db
+            processor = WebhookProcessor(db)
+            backing_off = new_event(_callback("EWA-SLOW", "PROCESSING"), True)
+            backing_off["available_at"] = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+            await processor.ingest(backing_off)
+            for i in range(80):
+                await processor.ingest(new_event(_callback("EWA-SLOW", "COMPLETED", event_id=f"e{i}"), True))
+            other = await processor.ingest(new_event(_callback("EWA-FAST", "COMPLETED"), True))
+
+            claimed = await processor.claim()
+            assert claimed["id"] == other["id"]
+            assert await processor.claim() is None
+            assert await db.inbound_webhooks.count_documents({"status": "processing"}) == 1
+
+        asyncio.run(run())
+
+    def test_claim_racing_an_earlier_event_is_handed_back(self, motor_db, monkeypatch):
+        async def run():
+            db = motor_db
+            processor = WebhookProcessor(db)
+            first = await processor.ingest(new_event(_callback("EWA-1", "PROCESSING"), True))
+            second = await processor.ingest(new_event(_callback("EWA-1", "COMPLETED"), True))
+            # Another worker claims the first event after this one looked for held-up references
+            lease = (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
+            await db.inbound_webhooks.update_one(
+                {"id": first["id"]}, {"$set": {"status": "processing", "worker_id": "other", "lease_expires_at": lease}})
+            monkeypatch.setattr(webhooks, "waiting_filter", lambda now: {"id": None})
+
+            assert await processor.claim() is None
+            stored = await db.inbound_webhooks.find_one({"id": second["id"]})
+            assert (stored["status"], stored["worker_id"], stored["lease_expires_at"]) == ("pending", None, None)
+            assert not processor._active
+
+        asyncio.run(run())
+
+    def test_duplicate_rejected_at_ingest(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.inbound_webhooks.create_indexes(INDEXES["inbound_webhooks"])
+            processor = WebhookProcessor(db)
+            assert await processor.ingest(new_event(_callback("EWA-1", "COMPLETED"), True))
+            assert await processor.ingest(new_event(_callback("EWA-1", "COMPLETED"), True)) is None
+            # A different status for the same reference is a new event
+            assert await processor.ingest(new_event(_callback("EWA-1", "FAILED"), True))
+            assert await db.inbound_webhooks.count_documents({}) == 2
+
+        asyncio.run(run())
+
+    def test_fuzz_shuffled_replays(self, motor_db):
+        async def run():
+            db = motor_db
+            await db.inbound_webhooks.create_indexes(INDEXES["inbound_webhooks"])
+            rng = random.Random(19)
+            references = [f"EWA-{i}" for i in range(30)]
+            await _seed(db, references)
+            sequences = {}
+            for ref in references:
+                outcome = rng.choice(["COMPLETED", "FAILED", "CANCELLED"])
+                sequence = ["PENDING", "PROCESSING", outcome] + rng.sample(STATUSES, 2)
+                # Replays of what was already sent
+                sequence += rng.choices(sequence, k=3)
+                rng.shuffle(sequence)
+                sequences[ref] = sequence
+
+            processor = WebhookProcessor(db, workers=4, poll_interval=0.05)
+            processor.start()
+            try:
+                accepted = 0
+                for ref, sequence in sequences.items():
+                    for status in sequence:
+                        if await processor.ingest(new_event(_callback(ref, status, failure_reason="Declined"), True)):
+                            accepted += 1
+                for _ in range(400):
+                    if await db.inbound_webhooks.count_documents({"status": "processed"}) == accepted:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                await processor.close()
+
+            # Exact resends never got past the dedup index
+            assert accepted == sum(len(set(sequence)) for sequence in sequences.values())
+            assert await db.inbound_webhooks.count_documents({"status": "processed"}) == accepted
+            for ref, sequence in sequences.items():
+                expected = next(s for s in sequence if STATUS_RANK[s] == 2)
+                disbursement = await db.disbursements.find_one({"merchant_reference": ref})
+                advance = await db.advances.find_one({"id": f"adv-{ref}"})
+                transaction = await db.transactions.find_one({"reference": ref})
+                assert disbursement["status"] == expected, (ref, sequence)
+                assert advance["disbursement_status"] == expected
+                assert advance["status"] == ("disbursed" if expected == "COMPLETED" else "approved")
+                assert transaction["status"] == expected.lower()
+
+        asyncio.run(run())
+
+    def test_worker_pool_drains(self, motor_db):
+        async def run():
+            db = motor_db
+            references = [f"EWA-{i}" for i in range(10)]
+            await _seed(db, references)
+            processor = WebhookProcessor(db, workers=3, poll_interval=0.05)
+            processor.start()
+            try:
+                for ref in references:
+                    await processor.ingest(new_event(_callback(ref, "PROCESSING"), True))
+                    await processor.ingest(new_event(_callback(ref, "FAILED", failure_reason="Wallet limit"), True))
+                for _ in range(200):
+                    if await db.inbound_webhooks.count_documents({"status": "processed"}) == 20:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                await processor.close()
+
+            assert await db.inbound_webhooks.count_documents({"status": "processed"}) == 20
+            advances = await db.advances.find({}, {"_id": 0}).to_list(None)
+            assert {(a["status"], a["disbursement_status"], a["disbursement_error"]) for a in advances} == {
+                ("approved", "FAILED", "Wallet limit")}
+
+        asyncio.run(run())
@@ -110,6 +110,10 @@ export const riskScoreApi = {
 // Payroll APIs
 export const payrollApi = {
   upload: (data) => api.post('/payroll/upload', data),
+  uploadFile: (formData) => api.post('/payroll/upload-file', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  }),
+  getJob: (jobId) => api.get(`/payroll/jobs/${jobId}`),
   getHistory: () => api.get('/payroll/history'),
 };
 
@@ -70,18 +70,20 @@ const APICard = ({ api, icon: Icon }) => {
           <p className="text-xs text-slate-500">Latency</p>
           <p className={cn(
             "text-lg font-bold",
-            api.latency_ms < 150 ? "text-emerald-600" : api.latency_ms < 300 ? "text-amber-600" : "text-red-600"
+            api.latency_ms == null ? "text-slate-400" :
+              api.latency_ms < 150 ? "text-emerald-600" : api.latency_ms < 300 ? "text-amber-600" : "text-red-600"
           )}>
-            {api.latency_ms}ms
+            {api.latency_ms == null ? '—' : `${Math.round(api.latency_ms)}ms`}
           </p>
         </div>
         <div className="p-3 bg-slate-50/50 dark:bg-slate-800/30 rounded-xl text-center">
           <p className="text-xs text-slate-500">Uptime</p>
           <p className={cn(
             "text-lg font-bold",
-            api.uptime_percent >= 99.5 ? "text-emerald-600" : api.uptime_percent >= 98 ? "text-amber-600" : "text-red-600"
+            api.uptime_percent == null ? "text-slate-400" :
+              api.uptime_percent >= 99.5 ? "text-emerald-600" : api.uptime_percent >= 98 ? "text-amber-600" : "text-red-600"
           )}>
-            {api.uptime_percent}%
+            {api.uptime_percent == null ? '—' : `${api.uptime_percent}%`}
           </p>
         </div>
         <div className="p-3 bg-slate-50/50 dark:bg-slate-800/30 rounded-xl text-center">
@@ -92,6 +94,15 @@ const APICard = ({ api, icon: Icon }) => {
         </div>
       </div>
 
+      {api.latency_percentiles?.p50 != null && (
+        <div className="flex items-center justify-between text-sm mb-2">
+          <span className="text-slate-500">p95 / p99 · errors</span>
+          <span className="text-slate-700 dark:text-slate-300">
+            {Math.round(api.latency_percentiles.p95)}ms / {Math.round(api.latency_percentiles.p99)}ms · {(api.error_rate * 100).toFixed(1)}%
+          </span>
+        </div>
+      )}
+
       <div className="flex items-center justify-between text-sm">
         <span className="text-slate-500">Last checked</span>
         <span className="text-slate-700 dark:text-slate-300">
@@ -166,6 +177,42 @@ const OverallHealthBanner = ({ status, integrations }) => {
   );
 };
 
+// Circuit breaker state per payout route (country + provider)
+const CIRCUIT_STATUS = { closed: 'healthy', half_open: 'degraded', open: 'down' };
+
+const PayoutRoutes = ({ routes, queued, unsettled }) => {
+  if (!routes.length && !queued && !unsettled) return null;
+  return (
+    <div className="bg-white/60 dark:bg-slate-900/60 backdrop-blur-sm rounded-2xl p-6 border border-slate-200/50 dark:border-slate-700/30">
+      <div className="flex items-center justify-between mb-4">
+        <h3 className="font-bold text-slate-900 dark:text-white">Payout Routes</h3>
+        <span className="text-sm text-slate-500">
+          {queued} payout{queued === 1 ? '' : 's'} queued · {unsettled} awaiting settlement
+        </span>
+      </div>
+      <div className="divide-y divide-slate-200/50 dark:divide-slate-700/30">
+        {routes.map((route) => (
+          <div key={route.key} className="flex items-center justify-between py-3 text-sm">
+            <div>
+              <p className="font-medium text-slate-900 dark:text-white">{route.key}</p>
+              <p className="text-slate-500">
+                {route.successes} ok · {route.failures} failed · {route.rejected} short-circuited
+                {route.last_failure && ` · last error ${route.last_failure}`}
+              </p>
+            </div>
+            <div className="flex items-center gap-3">
+              {route.state === 'open' && (
+                <span className="text-slate-500">retry in {Math.ceil(route.retry_after_seconds)}s</span>
+              )}
+              <StatusIndicator status={CIRCUIT_STATUS[route.state]} />
+            </div>
+          </div>
+        ))}
+      </div>
+    </div>
+  );
+};
+
 export default function AdminAPIHealth() {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -256,6 +303,12 @@ export default function AdminAPIHealth() {
           ))}
         </div>
 
+        <PayoutRoutes
+          routes={data?.payout_routes || []}
+          queued={data?.queued_payouts || 0}
+          unsettled={data?.unsettled_payouts || 0}
+        />
+
         {/* Last Updated */}
         <div className="text-center text-sm text-slate-500 dark:text-slate-400">
           Last updated: {new Date(data?.last_updated).toLocaleString()}
@@ -122,8 +122,12 @@ const APIHealthCard = ({ api }) => {
         </div>
       </div>
       <div className="text-right">
-        <p className="text-sm font-bold text-slate-900 dark:text-white">{api.latency_ms}ms</p>
-        <p className="text-xs text-slate-500">{api.uptime_percent}% uptime</p>
+        <p className="text-sm font-bold text-slate-900 dark:text-white">
+          {api.latency_ms == null ? '—' : `${Math.round(api.latency_ms)}ms`}
+        </p>
+        <p className="text-xs text-slate-500">
+          {api.uptime_percent == null ? 'no traffic yet' : `${api.uptime_percent}% uptime`}
+        </p>
       </div>
     </div>
   );
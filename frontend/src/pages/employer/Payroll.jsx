@@ -12,6 +12,7 @@ import { formatCurrency, formatDateTime, cn } from '../../lib/utils';
 import { toast } from 'sonner';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL;
+const JOB_POLL_INTERVAL_MS = 1000;
 
 // Metric Card with solid green icon
 const MetricCard = ({ icon: Icon, label, value, subtext, trend, trendUp }) => (
@@ -48,7 +49,7 @@ const PayrollHistoryItem = ({ record }) => (
         {new Date(record.month + '-01').toLocaleDateString('en-US', { month: 'long', year: 'numeric' })}
       </p>
       <p className="text-xs text-slate-500 dark:text-slate-400">
-        {record.employees?.length || 0} employees • Uploaded {formatDateTime(record.uploaded_at)}
+        {record.employee_count ?? (record.employees?.length || 0)} employees • Uploaded {formatDateTime(record.uploaded_at)}
       </p>
     </div>
     
@@ -104,6 +105,7 @@ export default function EmployerPayroll() {
   const [payrollHistory, setPayrollHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [uploading, setUploading] = useState(false);
+  const [uploadJob, setUploadJob] = useState(null);
   const [selectedFile, setSelectedFile] = useState(null);
   const [selectedMonth, setSelectedMonth] = useState(
     new Date().toISOString().slice(0, 7)
@@ -152,42 +154,32 @@ export default function EmployerPayroll() {
 
     setUploading(true);
     try {
-      // Simulate upload processing
-      await new Promise(resolve => setTimeout(resolve, 2000));
-      
-      // Mock payroll data based on employees
-      const payrollData = {
-        month: selectedMonth,
-        employees: employees.slice(0, 20).map(emp => ({
-          employee_code: emp.employee_code,
-          days_worked: Math.floor(Math.random() * 10) + 20,
-          gross_salary: emp.monthly_salary
-        }))
-      };
+      const formData = new FormData();
+      formData.append('file', selectedFile);
+      formData.append('month', selectedMonth);
+      const { data: job } = await payrollApi.uploadFile(formData);
+      setUploadJob(job);
 
-      const token = localStorage.getItem('eaziwage_token');
-      const response = await fetch(`${API_URL}/api/payroll/upload`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
-        },
-        body: JSON.stringify(payrollData)
-      });
+      // Rows are applied in the background; poll the job for progress
+      let current = job;
+      while (current.status === 'queued' || current.status === 'processing') {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        current = (await payrollApi.getJob(job.id)).data;
+        setUploadJob(current);
+      }
 
-      if (response.ok) {
-        toast.success('Payroll uploaded successfully!');
+      if (current.status === 'completed') {
+        const problems = current.unknown + current.invalid;
+        toast.success(`Payroll processed: ${current.updated} employees updated` +
+          (problems ? `, ${problems} rows need attention` : ''));
         setSelectedFile(null);
-        // Refresh history
-        const historyRes = await fetch(`${API_URL}/api/payroll/history`, {
-          headers: { 'Authorization': `Bearer ${token}` }
-        }).then(r => r.json());
-        setPayrollHistory(historyRes || []);
+        const historyRes = await payrollApi.getHistory();
+        setPayrollHistory(historyRes.data || []);
       } else {
-        toast.error('Failed to upload payroll');
+        toast.error(current.error || 'Failed to process payroll');
       }
     } catch (err) {
-      toast.error('Failed to upload payroll');
+      toast.error(err.response?.data?.detail || 'Failed to upload payroll');
     } finally {
       setUploading(false);
     }
@@ -254,7 +246,7 @@ export default function EmployerPayroll() {
             icon={Calendar}
             label="Last Upload"
             value={lastUpload ? new Date(lastUpload.month + '-01').toLocaleDateString('en-US', { month: 'short', year: 'numeric' }) : 'Never'}
-            subtext={lastUpload ? `${lastUpload.employees?.length || 0} records` : 'No data uploaded'}
+            subtext={lastUpload ? `${lastUpload.employee_count ?? (lastUpload.employees?.length || 0)} records` : 'No data uploaded'}
           />
           <MetricCard 
             icon={BarChart3}
@@ -412,7 +404,7 @@ export default function EmployerPayroll() {
                     <>
                       <p className="font-semibold text-slate-900 dark:text-white">Click to upload file</p>
                       <p className="text-sm text-slate-500 dark:text-slate-400 mt-1">
-                        CSV or Excel files • Max 10MB
+                        CSV or Excel files • Max 50MB
                       </p>
                     </>
                   )}
@@ -428,7 +420,7 @@ export default function EmployerPayroll() {
                 {uploading ? (
                   <>
                     <div className="w-4 h-4 border-2 border-white/30 border-t-white rounded-full animate-spin mr-2" />
-                    Processing...
+                    {uploadJob?.rows_processed ? `Processing... ${uploadJob.rows_processed} rows` : 'Processing...'}
                   </>
                 ) : (
                   <>